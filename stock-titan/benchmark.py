@@ -0,0 +1,638 @@
+"""
+Benchmarks for the Stock Titan scraper.
+
+    python3 benchmark.py parse [--pages DIR] [--repeat N]
+    python3 benchmark.py scrape [--days N] [--latency S] [--error-rate R] ...
+    python3 benchmark.py load [--rows N] [--chunk-sizes N ...]
+    python3 benchmark.py embed [--nodes N] [--batch-sizes N ...]
+    python3 benchmark.py startup [--repeat N]
+    python3 benchmark.py embed_pool [--nodes N] [--workers N [N ...]]
+    python3 benchmark.py onnx [--nodes N] [--min-similarity S]
+"""
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import date, timedelta
+from glob import glob
+import json
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from urllib.request import urlopen
+
+import pandas as pd
+from sqlalchemy import text
+
+from bulk_load import COPY_CHUNK_SIZE, load_frame, prepare_table, quote_identifier
+from database import get_engine
+from embedding_pool import EmbeddingPool, thread_budget
+from embeddings import EMBED_BATCH_SIZE, EMBED_MODEL, embed_texts, get_model
+import extract
+from extract import (
+    ARTICLE_STRAINER,
+    BACKFILL_WORKERS,
+    COLUMNS,
+    HTML_PARSER,
+    LINKS_STRAINER,
+    PARSE_WORKERS,
+    FetchEngine,
+    parse_article,
+    parse_links,
+    process_date,
+)
+from http_cache import CACHE_DIR, HTTPCache
+from onnx_embedding import EMBED_ONNX_DIR, OnnxEmbedding, cosine_similarities, model_path
+from replay_server import ARTICLES_PER_DAY, FIXTURES_DIR, serve
+from schemas import ARTICLE_SCHEMA, to_table
+from seen_index import SeenIndex
+from sinks import RecordSink
+
+
+def load_pages(pages_dir=None):
+    """
+    Loads the pages to benchmark as (url, html) pairs, either from a directory of saved
+    HTML files or from the entries of the HTTP cache.
+    """
+    if pages_dir:
+        pages = []
+        for path in sorted(glob(os.path.join(pages_dir, "*.htm*"))):
+            with open(path, encoding="utf-8") as f:
+                pages.append((os.path.basename(path), f.read()))
+        return pages
+
+    pages = []
+    for path in sorted(glob(os.path.join(CACHE_DIR, "*", "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+        pages.append((entry["url"], entry["body"]))
+    return pages
+
+
+def is_article(url):
+    return url.endswith((".html", ".htm"))
+
+
+def time_parser(func, pages, repeat):
+    """
+    Returns the mean time in seconds func takes to parse a page.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            func(html)
+    return (time.perf_counter() - start) / (repeat * len(pages))
+
+
+def peak_memory(func, pages):
+    """
+    Returns the largest amount of memory in bytes allocated while func parses a page.
+    """
+    peak = 0
+    for html in pages:
+        tracemalloc.start()
+        func(html)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return peak
+
+
+def bench_parse(args):
+    """
+    Compares the full html.parser parse with the configured parser restricted to the elements
+    that are read, and checks both extract the same fields.
+    """
+    pages = load_pages(args.pages)
+    if not pages:
+        raise SystemExit("No pages to benchmark, run extract.py first or pass --pages")
+
+    articles = [html for url, html in pages if is_article(url)]
+    days = [html for url, html in pages if not is_article(url)]
+    cases = [
+        ("article", articles, parse_article, ARTICLE_STRAINER),
+        ("day", days, parse_links, LINKS_STRAINER),
+    ]
+
+    print(f"{'pages':<8}{'parser':<28}{'count':>7}{'ms/page':>10}{'peak KiB':>10}{'speedup':>9}")
+    for name, htmls, func, strainer in cases:
+        if not htmls:
+            continue
+
+        def full(html):
+            return func(html, "html.parser", None)
+
+        def fast(html):
+            return func(html, HTML_PARSER, strainer)
+
+        mismatches = sum(full(html) != fast(html) for html in htmls)
+        timings = [
+            ("html.parser (full)", full, time_parser(full, htmls, args.repeat)),
+            (f"{HTML_PARSER} (strained)", fast, time_parser(fast, htmls, args.repeat)),
+        ]
+        baseline = timings[0][2]
+        for label, parser, seconds in timings:
+            print(
+                f"{name:<8}{label:<28}{len(htmls):>7}{seconds * 1000:>10.2f}"
+                f"{peak_memory(parser, htmls) / 1024:>10.0f}{baseline / seconds:>8.1f}x"
+            )
+        print(f"{name:<8}{'mismatched pages':<28}{mismatches:>7}")
+
+
+class TimedFetchEngine(FetchEngine):
+    """
+    Fetch engine recording how long each request takes, retries and queueing included.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    async def get(self, url):
+        start = time.perf_counter()
+        try:
+            return await super().get(url)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+@contextmanager
+def replay_server(**kwargs):
+    """
+    Runs the stand-in server in a child process on a free port and yields its base URL.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    process = multiprocessing.Process(
+        target=serve, kwargs={"host": "127.0.0.1", "port": port, **kwargs}, daemon=True
+    )
+    process.start()
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            urlopen(f"{url}/__stats").close()
+            break
+        except OSError:
+            if time.monotonic() > deadline or not process.is_alive():
+                process.terminate()
+                raise SystemExit("The stand-in server did not start")
+            time.sleep(0.05)
+
+    try:
+        yield url
+    finally:
+        process.terminate()
+        process.join()
+
+
+def server_stats(url):
+    with urlopen(f"{url}/__stats") as response:
+        return json.load(response)
+
+
+def percentile(values, q):
+    """
+    Returns the q-th percentile of the values, by the nearest-rank method.
+    """
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def report(pages, latencies, elapsed, cpu_start, stats):
+    """
+    Prints the throughput, latency and resource usage of a scraping run. CPU time and peak
+    RSS are given for this process and for the parse workers, which must have exited.
+    """
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in KiB on Linux
+    rows = [
+        ("pages", f"{pages}"),
+        ("elapsed s", f"{elapsed:.2f}"),
+        ("pages/s", f"{pages / elapsed:.1f}"),
+        ("p50 latency ms", f"{percentile(latencies, 50) * 1000:.1f}" if latencies else "-"),
+        ("p99 latency ms", f"{percentile(latencies, 99) * 1000:.1f}" if latencies else "-"),
+        ("cpu s (main)", f"{own.ru_utime + own.ru_stime - cpu_start:.2f}"),
+        ("cpu s (workers)", f"{children.ru_utime + children.ru_stime:.2f}"),
+        ("peak RSS MiB (main)", f"{own.ru_maxrss / 1024:.1f}"),
+        ("peak RSS MiB (workers)", f"{children.ru_maxrss / 1024:.1f}"),
+        ("server requests", f"{stats['requests']}"),
+        ("server 503s", f"{stats['errors']}"),
+        ("server 429s", f"{stats['throttled']}"),
+        ("server 404s", f"{stats['not_found']}"),
+    ]
+    for label, value in rows:
+        print(f"{label:<24}{value:>12}")
+
+
+async def scrape(dates, workers, parse_workers):
+    """
+    Scrapes the given dates through process_date like a backfill, without the HTTP cache or
+    the seen index, and returns the number of pages fetched and their latencies.
+    """
+    queue = asyncio.Queue()
+    for date_str in dates:
+        queue.put_nowait(date_str)
+
+    async def worker(engine, seen, executor):
+        while not queue.empty():
+            date_str = queue.get_nowait()
+            with RecordSink(
+                f"data/stocktitan_{date_str}", COLUMNS, schema=ARTICLE_SCHEMA
+            ) as sink:
+                await process_date(date_str, engine, sink, seen, executor)
+
+    pool = ProcessPoolExecutor(parse_workers) if parse_workers > 0 else nullcontext()
+    with pool as executor, SeenIndex(path=None) as seen:
+        async with TimedFetchEngine(cache=HTTPCache(root=None)) as engine:
+            await asyncio.gather(
+                *[worker(engine, seen, executor) for _ in range(min(workers, len(dates)))]
+            )
+    return engine.latencies
+
+
+def bench_scrape(args):
+    """
+    Scrapes a range of dates from the stand-in server and reports pages per second, request
+    latency percentiles, CPU time and peak memory.
+    """
+    logging.getLogger("extract").setLevel(logging.WARNING)
+    dates = [str(args.start + timedelta(days=i)) for i in range(args.days)]
+    server_options = {
+        "fixtures_dir": os.path.abspath(args.fixtures),
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "error_rate": args.error_rate,
+        "throttle_rate": args.throttle_rate,
+        "articles_per_day": args.articles_per_day,
+    }
+
+    with replay_server(**server_options) as url, tempfile.TemporaryDirectory() as workdir:
+        extract.BASE_URL = url
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            cpu_start = usage.ru_utime + usage.ru_stime
+            start = time.perf_counter()
+            latencies = asyncio.run(scrape(dates, args.workers, args.parse_workers))
+            elapsed = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+        report(len(latencies), latencies, elapsed, cpu_start, server_stats(url))
+
+
+def synthetic_articles(rows, article_bytes):
+    """
+    Returns a DataFrame of extracted articles with bodies of about article_bytes each.
+    """
+    body = ("Acme Corp reported a record quarter, with revenue up 20% on the year. " * (
+        article_bytes // 70 + 1
+    ))[:article_bytes]
+    df = pd.DataFrame(
+        {
+            "title": [f"Acme Corp announcement {i}" for i in range(rows)],
+            "datetime": "2024-05-25T17:34:00.000Z",
+            "impact_score": ["Low", "Medium", "High"] * (rows // 3) + ["Low"] * (rows % 3),
+            "sentiment": "Neutral",
+            "summary": "Revenue grew 20%.",
+            "article": [f"{i} {body}" for i in range(rows)],
+        }
+    )
+    return to_table(df, ARTICLE_SCHEMA).to_pandas()
+
+
+def legacy_load(engine, df, table, chunk_size):
+    """
+    Loads a DataFrame as load_db did before rows had a content hash: appends all of them
+    with pandas' to_sql, then deletes the rows duplicating an older one, found with
+    ROW_NUMBER over all of the columns.
+    """
+    quoted = quote_identifier(table)
+    columns = ", ".join(quote_identifier(column) for column in [*df.columns, "created_at"])
+    with engine.begin() as conn:
+        prepare_table(conn, table, ARTICLE_SCHEMA)
+        df.to_sql(table, con=conn, if_exists="append", index=False, chunksize=chunk_size)
+        conn.execute(
+            text(
+                f"DELETE FROM {quoted} WHERE id IN ("
+                f"SELECT id FROM (SELECT id, ROW_NUMBER() OVER "
+                f"(PARTITION BY {columns} ORDER BY id) AS row_num FROM {quoted}) AS ranked "
+                f"WHERE row_num > 1)"
+            )
+        )
+
+
+def bench_load(args):
+    """
+    Compares the rows per second of chunked loads into a scratch table, which is dropped
+    afterwards. The speedups are relative to the load before content hashes ("legacy", a
+    plain to_sql append and a ROW_NUMBER delete of the duplicates), against the
+    deduplicating loads of load_frame: "to_sql" inserts with ON CONFLICT DO NOTHING and
+    "copy" streams the rows into a staging table merged the same way.
+    """
+    if not args.db_url:
+        raise SystemExit("Set DB_URL or pass --db-url")
+
+    engine = get_engine(args.db_url)
+    df = synthetic_articles(args.rows, args.article_bytes)
+    cases = [("legacy", args.chunk_sizes[0]), ("to_sql", args.chunk_sizes[0])]
+    cases += [("copy", chunk_size) for chunk_size in args.chunk_sizes]
+
+    print(f"{'method':<10}{'chunk':>8}{'rows':>10}{'seconds':>10}{'rows/s':>12}{'speedup':>9}")
+    baseline = None
+    try:
+        for method, chunk_size in cases:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP TABLE IF EXISTS {quote_identifier(args.table)}"))
+            start = time.perf_counter()
+            if method == "legacy":
+                legacy_load(engine, df, args.table, chunk_size)
+            else:
+                load_frame(engine, df, args.table, ARTICLE_SCHEMA, method, chunk_size)
+            seconds = time.perf_counter() - start
+            rate = len(df) / seconds
+            baseline = baseline or rate
+            print(
+                f"{method:<10}{chunk_size:>8}{len(df):>10}{seconds:>10.2f}"
+                f"{rate:>12.0f}{rate / baseline:>8.1f}x"
+            )
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {quote_identifier(args.table)}"))
+        engine.dispose()
+
+
+def synthetic_texts(count, seed=0):
+    """
+    Returns texts of mixed lengths, from a headline to a long press release, like the
+    content of the nodes.
+    """
+    rng = random.Random(seed)
+    words = "shares revenue quarter guidance announced company market growth results".split()
+    return [
+        " ".join(rng.choice(words) for _ in range(int(rng.lognormvariate(4.5, 0.8)) + 5))
+        for _ in range(count)
+    ]
+
+
+def bench_embed(args):
+    """
+    Compares the nodes per second of embedding one at a time with batches in arrival order
+    and batches of similar length.
+    """
+    texts = synthetic_texts(args.nodes)
+    model = get_model(args.model)
+    model.get_text_embedding_batch(texts[:8])  # warm up
+
+    def in_order(batch_size):
+        return [
+            vector
+            for start in range(0, len(texts), batch_size)
+            for vector in model.get_text_embedding_batch(texts[start:start + batch_size])
+        ]
+
+    print(f"{'batching':<10}{'batch':>7}{'nodes':>8}{'seconds':>10}{'nodes/s':>10}{'speedup':>9}")
+    baseline = None
+    for batch_size in args.batch_sizes:
+        model.embed_batch_size = batch_size
+        cases = [("arrival", lambda: in_order(batch_size))]
+        if batch_size > 1:
+            cases.append(("length", lambda: embed_texts(model, texts, batch_size)))
+        for name, run in cases:
+            start = time.perf_counter()
+            run()
+            seconds = time.perf_counter() - start
+            rate = len(texts) / seconds
+            baseline = baseline or rate
+            print(
+                f"{name:<10}{batch_size:>7}{len(texts):>8}{seconds:>10.2f}"
+                f"{rate:>10.1f}{rate / baseline:>8.1f}x"
+            )
+
+
+def bench_embed_pool(args):
+    """
+    Compares the nodes per second of embedding in the benchmark's own process with torch's
+    default threading and in pools of worker processes sharing the cores.
+    """
+    texts = synthetic_texts(args.nodes)
+    print(f"{'workers':<11}{'threads':>8}{'nodes':>8}{'seconds':>10}{'nodes/s':>10}{'speedup':>9}")
+
+    model = get_model(args.model, args.batch_size)
+    embed_texts(model, texts[:args.batch_size], args.batch_size)  # warm up
+    start = time.perf_counter()
+    embed_texts(model, texts, args.batch_size)
+    seconds = time.perf_counter() - start
+    baseline = len(texts) / seconds
+    print(
+        f"{'in-process':<11}{'default':>8}{len(texts):>8}{seconds:>10.2f}"
+        f"{baseline:>10.1f}{1:>8.1f}x"
+    )
+
+    for workers in args.workers:
+        threads = thread_budget(workers, args.threads)
+        with EmbeddingPool(workers, threads, args.model, args.batch_size) as pool:
+            # the first shards also load the model in every worker
+            pool.embed(texts[:workers * pool.shard_size])
+            start = time.perf_counter()
+            pool.embed(texts)
+            seconds = time.perf_counter() - start
+        rate = len(texts) / seconds
+        print(
+            f"{workers:<11}{threads:>8}{len(texts):>8}{seconds:>10.2f}"
+            f"{rate:>10.1f}{rate / baseline:>8.1f}x"
+        )
+
+
+def bench_onnx(args):
+    """
+    Compares the nodes per second and the embeddings of the torch model with its fp32 and
+    int8 ONNX exports. Fails if an ONNX embedding is less similar to the torch one than
+    min_similarity, so the backend can be switched safely.
+    """
+    texts = synthetic_texts(args.nodes)
+    backends = [("torch", get_model(args.model, args.batch_size, backend="torch"))]
+    for name, quantize in (("onnx fp32", False), ("onnx int8", True)):
+        path = model_path(args.model, args.dir, quantize)
+        if os.path.exists(path):
+            backends.append((name, OnnxEmbedding(path, args.batch_size)))
+        else:
+            print(f"{name}: no export at {path}, run `python3 onnx_embedding.py export`")
+
+    print(
+        f"{'backend':<11}{'nodes':>7}{'seconds':>10}{'nodes/s':>10}{'speedup':>9}"
+        f"{'min cos':>9}{'mean cos':>10}"
+    )
+    expected = baseline = None
+    failed = False
+    for name, model in backends:
+        embed_texts(model, texts[:args.batch_size], args.batch_size)  # warm up
+        start = time.perf_counter()
+        vectors = embed_texts(model, texts, args.batch_size)
+        seconds = time.perf_counter() - start
+        rate = len(texts) / seconds
+        if expected is None:
+            expected, baseline = vectors, rate
+        similarities = cosine_similarities(expected, vectors)
+        failed = failed or similarities.min() < args.min_similarity
+        print(
+            f"{name:<11}{len(texts):>7}{seconds:>10.2f}{rate:>10.1f}{rate / baseline:>8.1f}x"
+            f"{similarities.min():>9.4f}{similarities.mean():>10.4f}"
+        )
+    if failed:
+        sys.exit(f"An ONNX backend is below the minimum similarity of {args.min_similarity}")
+
+
+# Startup of the loader before the model registry: two embedding models and an OpenAI LLM
+# constructed eagerly, then the first embedding
+EAGER_STARTUP = """
+import time
+start = time.perf_counter()
+from llama_index.core.settings import Settings
+from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from llama_index.llms.openai import OpenAI
+from llama_index.vector_stores.timescalevector import TimescaleVectorStore
+import load_vs
+imported = time.perf_counter()
+loader = load_vs.StockTitanLoader()
+Settings.llm = OpenAI(model="gpt-3.5-turbo-1106", temperature=0.1)
+Settings.embed_model = HuggingFaceEmbedding(model_name={model!r})
+ready = time.perf_counter()
+HuggingFaceEmbedding(model_name={model!r}).get_text_embedding("Acme Corp reports record quarter.")
+print(imported - start, ready - start, time.perf_counter() - start)
+"""
+
+# Startup of the loader with the model registry
+LAZY_STARTUP = """
+import time
+start = time.perf_counter()
+import load_vs
+from embeddings import LazyModel
+imported = time.perf_counter()
+loader = load_vs.StockTitanLoader()
+ready = time.perf_counter()
+LazyModel({model!r}).get_text_embedding_batch(["Acme Corp reports record quarter."])
+print(imported - start, ready - start, time.perf_counter() - start)
+"""
+
+
+def bench_startup(args):
+    """
+    Compares the time a fresh loader process takes to import its modules, to be ready to
+    work and to compute its first embedding, before and after the lazy model registry.
+    """
+    print(f"{'startup':<8}{'imported':>10}{'ready':>10}{'first embedding':>17}")
+    for name, script in (("eager", EAGER_STARTUP), ("lazy", LAZY_STARTUP)):
+        runs = []
+        for _ in range(args.repeat):
+            result = subprocess.run(
+                [sys.executable, "-c", script.format(model=args.model)],
+                capture_output=True,
+                text=True,
+            )
+            if result.returncode:
+                error = (result.stderr.strip().splitlines() or ["no output"])[-1]
+                print(f"{name:<8}failed: {error}")
+                break
+            runs.append([float(value) for value in result.stdout.split()[-3:]])
+        else:
+            imported, ready, first = (statistics.median(column) for column in zip(*runs))
+            print(f"{name:<8}{imported:>9.2f}s{ready:>9.2f}s{first:>16.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parse_parser = subparsers.add_parser("parse", help="compare the HTML parser backends")
+    parse_parser.add_argument(
+        "--pages", help="directory of saved article pages, defaults to the HTTP cache"
+    )
+    parse_parser.add_argument("--repeat", type=int, default=3, help="number of timed passes")
+    parse_parser.set_defaults(func=bench_parse)
+
+    scrape_parser = subparsers.add_parser(
+        "scrape", help="scrape dates from a local stand-in server"
+    )
+    scrape_parser.add_argument("--start", type=date.fromisoformat, default=date(2024, 5, 1))
+    scrape_parser.add_argument("--days", type=int, default=5, help="number of dates scraped")
+    scrape_parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    scrape_parser.add_argument("--parse-workers", type=int, default=PARSE_WORKERS)
+    scrape_parser.add_argument(
+        "--fixtures", default=FIXTURES_DIR, help="recorded pages served before synthetic ones"
+    )
+    scrape_parser.add_argument("--articles-per-day", type=int, default=ARTICLES_PER_DAY)
+    scrape_parser.add_argument("--latency", type=float, default=0.05, help="seconds per response")
+    scrape_parser.add_argument("--jitter", type=float, default=0.02, help="extra random seconds")
+    scrape_parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 503s")
+    scrape_parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of 429s")
+    scrape_parser.set_defaults(func=bench_scrape)
+
+    load_parser = subparsers.add_parser("load", help="compare the database load methods")
+    load_parser.add_argument("--db-url", default=os.environ.get("DB_URL"))
+    load_parser.add_argument(
+        "--table", default="stock-titan-bench-load", help="scratch table, dropped afterwards"
+    )
+    load_parser.add_argument("--rows", type=int, default=20000)
+    load_parser.add_argument("--article-bytes", type=int, default=4000)
+    load_parser.add_argument(
+        "--chunk-sizes", type=int, nargs="+", default=[COPY_CHUNK_SIZE], help="rows per statement"
+    )
+    load_parser.set_defaults(func=bench_load)
+
+    embed_parser = subparsers.add_parser("embed", help="compare embedding batch sizes")
+    embed_parser.add_argument("--model", default=EMBED_MODEL)
+    embed_parser.add_argument("--nodes", type=int, default=512)
+    embed_parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 64])
+    embed_parser.set_defaults(func=bench_embed)
+
+    pool_parser = subparsers.add_parser(
+        "embed_pool", help="compare embedding in process with pools of workers"
+    )
+    pool_parser.add_argument("--model", default=EMBED_MODEL)
+    pool_parser.add_argument("--nodes", type=int, default=4096)
+    pool_parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    pool_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    pool_parser.add_argument(
+        "--threads", type=int, default=0, help="threads per worker, the cores shared by default"
+    )
+    pool_parser.set_defaults(func=bench_embed_pool)
+
+    onnx_parser = subparsers.add_parser(
+        "onnx", help="compare the speed and accuracy of the ONNX exports with torch"
+    )
+    onnx_parser.add_argument("--model", default=EMBED_MODEL)
+    onnx_parser.add_argument("--dir", default=EMBED_ONNX_DIR, help="directory of the exports")
+    onnx_parser.add_argument("--nodes", type=int, default=1024)
+    onnx_parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    onnx_parser.add_argument("--min-similarity", type=float, default=0.99)
+    onnx_parser.set_defaults(func=bench_onnx)
+
+    startup_parser = subparsers.add_parser(
+        "startup", help="time to the first embedding of a fresh loader process"
+    )
+    startup_parser.add_argument("--model", default=EMBED_MODEL)
+    startup_parser.add_argument("--repeat", type=int, default=3)
+    startup_parser.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+import csv
+import hashlib
+import io
+import os
+
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+from schemas import to_table
+
+# Bulk load settings, overridable through the environment
+LOAD_METHOD = os.environ.get("LOAD_METHOD", "copy")
+COPY_CHUNK_SIZE = int(os.environ.get("COPY_CHUNK_SIZE", 10000))
+
+# Written for missing values, so empty strings still load as empty strings
+NULL = r"\N"
+
+# Column holding the digest of the deduplicated fields of a row
+HASH_COLUMN = "content_hash"
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def row_hashes(df: pd.DataFrame, columns: list) -> list:
+    """
+    Returns a 16-byte BLAKE2 digest of the given columns of each row. Missing values hash
+    like empty strings.
+    """
+    values = df[columns].astype(object)
+    values = values.where(values.notna(), "")
+    hashes = []
+    for row in values.itertuples(index=False):
+        digest = hashlib.blake2b(digest_size=16)
+        for value in row:
+            digest.update(str(value).encode("utf-8"))
+            digest.update(b"\x1f")
+        hashes.append(digest.digest())
+    return hashes
+
+
+def _column_type(arrow_type: pa.DataType) -> str:
+    if pa.types.is_timestamp(arrow_type):
+        return "TIMESTAMPTZ" if arrow_type.tz else "TIMESTAMP"
+    return "TEXT"
+
+
+def prepare_table(conn, table: str, schema: pa.Schema) -> None:
+    """
+    Creates the table if it does not exist, the content hash column with the unique index
+    loads deduplicate against, and the index on created_at, if they are missing.
+    """
+    columns = ", ".join(
+        f"{quote_identifier(field.name)} {_column_type(field.type)}" for field in schema
+    )
+    quoted = quote_identifier(table)
+    conn.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {quoted} (id BIGSERIAL PRIMARY KEY, {columns}, "
+            f"created_at TIMESTAMPTZ NOT NULL DEFAULT now(), {HASH_COLUMN} BYTEA)"
+        )
+    )
+    conn.execute(text(f"ALTER TABLE {quoted} ADD COLUMN IF NOT EXISTS {HASH_COLUMN} BYTEA"))
+    index = quote_identifier(f"{table}_{HASH_COLUMN}_key")
+    conn.execute(
+        text(f"CREATE UNIQUE INDEX IF NOT EXISTS {index} ON {quoted} ({HASH_COLUMN})")
+    )
+    # time window reads of the vector load range scan this index
+    index = quote_identifier(f"{table}_created_at_idx")
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index} ON {quoted} (created_at)"))
+
+
+def copy_statement(table: str, columns: list) -> str:
+    """
+    Returns the COPY statement loading CSV rows of the given columns into a table.
+    """
+    column_list = ", ".join(quote_identifier(column) for column in columns)
+    return (
+        f"COPY {quote_identifier(table)} ({column_list}) "
+        f"FROM STDIN WITH (FORMAT csv, NULL '{NULL}')"
+    )
+
+
+def csv_chunks(df: pd.DataFrame, chunk_size: int = COPY_CHUNK_SIZE):
+    """
+    Yields the rows of a DataFrame as CSV buffers of at most chunk_size rows each. Binary
+    columns are written in PostgreSQL's hex format.
+    """
+    df = df.assign(
+        **{
+            column: ["\\x" + value.hex() for value in df[column]]
+            for column in df.columns
+            if len(df) and isinstance(df[column].iloc[0], bytes)
+        }
+    )
+    for start in range(0, len(df), chunk_size):
+        buffer = io.StringIO()
+        df.iloc[start:start + chunk_size].to_csv(
+            buffer,
+            index=False,
+            header=False,
+            na_rep=NULL,
+            quoting=csv.QUOTE_MINIMAL,
+            lineterminator="\n",
+            date_format="%Y-%m-%d %H:%M:%S.%f%z",
+        )
+        buffer.seek(0)
+        yield buffer
+
+
+def copy_frame(
+    conn, df: pd.DataFrame, table: str, chunk_size: int = COPY_CHUNK_SIZE
+) -> int:
+    """
+    Streams a DataFrame into a table with COPY FROM STDIN, chunk by chunk.
+
+    The rows are sent on the connection's current transaction, so a load run inside
+    engine.begin() is committed or rolled back as a whole.
+
+    Args:
+        conn (sqlalchemy.engine.Connection): Connection to PostgreSQL through psycopg2 or
+            psycopg 3.
+        df (pd.DataFrame): The rows to load, with columns named after the table columns.
+        table (str): The table to load into.
+        chunk_size (int): Number of rows sent per COPY statement.
+
+    Returns:
+        int: The number of rows loaded.
+    """
+    statement = copy_statement(table, list(df.columns))
+    cursor = conn.connection.cursor()
+    try:
+        for buffer in csv_chunks(df, chunk_size):
+            if hasattr(cursor, "copy_expert"):
+                cursor.copy_expert(statement, buffer)
+            else:
+                # psycopg 3 streams COPY data through a context manager
+                with cursor.copy(statement) as copy:
+                    copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+    return len(df)
+
+
+def _insert_ignoring_duplicates(pd_table, conn, keys, data_iter):
+    # to_sql insertion method adding ON CONFLICT DO NOTHING to pandas' INSERT
+    rows = [dict(zip(keys, values)) for values in data_iter]
+    statement = insert(pd_table.table).on_conflict_do_nothing(index_elements=[HASH_COLUMN])
+    return conn.execute(statement, rows).rowcount
+
+
+def unique_frames(frames, columns: list):
+    """
+    Adds the content hash of each row to a sequence of DataFrames and drops the rows already
+    seen in the same or an earlier DataFrame.
+
+    Only the 16-byte digests are kept across DataFrames, so memory grows with the number of
+    distinct rows rather than their size.
+    """
+    seen = set()
+    for df in frames:
+        hashes = row_hashes(df, columns)
+        keep = []
+        for digest in hashes:
+            keep.append(digest not in seen)
+            seen.add(digest)
+        df = df.assign(**{HASH_COLUMN: hashes})[keep]
+        if len(df):
+            yield df
+
+
+def _merge_frame(
+    conn, df: pd.DataFrame, table: str, staging: str, method: str, chunk_size: int
+) -> int:
+    # appends the rows of a deduplicated DataFrame that are not in the table yet
+    if method == "to_sql":
+        return df.to_sql(
+            table,
+            con=conn,
+            if_exists="append",
+            index=False,
+            chunksize=chunk_size,
+            method=_insert_ignoring_duplicates,
+        )
+
+    column_list = ", ".join(quote_identifier(column) for column in df.columns)
+    copy_frame(conn, df, staging, chunk_size)
+    result = conn.execute(
+        text(
+            f"INSERT INTO {quote_identifier(table)} ({column_list}) "
+            f"SELECT {column_list} FROM {quote_identifier(staging)} "
+            f"ON CONFLICT ({HASH_COLUMN}) DO NOTHING"
+        )
+    )
+    conn.execute(text(f"TRUNCATE {quote_identifier(staging)}"))
+    return result.rowcount
+
+
+def load_frames(
+    engine,
+    frames,
+    table: str,
+    schema: pa.Schema,
+    method: str = LOAD_METHOD,
+    chunk_size: int = COPY_CHUNK_SIZE,
+) -> int:
+    """
+    Appends the rows of a sequence of DataFrames that are not in the table yet, in a single
+    transaction.
+
+    Each row is keyed by a hash of the schema's columns, stored in the content_hash column,
+    whose unique index makes rows that are already loaded conflict and be skipped. The
+    DataFrames are consumed one at a time, so a generator reading files chunk by chunk keeps
+    memory bounded by the size of a chunk.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): Engine of the database.
+        frames (iterable): DataFrames with the columns of the schema, and optionally their
+            content_hash as computed by unique_frames, which is reused.
+        table (str): The table to load into, created if it does not exist.
+        schema (pyarrow.Schema): The columns of the table, which are hashed.
+        method (str): "copy" to stream the rows with COPY into a staging table merged into
+            the table, "to_sql" to insert them with pandas' parameterized INSERT statements.
+        chunk_size (int): Number of rows sent per statement.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    if method not in ("copy", "to_sql"):
+        raise ValueError(f"Unknown load method: {method}")
+
+    staging = f"{table}_staging"
+    columns = schema.names + [HASH_COLUMN]
+    inserted = 0
+    with engine.begin() as conn:
+        prepare_table(conn, table, schema)
+        if method == "copy":
+            column_list = ", ".join(quote_identifier(column) for column in columns)
+            conn.execute(
+                text(
+                    f"CREATE TEMPORARY TABLE {quote_identifier(staging)} ON COMMIT DROP AS "
+                    f"SELECT {column_list} FROM {quote_identifier(table)} WITH NO DATA"
+                )
+            )
+        for df in frames:
+            if HASH_COLUMN not in df.columns:
+                df = df.assign(**{HASH_COLUMN: row_hashes(df, schema.names)})
+            df = df[columns].drop_duplicates(subset=HASH_COLUMN)
+            inserted += _merge_frame(conn, df, table, staging, method, chunk_size)
+    return inserted
+
+
+def load_frame(
+    engine,
+    df: pd.DataFrame,
+    table: str,
+    schema: pa.Schema,
+    method: str = LOAD_METHOD,
+    chunk_size: int = COPY_CHUNK_SIZE,
+) -> int:
+    """
+    Appends the rows of a DataFrame that are not in the table yet, in a single transaction.
+    See load_frames.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    return load_frames(engine, [df], table, schema, method, chunk_size)
+
+
+def backfill_hashes(
+    engine, table: str, schema: pa.Schema, chunk_size: int = COPY_CHUNK_SIZE
+) -> tuple:
+    """
+    Fills in the content hash of the rows loaded before the table had one, deleting the
+    rows that duplicate an older row, in a single transaction.
+
+    Returns:
+        tuple: The number of rows hashed and the number of duplicate rows deleted.
+    """
+    quoted = quote_identifier(table)
+    column_list = ", ".join(quote_identifier(column) for column in schema.names)
+    hashed = deleted = 0
+    seen = set()
+
+    with engine.begin() as conn:
+        prepare_table(conn, table, schema)
+        unhashed = text(
+            f"SELECT id, {column_list} FROM {quoted} "
+            f"WHERE {HASH_COLUMN} IS NULL ORDER BY id"
+        ).execution_options(stream_results=True, yield_per=chunk_size)
+        result = conn.execute(unhashed)
+        for rows in result.partitions():
+            df = pd.DataFrame(rows, columns=["id"] + schema.names)
+            typed = to_table(df[schema.names], schema).to_pandas()
+            hashes = row_hashes(typed, schema.names)
+            existing = conn.execute(
+                text(f"SELECT {HASH_COLUMN} FROM {quoted} WHERE {HASH_COLUMN} = ANY(:hashes)"),
+                {"hashes": hashes},
+            )
+            existing = {bytes(row[0]) for row in existing}
+
+            keep, drop = [], []
+            for row_id, digest in zip(df["id"].tolist(), hashes):
+                if digest in seen or digest in existing:
+                    drop.append(row_id)
+                else:
+                    seen.add(digest)
+                    keep.append((row_id, digest))
+
+            if keep:
+                conn.execute(
+                    text(
+                        f"UPDATE {quoted} SET {HASH_COLUMN} = v.digest "
+                        "FROM (SELECT unnest(CAST(:ids AS BIGINT[])) AS id, "
+                        "unnest(CAST(:digests AS BYTEA[])) AS digest) AS v "
+                        f"WHERE {quoted}.id = v.id"
+                    ),
+                    {"ids": [row[0] for row in keep], "digests": [row[1] for row in keep]},
+                )
+            if drop:
+                conn.execute(text(f"DELETE FROM {quoted} WHERE id = ANY(:ids)"), {"ids": drop})
+            hashed += len(keep)
+            deleted += len(drop)
+
+    return hashed, deleted
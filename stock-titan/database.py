@@ -0,0 +1,96 @@
+import os
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+
+from bulk_load import quote_identifier
+
+_engines = {}
+
+
+def pool_settings() -> dict:
+    """
+    Returns the connection pool settings, overridable through the environment. They are
+    read when an engine is created rather than on import, so a .env file loaded after the
+    imports still applies.
+
+        DB_URL                 database connected to by default
+        DB_POOL_SIZE           connections kept open, 5 by default
+        DB_MAX_OVERFLOW        connections opened beyond the pool under load, 5 by default
+        DB_POOL_RECYCLE        seconds after which a connection is replaced, 1800 by default
+        DB_POOL_PRE_PING       1 to test connections before use, the default
+        DB_STATEMENT_TIMEOUT   milliseconds a statement may run, 0 for no limit
+        DB_PREPARE_THRESHOLD   executions of a statement after which psycopg 3 prepares it
+                               on the server, -1 to never prepare. psycopg2 has no
+                               server-side prepared statements and ignores it.
+    """
+    return {
+        "url": os.environ.get("DB_URL"),
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 5)),
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "1") == "1",
+        "statement_timeout": int(os.environ.get("DB_STATEMENT_TIMEOUT", 0)),
+        "prepare_threshold": int(os.environ.get("DB_PREPARE_THRESHOLD", 5)),
+    }
+
+
+def engine_options(url: str) -> dict:
+    """
+    Returns the create_engine arguments of the configured pool for a database URL.
+    """
+    settings = pool_settings()
+    connect_args = {}
+    if settings["statement_timeout"]:
+        connect_args["options"] = f"-c statement_timeout={settings['statement_timeout']}"
+    if make_url(url).get_driver_name() == "psycopg":
+        threshold = settings["prepare_threshold"]
+        connect_args["prepare_threshold"] = None if threshold < 0 else threshold
+    return {
+        "pool_size": settings["pool_size"],
+        "max_overflow": settings["max_overflow"],
+        "pool_recycle": settings["pool_recycle"],
+        "pool_pre_ping": settings["pool_pre_ping"],
+        "connect_args": connect_args,
+    }
+
+
+def get_engine(url: str = None):
+    """
+    Returns the engine of a database, DB_URL by default, created with the configured pool on
+    first use and shared by every later caller in the process, so the stages of a run reuse
+    the same connections.
+    """
+    url = url or pool_settings()["url"]
+    if not url:
+        raise ValueError("Set DB_URL to the database to connect to")
+    if url not in _engines:
+        _engines[url] = create_engine(url, **engine_options(url))
+    return _engines[url]
+
+
+def dispose_engines() -> None:
+    """
+    Closes the pooled connections of every engine created by get_engine.
+    """
+    for engine in _engines.values():
+        engine.dispose()
+    _engines.clear()
+
+
+def window_query(table: str, columns: list, time_column: str = "created_at"):
+    """
+    Returns a query of the given columns of the rows of a table whose time column falls in
+    the half-open window [:start, :end), oldest first.
+
+    The bounds are timestamps with time zone, or None for the start and end of the current
+    day. The column is compared as is, so the query can range scan an index on it.
+    """
+    column_list = ", ".join(quote_identifier(column) for column in columns)
+    quoted = quote_identifier(time_column)
+    return text(
+        f"SELECT {column_list} FROM {quote_identifier(table)} "
+        f"WHERE {quoted} >= COALESCE(CAST(:start AS TIMESTAMPTZ), CURRENT_DATE) "
+        f"AND {quoted} < COALESCE(CAST(:end AS TIMESTAMPTZ), CURRENT_DATE + 1) "
+        f"ORDER BY {quoted}"
+    )
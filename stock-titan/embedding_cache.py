@@ -0,0 +1,248 @@
+import hashlib
+import os
+import re
+import sqlite3
+
+import numpy as np
+
+# Location and size of the embedding cache, overridable through the environment. The text
+# embedded for a node includes its metadata, such as its source, url and created_at, so
+# an embedding is only reused when the same rows are embedded again, as when a window is
+# reloaded or a failed load is retried. Set EMBED_CACHE_DIR to an empty string to disable
+# the cache.
+EMBED_CACHE_DIR = os.environ.get(
+    "EMBED_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "finance-data", "embeddings"),
+)
+EMBED_CACHE_MAX_BYTES = int(os.environ.get("EMBED_CACHE_MAX_BYTES", 1 << 30))
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of the embeddings of a model, keyed by a digest of the model name and
+    the embedded text.
+
+    Vectors are appended as float32 rows to a flat file read through a memory map, so a
+    lookup only touches the pages of the rows it returns. The row of each key is kept in a
+    SQLite table without rowids, which also serializes appends from concurrent runs.
+
+    When the vectors outgrow max_bytes, the oldest rows are dropped down to three quarters
+    of it. The file is rewritten under a new generation number, so a run still reading the
+    previous file keeps a consistent view.
+
+        root/BAAI_bge-small-en-v1.5/index.sqlite3
+        root/BAAI_bge-small-en-v1.5/vectors-0.f32
+
+    Args:
+        model_name (str): Name of the model the embeddings come from.
+        root (str): Directory of the cache. The cache is disabled when empty or None.
+        max_bytes (int): Size of the vectors beyond which the oldest ones are evicted.
+    """
+
+    def __init__(self, model_name, root=EMBED_CACHE_DIR, max_bytes=EMBED_CACHE_MAX_BYTES):
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.dir = None
+        self.conn = None
+        self._map = None
+        self._map_key = None
+        if not root:
+            return
+
+        self.dir = os.path.join(root, re.sub(r"[^\w.-]+", "_", model_name))
+        os.makedirs(self.dir, exist_ok=True)
+        # transactions are opened explicitly, so appends hold the write lock throughout
+        self.conn = sqlite3.connect(
+            os.path.join(self.dir, "index.sqlite3"), isolation_level=None, timeout=60
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors "
+            "(key BLOB PRIMARY KEY, row INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        if self.conn is None:
+            return 0
+        return self.conn.execute("SELECT count(*) FROM vectors").fetchone()[0]
+
+    @property
+    def enabled(self) -> bool:
+        return self.conn is not None
+
+    def key(self, text: str) -> bytes:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self.model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+        return digest.digest()
+
+    def _meta(self) -> tuple:
+        # returns the dimension of the vectors, None before the first put, and the generation
+        meta = dict(self.conn.execute("SELECT name, value FROM meta"))
+        return meta.get("dim"), meta.get("generation", 0)
+
+    def _vectors_path(self, generation: int) -> str:
+        return os.path.join(self.dir, f"vectors-{generation}.f32")
+
+    def _vectors(self, generation: int, dim: int, rows: int) -> np.ndarray:
+        # maps the vectors file, again if it was replaced or has grown past the mapping
+        if self._map_key == generation and len(self._map) >= rows:
+            return self._map
+        path = self._vectors_path(generation)
+        count = os.path.getsize(path) // (4 * dim)
+        self._map = np.memmap(path, dtype=np.float32, mode="r", shape=(count, dim))
+        self._map_key = generation
+        return self._map
+
+    def get(self, keys: list) -> dict:
+        """
+        Returns the cached vectors of the given keys, as a dictionary of key to float32 array.
+        Keys that are not cached are left out.
+        """
+        if self.conn is None or not keys:
+            return {}
+
+        self.conn.execute("BEGIN")
+        try:
+            dim, generation = self._meta()
+            rows = {}
+            unique = list(dict.fromkeys(keys))
+            for start in range(0, len(unique), _LOOKUP_BATCH):
+                batch = unique[start:start + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows.update(
+                    self.conn.execute(
+                        f"SELECT key, row FROM vectors WHERE key IN ({placeholders})", batch
+                    )
+                )
+            if not rows:
+                return {}
+            try:
+                vectors = self._vectors(generation, dim, max(rows.values()) + 1)
+            except FileNotFoundError:
+                return {}  # evicted by another run since the lookup
+            found = vectors[list(rows.values())]
+        finally:
+            self.conn.execute("COMMIT")
+        return dict(zip(rows.keys(), found))
+
+    def put(self, keys: list, vectors) -> None:
+        """
+        Appends the vectors of the given keys that are not cached yet, then evicts the oldest
+        vectors if the cache has outgrown its size.
+        """
+        if self.conn is None or not keys:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            dim, generation = self._meta()
+            if dim is None:
+                dim = vectors.shape[1]
+                self.conn.execute("INSERT INTO meta (name, value) VALUES ('dim', ?)", (dim,))
+            elif dim != vectors.shape[1]:
+                raise ValueError(f"Expected vectors of {dim} dimensions, got {vectors.shape[1]}")
+
+            cached = set()
+            for start in range(0, len(keys), _LOOKUP_BATCH):
+                batch = list(keys[start:start + _LOOKUP_BATCH])
+                placeholders = ",".join("?" * len(batch))
+                cached.update(
+                    row[0]
+                    for row in self.conn.execute(
+                        f"SELECT key FROM vectors WHERE key IN ({placeholders})", batch
+                    )
+                )
+            new = {}
+            for key, vector in zip(keys, vectors):
+                if key not in cached:
+                    new.setdefault(key, vector)
+            if not new:
+                self.conn.execute("COMMIT")
+                return
+
+            with open(self._vectors_path(generation), "ab") as f:
+                # drop a row cut short by an interrupted run before appending
+                first = f.tell() // (4 * dim)
+                f.truncate(first * 4 * dim)
+                f.write(np.stack(list(new.values())).tobytes())
+            self.conn.executemany(
+                "INSERT INTO vectors (key, row) VALUES (?, ?)",
+                [(key, first + i) for i, key in enumerate(new)],
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        if (first + len(new)) * 4 * dim > self.max_bytes:
+            self.evict()
+
+    def evict(self, target_bytes: int = None) -> int:
+        """
+        Drops the oldest vectors until the rest fit in target_bytes, three quarters of
+        max_bytes by default.
+
+        Returns:
+            int: The number of vectors dropped.
+        """
+        if self.conn is None:
+            return 0
+        target_bytes = self.max_bytes * 3 // 4 if target_bytes is None else target_bytes
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            dim, generation = self._meta()
+            path = self._vectors_path(generation)
+            if dim is None or not os.path.exists(path):
+                self.conn.execute("COMMIT")
+                return 0
+            row_bytes = 4 * dim
+            rows = os.path.getsize(path) // row_bytes
+            cutoff = max(0, rows - target_bytes // row_bytes)
+            if not cutoff:
+                self.conn.execute("COMMIT")
+                return 0
+
+            new_path = self._vectors_path(generation + 1)
+            with open(path, "rb") as src, open(new_path, "wb") as dst:
+                src.seek(cutoff * row_bytes)
+                while block := src.read(1 << 24):
+                    dst.write(block)
+                dst.truncate((rows - cutoff) * row_bytes)
+            dropped = self.conn.execute("DELETE FROM vectors WHERE row < ?", (cutoff,)).rowcount
+            self.conn.execute("UPDATE vectors SET row = row - ?", (cutoff,))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('generation', ?)",
+                (generation + 1,),
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        # runs that mapped the previous file keep reading it until they unmap it
+        os.remove(path)
+        return dropped
+
+    def close(self) -> None:
+        self._map = None
+        self._map_key = None
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,182 @@
+import multiprocessing
+import os
+import queue
+import traceback
+
+import numpy as np
+
+from embeddings import EMBED_BATCH_SIZE, EMBED_MODEL, _embed_batched, get_model, length_buckets
+
+# Embedding worker settings, overridable through the environment. With fewer than two
+# workers the nodes are embedded in the loader's own process.
+EMBED_WORKERS = int(os.environ.get("EMBED_WORKERS", 0))
+# Threads each worker computes with, by default the cores shared evenly between the workers
+EMBED_THREADS = int(os.environ.get("EMBED_THREADS", 0))
+# Texts sent to a worker at once. Smaller shards balance the workers better, larger ones
+# leave them fewer gaps between batches.
+EMBED_SHARD_SIZE = int(os.environ.get("EMBED_SHARD_SIZE", 256))
+
+# Seconds between checks that the workers are still alive while waiting for results
+_POLL_INTERVAL = 1.0
+
+
+def thread_budget(workers: int, threads: int = EMBED_THREADS) -> int:
+    """
+    Returns the number of threads each of the given number of workers computes with.
+    """
+    if threads > 0:
+        return threads
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def _limit_threads(threads: int) -> None:
+    # caps the threads of the math libraries, before torch is imported so OpenMP reads it
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[variable] = str(threads)
+    try:
+        import torch
+    except ImportError:
+        return  # a model without torch only sees the environment
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+
+def _worker(name, batch_size, threads, loader, tasks, results) -> None:
+    # embeds the shards of the task queue until it reads None
+    _limit_threads(threads)
+    try:
+        model = loader(name, batch_size)
+    except BaseException:
+        results.put((None, None, traceback.format_exc()))
+        return
+    while (task := tasks.get()) is not None:
+        shard, texts = task
+        try:
+            vectors = np.asarray(_embed_batched(model, texts, batch_size), dtype=np.float32)
+            results.put((shard, np.ascontiguousarray(vectors), None))
+        except BaseException:
+            results.put((shard, None, traceback.format_exc()))
+
+
+class EmbeddingPool:
+    """
+    Embeds texts in worker processes that each load the model once and compute with a fixed
+    number of threads, so the workers together use the cores without contending for them.
+
+    Texts are split into shards of similar length, put on a queue shared by the workers, and
+    each worker returns the vectors of a shard as a single float32 array. The workers are
+    started on the first texts to embed and stopped by close.
+
+    Args:
+        workers (int): Number of worker processes.
+        threads (int, optional): Threads per worker, the cores shared evenly by default.
+        name (str): Name of the embedding model.
+        batch_size (int): Number of texts a worker embeds at once.
+        shard_size (int): Number of texts sent to a worker at once.
+        loader (callable): Returns the model of a name and batch size in a worker.
+    """
+
+    def __init__(
+        self,
+        workers=EMBED_WORKERS,
+        threads=EMBED_THREADS,
+        name=EMBED_MODEL,
+        batch_size=EMBED_BATCH_SIZE,
+        shard_size=EMBED_SHARD_SIZE,
+        loader=get_model,
+    ):
+        self.workers = max(1, workers)
+        self.threads = thread_budget(self.workers, threads)
+        self.name = name
+        self.batch_size = batch_size
+        self.shard_size = max(batch_size, shard_size)
+        self.loader = loader
+        self._processes = []
+        self._tasks = None
+        self._results = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _start(self) -> None:
+        # spawned rather than forked, so no worker inherits a parent's torch thread pool
+        context = multiprocessing.get_context("spawn")
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        for _ in range(self.workers):
+            process = context.Process(
+                target=_worker,
+                args=(
+                    self.name,
+                    self.batch_size,
+                    self.threads,
+                    self.loader,
+                    self._tasks,
+                    self._results,
+                ),
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+
+    def _result(self) -> tuple:
+        # waits for the next result, failing if a worker died without reporting
+        while True:
+            try:
+                shard, vectors, error = self._results.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if any(not process.is_alive() for process in self._processes):
+                    self.close()
+                    raise RuntimeError("An embedding worker exited unexpectedly")
+                continue
+            if error is not None:
+                self.close()
+                raise RuntimeError(f"An embedding worker failed:\n{error}")
+            return shard, vectors
+
+    def embed(self, texts: list) -> np.ndarray:
+        """
+        Returns the embeddings of the texts as a float32 array with a row per text, in the
+        order of the texts.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        if not self._processes:
+            self._start()
+
+        shards = length_buckets(texts, self.shard_size)
+        for shard, positions in enumerate(shards):
+            self._tasks.put((shard, [texts[i] for i in positions]))
+
+        embeddings = None
+        for _ in shards:
+            shard, vectors = self._result()
+            if embeddings is None:
+                embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            embeddings[shards[shard]] = vectors
+        return embeddings
+
+    def get_text_embedding_batch(self, texts: list) -> list:
+        return self.embed(texts).tolist()
+
+    def close(self) -> None:
+        """
+        Stops the workers once they have finished the shards already queued.
+        """
+        if not self._processes:
+            return
+        for process in self._processes:
+            if process.is_alive():
+                self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        self._tasks.close()
+        self._results.close()
+        self._tasks = None
+        self._results = None
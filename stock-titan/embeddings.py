@@ -0,0 +1,128 @@
+import os
+import threading
+
+# Embedding settings, overridable through the environment
+EMBED_MODEL = os.environ.get("EMBED_MODEL", "BAAI/bge-small-en-v1.5")
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 32))
+# Runtime the model is computed with: "torch", or "onnx" for the exported model of
+# onnx_embedding.py
+EMBED_BACKEND = os.environ.get("EMBED_BACKEND", "torch")
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(
+    name: str = EMBED_MODEL, batch_size: int = EMBED_BATCH_SIZE, backend: str = EMBED_BACKEND
+):
+    """
+    Returns the embedding model of the given name and backend, loaded on first use and
+    shared by every later caller in the process.
+
+    llama-index, transformers, torch and onnxruntime are only imported here, so a run that
+    finds every embedding in the cache never pays for them.
+    """
+    with _models_lock:
+        key = (backend, name)
+        if key not in _models:
+            if backend == "torch":
+                from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+                _models[key] = HuggingFaceEmbedding(model_name=name, embed_batch_size=batch_size)
+            elif backend == "onnx":
+                from onnx_embedding import load_onnx_model
+
+                _models[key] = load_onnx_model(name, batch_size)
+            else:
+                raise ValueError(f"Unknown embedding backend: {backend}")
+        model = _models[key]
+        model.embed_batch_size = max(model.embed_batch_size, batch_size)
+        return model
+
+
+def model_id(name: str = EMBED_MODEL, backend: str = EMBED_BACKEND) -> str:
+    """
+    Returns the name the embeddings of a model and backend are cached under. The int8 ONNX
+    model embeds slightly differently from the original, so its embeddings are kept apart.
+    """
+    if backend == "torch":
+        return name
+    from onnx_embedding import EMBED_ONNX_QUANTIZE
+
+    return f"{name}-{backend}-int8" if EMBED_ONNX_QUANTIZE else f"{name}-{backend}"
+
+
+class LazyModel:
+    """
+    Stands in for an embedding model until it embeds something, and only then gets the
+    model from the registry.
+    """
+
+    def __init__(self, name: str = EMBED_MODEL, batch_size: int = EMBED_BATCH_SIZE):
+        self.name = name
+        self.batch_size = batch_size
+
+    def get_text_embedding_batch(self, texts: list) -> list:
+        return get_model(self.name, self.batch_size).get_text_embedding_batch(texts)
+
+
+def length_buckets(texts: list, batch_size: int = EMBED_BATCH_SIZE) -> list:
+    """
+    Splits the positions of the texts into batches of at most batch_size texts of similar
+    length, so the texts of a batch are padded to about the same number of tokens.
+
+    Texts are ordered by their number of words, which follows the number of tokens closely
+    enough to group them without running the tokenizer.
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i].split()))
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def _embed_batched(model, texts: list, batch_size: int) -> list:
+    # embeds texts in batches of similar length, returning the embeddings in text order
+    embeddings = [None] * len(texts)
+    for bucket in length_buckets(texts, batch_size):
+        vectors = model.get_text_embedding_batch([texts[i] for i in bucket])
+        for i, vector in zip(bucket, vectors):
+            embeddings[i] = vector
+    return embeddings
+
+
+def embed_texts(model, texts: list, batch_size: int = EMBED_BATCH_SIZE, cache=None) -> list:
+    """
+    Embeds texts in batches of similar length and returns their embeddings in the order of
+    the texts.
+
+    With a cache, only the texts it misses are embedded, each once however many times it
+    appears, and their embeddings are added to it.
+
+    Args:
+        model (BaseEmbedding): Embedding model, whose embed_batch_size should be at least
+            batch_size so it does not split the batches further.
+        texts (list): The texts to embed.
+        batch_size (int): Number of texts embedded at once.
+        cache (EmbeddingCache, optional): Cache of the model's embeddings.
+    """
+    if cache is None or not cache.enabled:
+        return _embed_batched(model, texts, batch_size)
+
+    keys = [cache.key(text) for text in texts]
+    found = {key: vector.tolist() for key, vector in cache.get(keys).items()}
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in found:
+            missing.setdefault(key, text)
+    if missing:
+        vectors = _embed_batched(model, list(missing.values()), batch_size)
+        cache.put(list(missing), vectors)
+        found.update(zip(missing, vectors))
+    return [found[key] for key in keys]
+
+
+def embed_nodes(model, nodes: list, batch_size: int = EMBED_BATCH_SIZE, cache=None) -> None:
+    """
+    Sets the embedding of each node to the embedding of its content and metadata.
+    """
+    texts = [node.get_content(metadata_mode="all") for node in nodes]
+    for node, embedding in zip(nodes, embed_texts(model, texts, batch_size, cache)):
+        node.embedding = embedding
@@ -1,14 +1,27 @@
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
+from glob import glob
 import logging
 from logging.handlers import RotatingFileHandler
 import os
 import re
+import time
+from urllib.parse import urlsplit
 
 import asyncio
 import aiohttp
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from datetime import date, timedelta
-import pandas as pd
+
+from http_cache import HTTPCache
+from rate_control import AdaptiveLimiter, get_text
+from seen_index import SeenIndex
+from schemas import ARTICLE_SCHEMA, OUTPUT_FORMAT
+from sinks import RecordSink
+from snapshots import REPARSE_WORKERS, SnapshotStore, read_snapshot
 
 # Create logs directory if it does not exist
 if not os.path.exists('logs'):
@@ -30,31 +43,205 @@ file_handler_formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname
 log_file_handler.setFormatter(file_handler_formatter)
 logger.addHandler(log_file_handler)
 
-BASE_URL = "https://www.stocktitan.net"
+BASE_URL = os.environ.get("STOCKTITAN_BASE_URL", "https://www.stocktitan.net")
+COLUMNS = ["title", "datetime", "impact_score", "sentiment", "summary", "article"]
+
+# Fetch engine settings, overridable through the environment
+MAX_CONCURRENCY = int(os.environ.get("STOCKTITAN_MAX_CONCURRENCY", 32))
+MAX_PER_HOST = int(os.environ.get("STOCKTITAN_MAX_PER_HOST", 32))
+# Requests in flight the adaptive limit starts from before it grows or backs off
+INITIAL_CONCURRENCY = int(os.environ.get("STOCKTITAN_INITIAL_CONCURRENCY", 8))
+POOL_SIZE = int(os.environ.get("STOCKTITAN_POOL_SIZE", 64))
+DNS_CACHE_TTL = int(os.environ.get("STOCKTITAN_DNS_CACHE_TTL", 300))
+KEEPALIVE_TIMEOUT = float(os.environ.get("STOCKTITAN_KEEPALIVE_TIMEOUT", 30))
+CONNECT_TIMEOUT = float(os.environ.get("STOCKTITAN_CONNECT_TIMEOUT", 10))
+REQUEST_TIMEOUT = float(os.environ.get("STOCKTITAN_REQUEST_TIMEOUT", 60))
+# BeautifulSoup tree builder used to parse pages, "lxml" or "html.parser"
+HTML_PARSER = os.environ.get("HTML_PARSER", "lxml")
+# Number of processes parsing pages, 0 parses inside the event loop
+PARSE_WORKERS = int(os.environ.get("STOCKTITAN_PARSE_WORKERS", os.cpu_count() or 1))
+# Number of dates a backfill scrapes at the same time and where it records finished dates
+BACKFILL_WORKERS = int(os.environ.get("STOCKTITAN_BACKFILL_WORKERS", 4))
+CHECKPOINT_PATH = os.environ.get("STOCKTITAN_CHECKPOINT", "cache/backfill.checkpoint")
+
+
+class FetchEngine:
+    """
+    Owns the aiohttp session used by the crawler and bounds how many requests are in flight.
+
+    Requests are limited globally and per host, the connection pool is sized and kept alive
+    between requests, DNS lookups are cached and every request has a timeout. The global
+    limit adapts to the server: it starts at initial_concurrency, backs off when requests are
+    throttled or fail, which are retried, and grows up to max_concurrency, or max_per_host
+    if lower, while responses are healthy. Slots are only held while a request is in flight,
+    not while it waits to be retried.
+
+    Args:
+        max_concurrency (int): Maximum number of requests in flight across all hosts.
+        max_per_host (int): Maximum number of requests in flight against a single host.
+        initial_concurrency (int): Number of requests in flight the adaptive limit starts at.
+        pool_size (int): Maximum number of pooled connections kept by the connector.
+        dns_cache_ttl (int): Seconds a resolved host name is cached for.
+        keepalive_timeout (float): Seconds an idle connection is kept open for reuse.
+        connect_timeout (float): Seconds allowed to establish a connection.
+        request_timeout (float): Seconds allowed for a whole request, including the body.
+        cache (HTTPCache): Optional on-disk cache consulted before each request.
+        snapshots (SnapshotStore): Optional archive the raw HTML of articles is kept in.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=MAX_CONCURRENCY,
+        max_per_host=MAX_PER_HOST,
+        initial_concurrency=INITIAL_CONCURRENCY,
+        pool_size=POOL_SIZE,
+        dns_cache_ttl=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        connect_timeout=CONNECT_TIMEOUT,
+        request_timeout=REQUEST_TIMEOUT,
+        cache=None,
+        snapshots=None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host
+        self.pool_size = pool_size
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+        self.cache = cache if cache is not None else HTTPCache(root=None)
+        self.snapshots = snapshots if snapshots is not None else SnapshotStore(root=None)
+        self.session = None
+        # the adaptive limit can grow as far as the per-host one allows, which is all of it
+        # for a single host
+        self.limiter = AdaptiveLimiter(
+            initial=initial_concurrency, maximum=min(max_concurrency, max_per_host)
+        )
+        self._host_slots = defaultdict(lambda: asyncio.Semaphore(max_per_host))
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.max_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+            enable_cleanup_closed=True,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=self.request_timeout, sock_connect=self.connect_timeout
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+        self.session = None
+
+    def slot(self, url):
+        """
+        Returns the per-host semaphore guarding requests to the host of the given URL.
+        """
+        return self._host_slots[urlsplit(url).netloc]
 
-async def fetch(url, session):
+    async def get(self, url):
+        """
+        Performs a GET request once a global and a per-host slot are available, retrying
+        throttled and failed requests.
+
+        Args:
+            url (str): The URL to fetch.
+
+        Returns:
+            tuple: The response status code and the text content of the response.
+        """
+        html, headers = self.cache.lookup(url)
+        if html is not None:
+            logger.info(f"Serving {url} from cache")
+            return 200, html
+
+        logger.info(f"Requesting {url}")
+        status, response_headers, html = await get_text(
+            self.session,
+            url,
+            self.limiter,
+            headers=headers,
+            logger=logger,
+            host_slot=self.slot(url),
+        )
+        return self.cache.store(url, status, html, response_headers)
+
+
+async def fetch(url, engine):
     """
-    Asynchronously fetches data from the specified URL using the provided session.
+    Asynchronously fetches data from the specified URL using the provided fetch engine.
 
     Args:
         url (str): The URL to fetch data from.
-        session (aiohttp.ClientSession): The aiohttp client session to use for the request.
+        engine (FetchEngine): The fetch engine to use for the request.
 
     Returns:
-        str: The text content of the response.
+        str: The text content of the response, or an empty string if the request failed.
     """
-    async with session.get(url) as response:
-        logger.info(f"Requesting {url}")
-        return await response.text()
+    try:
+        status, html = await engine.get(url)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error(f"Request to {url} failed: {e!r}")
+        return ""
 
+    if status >= 400:
+        logger.error(f"Failed to load {url} with status code {status}")
+        return ""
+    return html
 
-async def process_article(article_url, session, data):
+
+# Elements read from the pages, only they are built into the tree when parsing
+ARTICLE_CLASSES = {
+    "article",
+    "impact-bar-container",
+    "sentiment-bar-container",
+    "news-card-summary",
+}
+
+
+def _classes(attrs):
     """
-    Asynchronously processes an article given its URL, a session, and a data list.
+    Returns the classes of an element while the page is being parsed, when the class
+    attribute has not been split into a list yet.
     """
-    html = await fetch(article_url, session)
-    logger.info(f"Processing {article_url}")
-    soup = BeautifulSoup(html, "html.parser")
+    classes = attrs.get("class") or ""
+    return classes.split() if isinstance(classes, str) else classes
+
+
+def _article_element(name, attrs):
+    return name in ("h1", "time") or (
+        name == "div" and not ARTICLE_CLASSES.isdisjoint(_classes(attrs))
+    )
+
+
+def _news_row(name, attrs):
+    return name == "div" and "news-row" in _classes(attrs)
+
+
+ARTICLE_STRAINER = SoupStrainer(_article_element)
+LINKS_STRAINER = SoupStrainer(_news_row)
+
+
+def parse_article(html, parser=HTML_PARSER, parse_only=ARTICLE_STRAINER):
+    """
+    Extracts the fields of an article from the HTML of its page.
+
+    This is a plain function of the page so it can run in a worker process.
+
+    Args:
+        html (str): The HTML of the article page.
+        parser (str): The BeautifulSoup tree builder to parse the page with.
+        parse_only (SoupStrainer): Restricts parsing to the elements that are read,
+            None parses the whole page.
+
+    Returns:
+        dict: The title, datetime, impact score, sentiment, summary and text of the article.
+    """
+    soup = BeautifulSoup(html, parser, parse_only=parse_only)
     article = soup.find("div", class_="article")
     title = soup.find("h1")
     datetime = soup.find("time")
@@ -77,7 +264,7 @@ async def process_article(article_url, session, data):
         else None
     )
 
-    result = {
+    return {
         "title": title.text.strip() if title is not None else "",
         "datetime": datetime.get("datetime") if datetime is not None else "",
         "impact_score": impact.text.strip().split("(")[-1].split(")")[0]
@@ -87,71 +274,288 @@ async def process_article(article_url, session, data):
         if sentiment is not None
         else "",
         "summary": summary.get_text().strip() if summary is not None else "",
-        "article": re.sub("\s+", " ", article.get_text()).strip()
+        "article": re.sub(r"\s+", " ", article.get_text()).strip()
         if article is not None
         else "",
     }
 
-    data.append(result)
 
+def parse_links(html, parser=HTML_PARSER, parse_only=LINKS_STRAINER):
+    """
+    Extracts the links of the articles listed on a day page.
+
+    Args:
+        html (str): The HTML of the day page.
+        parser (str): The BeautifulSoup tree builder to parse the page with.
+        parse_only (SoupStrainer): Restricts parsing to the news rows, None parses the whole page.
+
+    Returns:
+        list: The links of the articles, relative to BASE_URL.
+    """
+    soup = BeautifulSoup(html, parser, parse_only=parse_only)
+    news_rows = soup.find_all("div", class_="news-row")
+    return [row.find("a", class_="feed-link").get("href") for row in news_rows]
+
+
+async def parse(func, html, executor=None):
+    """
+    Runs a parse function on a page, in the given process pool if there is one so the
+    event loop keeps downloading while pages are parsed.
+    """
+    if executor is None:
+        return func(html)
+    return await asyncio.get_running_loop().run_in_executor(executor, func, html)
+
+
+async def process_article(article_url, engine, sink, executor=None):
+    """
+    Asynchronously processes an article given its URL, a fetch engine, and a record sink.
+    Returns the URL of the article if it was processed, None otherwise.
+    """
+    html = await fetch(article_url, engine)
+    if not html:
+        return None
+    await engine.snapshots.put_async(article_url, html, kind="article")
+    logger.info(f"Processing {article_url}")
+    result = await parse(parse_article, html, executor)
+    sink.write(result)
+    return article_url
 
-async def process_date(date_str, session, data):
+
+async def process_date(date_str, engine, sink, seen=None, executor=None):
     """
     Asynchronously processes the given date string to fetch news articles from the stocktitan website. 
     Parameters:
         date_str (str): The date string used to construct the URL for fetching news articles.
-        session (aiohttp.ClientSession): The aiohttp client session used for making HTTP requests.
-        data (dict): A dictionary containing additional data to be processed along with the news articles.
+        engine (FetchEngine): The fetch engine used for making HTTP requests.
+        sink (RecordSink): The sink the parsed news articles are written to.
+        seen (SeenIndex, optional): Index of already scraped articles, which are skipped.
+        executor (ProcessPoolExecutor, optional): Process pool the pages are parsed in.
 
     Returns:
-        None
+        tuple: The URLs of the articles that were processed, and the number of pages that
+            failed to load, counting the day page itself.
     """
-    url = f"https://www.stocktitan.net/news/{date_str}/"
-    html = await fetch(url, session)
-    soup = BeautifulSoup(html, "html.parser")
-    news_rows = soup.find_all("div", class_="news-row")
-    all_links = [
-        BASE_URL + row.find("a", class_="feed-link").get("href") for row in news_rows
-    ]
+    url = f"{BASE_URL}/news/{date_str}/"
+    html = await fetch(url, engine)
+    if not html:
+        logger.error(f"Could not load the news articles of {date_str}.")
+        return [], 1
+    all_links = [BASE_URL + link for link in await parse(parse_links, html, executor)]
     logger.info(f"Found {len(all_links)} news articles for {date_str}.")
+    if seen is not None:
+        all_links = seen.filter_unseen(all_links)
+        logger.info(f"{len(all_links)} news articles for {date_str} not scraped before.")
     tasks = []
     for article_url in all_links:
-        tasks.append(process_article(article_url, session, data))
-    logger.info(f"Processed {len(tasks)} news articles for {date_str}.")
-    await asyncio.gather(*tasks)
+        tasks.append(process_article(article_url, engine, sink, executor))
+    results = await asyncio.gather(*tasks)
+    processed = [url for url in results if url is not None]
+    failed = len(results) - len(processed)
+    logger.info(f"Processed {len(processed)} news articles for {date_str}, {failed} failed.")
+    return processed, failed
 
 
 async def main():
     """
-    A description of the entire function, its parameters, and its return types.
-    """
-    async with aiohttp.ClientSession() as session:
-        data = []
-        loop = asyncio.get_event_loop()
-        tasks = [
-            loop.create_task(
-                process_date(
-                    str(date.fromisoformat(str(date.today())) - timedelta(days=i)),
-                    session,
-                    data,
+    Scrapes the news articles of today and yesterday and streams them to a file in the data folder.
+    """
+    # each run writes its own file, articles of an earlier run may not be loaded yet
+    run = datetime.now().strftime("%Y-%m-%d_%H%M%S")
+    pool = ProcessPoolExecutor(PARSE_WORKERS) if PARSE_WORKERS > 0 else nullcontext()
+    with pool as executor, SeenIndex() as seen, SnapshotStore() as snapshots:
+        sink = RecordSink(f"data/stocktitan_{run}", COLUMNS, schema=ARTICLE_SCHEMA)
+        with sink:
+            async with FetchEngine(cache=HTTPCache(), snapshots=snapshots) as engine:
+                loop = asyncio.get_event_loop()
+                tasks = [
+                    loop.create_task(
+                        process_date(
+                            str(date.fromisoformat(str(date.today())) - timedelta(days=i)),
+                            engine,
+                            sink,
+                            seen,
+                            executor,
+                        )
+                    )
+                    for i in range(2)
+                ]
+                processed = await asyncio.gather(*tasks)
+
+                removed = engine.cache.evict()
+                logger.info(f"Evicted {removed} entries from the HTTP cache")
+
+        logger.info(f"Skipped {sink.duplicates} duplicate rows")
+        logger.info(f"Data saved to {sink.path} ({sink.written} rows)")
+
+        # only remember articles once they are safely written out
+        seen.add([url for urls, _ in processed for url in urls])
+
+
+def read_checkpoint(path):
+    """
+    Returns the set of dates a backfill already finished, as YYYY-MM-DD strings.
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def write_checkpoint(path, date_str):
+    """
+    Records a finished date in the checkpoint file, making sure it reaches the disk.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        f.write(f"{date_str}\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+async def backfill(start, end, workers=BACKFILL_WORKERS, checkpoint=CHECKPOINT_PATH):
+    """
+    Scrapes every date from start to end inclusive, a bounded number of dates at a time.
+
+    Each date is written to a file of its own in the data folder and recorded in the
+    checkpoint file once that file is complete and none of its pages failed to load, so an
+    interrupted or partly failed backfill resumes with the dates it had not finished.
+
+    Args:
+        start (date): The first date to scrape.
+        end (date): The last date to scrape.
+        workers (int): Number of dates scraped at the same time.
+        checkpoint (str): Path of the checkpoint file.
+    """
+    done = read_checkpoint(checkpoint)
+    all_dates = [str(start + timedelta(days=i)) for i in range((end - start).days + 1)]
+    dates = [date_str for date_str in all_dates if date_str not in done]
+    logger.info(f"Backfilling {len(dates)} dates from {start} to {end}, {len(done)} already done.")
+
+    queue = asyncio.Queue()
+    for date_str in dates:
+        queue.put_nowait(date_str)
+    progress = {"dates": 0, "articles": 0}
+    started = time.monotonic()
+    # a date retried by a later backfill gets a new file rather than replacing this one, and
+    # the day of the run tells which file a re-parse of that day's archive supersedes
+    run = datetime.now().strftime("%Y-%m-%d_%H%M%S")
+
+    async def worker(engine, seen, executor):
+        while not queue.empty():
+            date_str = queue.get_nowait()
+            with RecordSink(
+                f"data/stocktitan_backfill_{date_str}_{run}", COLUMNS, schema=ARTICLE_SCHEMA
+            ) as sink:
+                processed, failed = await process_date(date_str, engine, sink, seen, executor)
+            seen.add(processed)
+            if failed:
+                # left out of the checkpoint, so the next backfill retries what failed
+                logger.warning(
+                    f"{failed} pages of {date_str} failed to load, it will be retried"
                 )
+            else:
+                write_checkpoint(checkpoint, date_str)
+
+            progress["dates"] += 1
+            progress["articles"] += sink.written
+            elapsed = time.monotonic() - started
+            logger.info(
+                f"Backfilled {progress['dates']}/{len(dates)} dates, "
+                f"{progress['articles']} articles, "
+                f"{progress['articles'] / elapsed:.1f} articles/s"
+            )
+
+    pool = ProcessPoolExecutor(PARSE_WORKERS) if PARSE_WORKERS > 0 else nullcontext()
+    with pool as executor, SeenIndex() as seen, SnapshotStore() as snapshots:
+        async with FetchEngine(cache=HTTPCache(), snapshots=snapshots) as engine:
+            await asyncio.gather(
+                *[worker(engine, seen, executor) for _ in range(min(workers, len(dates)))]
+            )
+            removed = engine.cache.evict()
+            logger.info(f"Evicted {removed} entries from the HTTP cache")
+
+
+def reparse_article(path):
+    """
+    Parses an archived article page.
+    """
+    return parse_article(read_snapshot(path))
+
+
+def scrape_files(partition):
+    """
+    Returns the files of the data folder written by the scrapes and backfills run on the
+    given day, leaving out those still being written.
+    """
+    paths = glob(f"data/stocktitan_{partition}_*") + glob(
+        f"data/stocktitan_backfill_*_{partition}_*"
+    )
+    return sorted(path for path in paths if not path.endswith(".tmp"))
+
+
+def reparse(partitions=None, workers=REPARSE_WORKERS, store=None, fmt=OUTPUT_FORMAT):
+    """
+    Rebuilds the extracted articles from the raw HTML archive, without any network access.
+
+    The articles archived on a day are parsed across a pool of processes and written to the
+    data folder under that day's name. The pages of a run are archived under the day they
+    were fetched, so the file replaces those of the scrapes and backfills run that day,
+    which are removed once it is written.
+
+    Args:
+        partitions (list, optional): Dates of the partitions to re-parse, all by default.
+        workers (int): Number of processes the pages are parsed in.
+        store (SnapshotStore, optional): The archive, defaults to the configured one.
+        fmt (str): Output format, "csv" or "parquet".
+    """
+    store = store if store is not None else SnapshotStore()
+    if not store.enabled:
+        raise ValueError("Set SNAPSHOT_DIR to the archive to re-parse")
+
+    with ProcessPoolExecutor(max(1, workers)) as executor:
+        for partition in partitions or store.partitions():
+            paths = [entry["path"] for entry in store.entries(partition, kind="article")]
+            started = time.monotonic()
+            with RecordSink(
+                f"data/stocktitan_{partition}", COLUMNS, fmt, schema=ARTICLE_SCHEMA
+            ) as sink:
+                for record in executor.map(reparse_article, paths, chunksize=16):
+                    sink.write(record)
+            logger.info(
+                f"Re-parsed {len(paths)} articles from {partition} into {sink.path} "
+                f"({sink.written} rows) in {time.monotonic() - started:.1f}s"
             )
-            for i in range(2)
-        ]
-        await asyncio.gather(*tasks)
-
-        df = pd.DataFrame(data)
-        logger.info(f"Dataframe has {len(df)} rows before cleaning up")
-        # clean up dataframe by removing empty rows
-        data = df.copy()
-        data.drop_duplicates(inplace=True)
-        logger.info(f"Dataframe had {df.shape[0]} rows before removing empty rows")
-        logger.info(f"Dataframe has {data.shape[0]} rows after removing empty rows")
-        date_str = datetime.now().strftime("%Y-%m-%d")
-        path = f"data/stocktitan_{date_str}.csv"
-        data.to_csv(path, index=False)
-        logger.info(f"Data saved to {path}")
+            for path in scrape_files(partition):
+                os.remove(path)
+                logger.info(f"Removed {path}, superseded by {sink.path}")
+    store.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Scrape news articles from Stock Titan.")
+    subparsers = parser.add_subparsers(dest="command")
+    backfill_parser = subparsers.add_parser(
+        "backfill", help="scrape a range of dates, resuming from the checkpoint"
+    )
+    backfill_parser.add_argument("--start", type=date.fromisoformat, required=True)
+    backfill_parser.add_argument("--end", type=date.fromisoformat, required=True)
+    backfill_parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    backfill_parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    reparse_parser = subparsers.add_parser(
+        "reparse", help="rebuild the extracted articles from the raw HTML archive"
+    )
+    reparse_parser.add_argument(
+        "--partition", action="append", help="date to re-parse, all dates by default"
+    )
+    reparse_parser.add_argument("--workers", type=int, default=REPARSE_WORKERS)
+    reparse_parser.add_argument("--format", choices=["csv", "parquet"], default=OUTPUT_FORMAT)
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        asyncio.run(backfill(args.start, args.end, args.workers, args.checkpoint))
+    elif args.command == "reparse":
+        reparse(args.partition, args.workers, fmt=args.format)
+    else:
+        asyncio.run(main())
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import re
+import time
+from urllib.parse import urlsplit
+
+# Cache settings, overridable through the environment.
+# Set HTTP_CACHE_DIR to an empty string to disable caching.
+CACHE_DIR = os.environ.get("HTTP_CACHE_DIR", "cache/http")
+CACHE_MAX_BYTES = int(os.environ.get("HTTP_CACHE_MAX_BYTES", 1024**3))
+CACHE_MAX_AGE = float(os.environ.get("HTTP_CACHE_MAX_AGE_DAYS", 30)) * 86400
+
+# Article pages do not change once published, so they are served from disk without a request.
+# Listing pages are always revalidated with a conditional request.
+IMMUTABLE_PATTERN = r"\.html?$"
+
+
+class HTTPCache:
+    """
+    On-disk cache of HTTP responses keyed by URL.
+
+    Each entry is a JSON file holding the body and the ETag/Last-Modified validators of the
+    response. Immutable pages are served straight from disk, other pages are revalidated with
+    a conditional request and served from disk when the server answers 304 Not Modified.
+
+    Args:
+        root (str): Directory the entries are stored in. Caching is disabled when empty or None.
+        max_bytes (int): Total size the cache is trimmed down to by evict().
+        max_age (float): Age in seconds after which evict() drops an entry.
+        immutable_pattern (str): Regular expression matched against the URL path of pages
+            that never change.
+    """
+
+    def __init__(
+        self,
+        root=CACHE_DIR,
+        max_bytes=CACHE_MAX_BYTES,
+        max_age=CACHE_MAX_AGE,
+        immutable_pattern=IMMUTABLE_PATTERN,
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.immutable = re.compile(immutable_pattern)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root)
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def get(self, url: str):
+        """
+        Returns the cached entry for the URL as a dictionary, or None on a miss.
+        """
+        if not self.enabled:
+            return None
+        try:
+            with open(self._path(url), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url: str, body: str, headers) -> None:
+        """
+        Stores a response body together with its validators.
+        """
+        if not self.enabled:
+            return
+        entry = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "stored_at": time.time(),
+            "body": body,
+        }
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file first so readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def lookup(self, url: str):
+        """
+        Looks up a URL before requesting it.
+
+        Returns:
+            tuple: The cached body and an empty dictionary when the page can be served without
+            a request, otherwise None and the conditional request headers to send.
+        """
+        entry = self.get(url)
+        if entry is None:
+            return None, {}
+
+        if self.immutable.search(urlsplit(url).path):
+            # mark the entry as recently used so size-based eviction keeps it
+            os.utime(self._path(url))
+            return entry["body"], {}
+
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return None, headers
+
+    def store(self, url: str, status: int, body: str, headers):
+        """
+        Records the response to a request made after lookup().
+
+        Returns:
+            tuple: The status code and body to use. A 304 Not Modified response is replaced by
+            the cached body with a 200 status code.
+        """
+        if status == 304:
+            entry = self.get(url)
+            if entry is not None:
+                self.put(url, entry["body"], {
+                    "ETag": headers.get("ETag") or entry.get("etag"),
+                    "Last-Modified": headers.get("Last-Modified") or entry.get("last_modified"),
+                })
+                return 200, entry["body"]
+        elif status == 200:
+            self.put(url, body, headers)
+        return status, body
+
+    def evict(self) -> int:
+        """
+        Drops entries older than max_age, then the least recently used entries until the
+        cache fits in max_bytes.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        if not self.enabled or not os.path.isdir(self.root):
+            return 0
+
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        cutoff = time.time() - self.max_age
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
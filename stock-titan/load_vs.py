@@ -1,23 +1,27 @@
 from helpers import create_node, create_node_relationships, format_date
 
+import argparse
 from datetime import timedelta
 import logging
 from logging.handlers import RotatingFileHandler
 import os
 
 from dotenv import load_dotenv
-from llama_index.core.settings import Settings
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.llms.openai import OpenAI
-from llama_index.vector_stores.timescalevector import TimescaleVectorStore
 import pandas as pd
-from sqlalchemy import create_engine, text
+
+from database import get_engine, window_query
+from embedding_cache import EmbeddingCache
+from embedding_pool import EMBED_WORKERS, EmbeddingPool
+from embeddings import EMBED_BATCH_SIZE, EMBED_MODEL, LazyModel, embed_nodes, model_id
+
+# Columns of the table create_node reads
+NODE_COLUMNS = ["created_at", "title", "impact_score", "sentiment", "summary", "article"]
 
 
 class StockTitanLoader:
     def __init__(self):
         """
-        Initialize the class by loading environment variables, setting up API keys, initializing settings, and setting up logging.
+        Initialize the class by loading environment variables, setting up API keys, and setting up logging.
         """
         # Load environment variables
         load_dotenv()
@@ -27,10 +31,6 @@ class StockTitanLoader:
         self.DB_URL = os.environ.get("DB_URL")
         self.VECTOR_STORE_URL = os.environ.get("VECTOR_STORE_URL")
 
-        # Initialize settings
-        Settings.llm = OpenAI(model="gpt-3.5-turbo-1106", temperature=0.1)
-        Settings.embed_model = HuggingFaceEmbedding(model_name="BAAI/bge-small-en-v1.5")
-
         # Setup logging
         self._setup_logging()
 
@@ -64,30 +64,30 @@ class StockTitanLoader:
         log_file_handler.setFormatter(file_handler_formatter)
         self.logger.addHandler(log_file_handler)
 
-    def get_data(self) -> pd.DataFrame:
+    def get_data(self, start=None, end=None) -> pd.DataFrame:
         """
-        Function to retrieve data from the database and return it as a pandas DataFrame.
+        Function to retrieve the rows created in the half-open window [start, end) from the
+        database and return them as a pandas DataFrame, with the columns create_node needs.
+
+        Args:
+            start (datetime or str, optional): Start of the window, today's midnight by default.
+            end (datetime or str, optional): End of the window, excluded, tomorrow's midnight by default.
         """
         self.logger.info("Starting to get data from the database")
-        engine = create_engine(self.DB_URL)
-        conn = engine.connect()
-        self.logger.info("Database Connected")
-
-        query = 'SELECT * FROM "stock-titan" WHERE DATE(created_at) = CURRENT_DATE;'
-
-        try:
-            result = conn.execute(text(query))
-            df = pd.DataFrame(result.fetchall(), columns=result.keys())
-            conn.close()
-            self.logger.info("Database connection closed")
-            return df
-
-        except Exception as e:
-            conn.rollback()
-            self.logger.error("Transaction rolled back due to exception: %s", e)
-            conn.close()
-            self.logger.info("Database connection closed")
-            return pd.DataFrame()
+        query = window_query("stock-titan", NODE_COLUMNS)
+
+        # connections come from the pool shared with the other stages of the run
+        with get_engine(self.DB_URL).connect() as conn:
+            self.logger.info("Database Connected")
+            try:
+                result = conn.execute(query, {"start": start, "end": end})
+                return pd.DataFrame(result.fetchall(), columns=result.keys())
+            except Exception as e:
+                conn.rollback()
+                self.logger.error("Transaction rolled back due to exception: %s", e)
+                return pd.DataFrame()
+            finally:
+                self.logger.info("Database connection returned to the pool")
 
     def process_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -106,7 +106,9 @@ class StockTitanLoader:
 
     def embed_nodes(self, nodes):
         """
-        Embeds nodes using the specified embedding model.
+        Embeds the nodes missing from the embedding cache using the specified embedding
+        model, in batches of nodes of similar length, in worker processes when EMBED_WORKERS
+        is more than one.
 
         Args:
             nodes: A list of nodes to be embedded.
@@ -114,13 +116,20 @@ class StockTitanLoader:
         Returns:
             None
         """
-        embedding_model = HuggingFaceEmbedding(model_name="BAAI/bge-small-en-v1.5")
-
-        for node in nodes:
-            node_embedding = embedding_model.get_text_embedding(
-                node.get_content(metadata_mode="all")
-            )
-            node.embedding = node_embedding
+        # only the nodes whose text was never embedded before go through the model
+        with EmbeddingCache(model_id()) as cache:
+            if EMBED_WORKERS > 1:
+                # the pool shards the texts itself, so they are handed over in one batch
+                with EmbeddingPool(EMBED_WORKERS) as pool:
+                    self.logger.info(
+                        f"Embedding with {pool.workers} workers of {pool.threads} threads"
+                    )
+                    embed_nodes(pool, nodes, max(1, len(nodes)), cache)
+            else:
+                # loaded on the first cache miss, so a fully cached run never loads it
+                embedding_model = LazyModel(EMBED_MODEL, EMBED_BATCH_SIZE)
+                embed_nodes(embedding_model, nodes, EMBED_BATCH_SIZE, cache)
+            self.logger.info(f"{len(cache)} embeddings in the cache")
 
     def store_vectors(self, nodes):
         """
@@ -129,6 +138,8 @@ class StockTitanLoader:
         :param nodes: the vectors to be stored
         :return: None
         """
+        from llama_index.vector_stores.timescalevector import TimescaleVectorStore
+
         ts_vector_store = TimescaleVectorStore.from_params(
             service_url=self.VECTOR_STORE_URL,
             table_name="stock-titan",
@@ -140,11 +151,11 @@ class StockTitanLoader:
         # index already exists
         # ts_vector_store.create_index()
 
-    def run(self):
+    def run(self, start=None, end=None):
         """
         Run the function, get and process data, create nodes and relationships, embed nodes, store vectors, and log completion.
         """
-        df = self.get_data()
+        df = self.get_data(start, end)
         processed_df = self.process_data(df)
         text_nodes = [create_node(row) for _, row in processed_df.iterrows()]
         nodes = create_node_relationships(text_nodes)
@@ -154,5 +165,10 @@ class StockTitanLoader:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed the loaded articles into the vector store.")
+    parser.add_argument("--start", help="start of the window, such as 2024-05-25, today by default")
+    parser.add_argument("--end", help="end of the window, excluded, tomorrow by default")
+    args = parser.parse_args()
+
     loader = StockTitanLoader()
-    loader.run()
+    loader.run(args.start, args.end)
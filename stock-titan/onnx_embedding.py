@@ -0,0 +1,180 @@
+"""
+ONNX Runtime backend of the embedding model, for CPU-only hosts. The model is exported once,
+optionally with its weights quantized to int8, then selected with EMBED_BACKEND=onnx.
+
+    python3 onnx_embedding.py export [--model NAME] [--no-quantize]
+"""
+import argparse
+import os
+import re
+
+import numpy as np
+
+from embeddings import EMBED_BATCH_SIZE, EMBED_MODEL
+
+# Location of the exported models, and whether the int8 one is used, overridable through
+# the environment
+EMBED_ONNX_DIR = os.environ.get(
+    "EMBED_ONNX_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "finance-data", "onnx"),
+)
+EMBED_ONNX_QUANTIZE = os.environ.get("EMBED_ONNX_QUANTIZE", "1") == "1"
+
+# Tokens per text, the longest input of the BERT-sized models
+MAX_LENGTH = 512
+# Inputs of the exported graph, in the order of its forward method
+INPUT_NAMES = ["input_ids", "attention_mask", "token_type_ids"]
+
+
+def model_path(name: str = EMBED_MODEL, root: str = EMBED_ONNX_DIR, quantize: bool = True) -> str:
+    """
+    Returns the path of the exported model of the given name, next to its tokenizer.
+    """
+    directory = os.path.join(root, re.sub(r"[^\w.-]+", "_", name))
+    return os.path.join(directory, "model-int8.onnx" if quantize else "model.onnx")
+
+
+def export_model(name: str = EMBED_MODEL, root: str = EMBED_ONNX_DIR, quantize: bool = True) -> str:
+    """
+    Exports the Hugging Face model of the given name to ONNX with its tokenizer, and
+    quantizes the weights of its matrix multiplications to int8 if asked. Activations are
+    quantized on the fly at inference, so no calibration data is needed.
+
+    Returns:
+        str: The path of the exported model.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    path = model_path(name, root, quantize=False)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(name)
+    tokenizer.save_pretrained(os.path.dirname(path))
+    model = AutoModel.from_pretrained(name).eval()
+
+    class Encoder(torch.nn.Module):
+        # returns the token states only, so the graph has a single output
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            ).last_hidden_state
+
+    sample = tokenizer(["Acme Corp reports record quarter."], return_tensors="pt")
+    axes = {input_name: {0: "batch", 1: "tokens"} for input_name in INPUT_NAMES}
+    axes["last_hidden_state"] = {0: "batch", 1: "tokens"}
+    with torch.no_grad():
+        torch.onnx.export(
+            Encoder(model),
+            tuple(sample[input_name] for input_name in INPUT_NAMES),
+            path,
+            input_names=INPUT_NAMES,
+            output_names=["last_hidden_state"],
+            dynamic_axes=axes,
+            opset_version=14,
+        )
+    if not quantize:
+        return path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantized = model_path(name, root, quantize=True)
+    quantize_dynamic(path, quantized, weight_type=QuantType.QInt8)
+    return quantized
+
+
+class OnnxEmbedding:
+    """
+    Embeds texts with an exported model on the CPU. Like the Hugging Face backend, a text is
+    embedded as the normalized state of its first token.
+
+    Args:
+        path (str): Path of the exported model, next to its tokenizer.
+        batch_size (int): Number of texts run through the model at once.
+        threads (int, optional): Threads of the model, the thread budget of the embedding
+            worker it runs in by default, otherwise all cores.
+    """
+
+    def __init__(self, path, batch_size=EMBED_BATCH_SIZE, threads=None):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = int(os.environ.get("OMP_NUM_THREADS", 0)) if threads is None else threads
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.dirname(path))
+        self.inputs = [graph_input.name for graph_input in self.session.get_inputs()]
+        self.embed_batch_size = batch_size
+
+    def get_text_embedding_batch(self, texts: list) -> list:
+        vectors = []
+        for start in range(0, len(texts), self.embed_batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + self.embed_batch_size],
+                padding=True,
+                truncation=True,
+                max_length=MAX_LENGTH,
+                return_tensors="np",
+            )
+            feed = {name: encoded[name].astype(np.int64) for name in self.inputs}
+            states = self.session.run(None, feed)[0]
+            vectors.extend(normalize(states[:, 0]).tolist())
+        return vectors
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    Scales each row to unit length, leaving rows of zeros as they are.
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def cosine_similarities(expected, actual) -> np.ndarray:
+    """
+    Returns the cosine similarity of each row of expected with the same row of actual.
+    """
+    expected = normalize(np.asarray(expected, dtype=np.float64))
+    actual = normalize(np.asarray(actual, dtype=np.float64))
+    return np.einsum("ij,ij->i", expected, actual)
+
+
+def load_onnx_model(name: str = EMBED_MODEL, batch_size: int = EMBED_BATCH_SIZE):
+    """
+    Returns the ONNX backend of the model of the given name, exported beforehand.
+    """
+    path = model_path(name, EMBED_ONNX_DIR, EMBED_ONNX_QUANTIZE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"No ONNX export of {name} at {path}, run `python3 onnx_embedding.py export` first"
+        )
+    return OnnxEmbedding(path, batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="export the model to ONNX")
+    export_parser.add_argument("--model", default=EMBED_MODEL)
+    export_parser.add_argument("--dir", default=EMBED_ONNX_DIR)
+    export_parser.add_argument(
+        "--no-quantize", dest="quantize", action="store_false", help="only export the fp32 model"
+    )
+    args = parser.parse_args()
+
+    print(export_model(args.model, args.dir, args.quantize))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Analytical queries over the archived articles, run with DuckDB straight on the Parquet parts
+of the archive so they never touch the production database.
+
+    python3 query.py --start 2024-05-01 --end 2024-05-31 --sentiment Positive --count-by date
+    python3 query.py --impact High --columns datetime title --limit 20
+"""
+import argparse
+from glob import glob
+import os
+
+import duckdb
+import pandas as pd
+
+from archive import ARCHIVE_DIR
+from bulk_load import HASH_COLUMN
+from schemas import ARTICLE_SCHEMA
+
+# Columns of the partition directories, added to the columns stored in the parts
+PARTITION_COLUMNS = ["dataset", "date"]
+COLUMNS = PARTITION_COLUMNS + ARTICLE_SCHEMA.names + [HASH_COLUMN]
+
+# Filters accepted by the queries, and the column each one applies to
+FILTERS = {"dataset": "dataset", "sentiment": "sentiment", "impact": "impact_score"}
+
+
+def _quote(column: str) -> str:
+    if column not in COLUMNS:
+        raise ValueError(f"Unknown column: {column}")
+    return f'"{column}"'
+
+
+class ArchiveQuery:
+    """
+    Filters and aggregates the archive with an in-memory DuckDB database.
+
+    The parts are scanned in place. Filters on the date compare against the date= partition
+    directories so parts out of range are skipped without being opened, other filters are
+    pushed down to the Parquet row groups, and only the selected columns are read.
+
+    Args:
+        root (str): Directory of the archive.
+        threads (int, optional): Number of threads DuckDB scans with, all cores by default.
+    """
+
+    def __init__(self, root=ARCHIVE_DIR, threads=None):
+        self.root = root
+        self.conn = duckdb.connect()
+        if threads:
+            self.conn.execute(f"SET threads = {int(threads)}")
+
+    @property
+    def pattern(self) -> str:
+        return os.path.join(self.root, "dataset=*", "date=*", "*.parquet")
+
+    def _source(self) -> str:
+        pattern = self.pattern.replace("'", "''")
+        return f"read_parquet('{pattern}', hive_partitioning = true)"
+
+    def _where(self, start=None, end=None, **filters) -> tuple:
+        # builds the WHERE clause of the filters and its parameters
+        conditions, params = [], []
+        if start:
+            conditions.append("date >= CAST(? AS DATE)")
+            params.append(start)
+        if end:
+            conditions.append("date <= CAST(? AS DATE)")
+            params.append(end)
+        for name, value in filters.items():
+            if name not in FILTERS:
+                raise ValueError(f"Unknown filter: {name}")
+            if value is None:
+                continue
+            values = [value] if isinstance(value, str) else list(value)
+            placeholders = ", ".join("?" for _ in values)
+            conditions.append(f"{_quote(FILTERS[name])} IN ({placeholders})")
+            params.extend(values)
+        clause = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return clause, params
+
+    def _select_sql(self, columns=None, limit=None, **filters) -> tuple:
+        columns = list(columns or ARTICLE_SCHEMA.names)
+        where, params = self._where(**filters)
+        sql = f"SELECT {', '.join(_quote(c) for c in columns)} FROM {self._source()}{where}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return sql, params, columns
+
+    def _count_sql(self, by=("date",), **filters) -> tuple:
+        by = list(by)
+        keys = ", ".join(_quote(column) for column in by)
+        where, params = self._where(**filters)
+        sql = (
+            f"SELECT {keys}, count(*) AS articles FROM {self._source()}{where} "
+            f"GROUP BY {keys} ORDER BY {keys}"
+        )
+        return sql, params, by + ["articles"]
+
+    def _run(self, sql: str, params: list, columns: list) -> pd.DataFrame:
+        if not glob(self.pattern):
+            return pd.DataFrame(columns=columns)
+        return self.conn.execute(sql, params).df()
+
+    def select(self, columns=None, limit=None, **filters) -> pd.DataFrame:
+        """
+        Returns the archived articles matching the filters.
+
+        Args:
+            columns (list, optional): Columns to return, the article columns by default.
+            limit (int, optional): Maximum number of rows to return.
+            start (str, optional): First archive date, as YYYY-MM-DD.
+            end (str, optional): Last archive date, as YYYY-MM-DD.
+            dataset, sentiment, impact (str or list, optional): Values to keep.
+        """
+        return self._run(*self._select_sql(columns, limit, **filters))
+
+    def count(self, by=("date",), **filters) -> pd.DataFrame:
+        """
+        Returns the number of archived articles matching the filters per value of the given
+        columns, under "articles".
+        """
+        return self._run(*self._count_sql(by, **filters))
+
+    def explain(self, method: str = "select", **kwargs) -> str:
+        """
+        Returns DuckDB's physical plan of a select or count query, showing the filters and
+        columns pushed into the Parquet scan.
+        """
+        builders = {"select": self._select_sql, "count": self._count_sql}
+        sql, params, _ = builders[method](**kwargs)
+        rows = self.conn.execute(f"EXPLAIN {sql}", params).fetchall()
+        return "\n".join(row[1] for row in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--archive", default=ARCHIVE_DIR)
+    parser.add_argument("--start", help="first archive date, as YYYY-MM-DD")
+    parser.add_argument("--end", help="last archive date, as YYYY-MM-DD")
+    parser.add_argument("--dataset", nargs="+")
+    parser.add_argument("--sentiment", nargs="+")
+    parser.add_argument("--impact", nargs="+")
+    parser.add_argument("--columns", nargs="+", help="columns to print")
+    parser.add_argument("--count-by", nargs="+", help="count the articles per value of columns")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--csv", action="store_true", help="print CSV instead of a table")
+    parser.add_argument("--explain", action="store_true", help="print the query plan")
+    args = parser.parse_args()
+
+    query = ArchiveQuery(args.archive)
+    filters = {
+        "start": args.start,
+        "end": args.end,
+        "dataset": args.dataset,
+        "sentiment": args.sentiment,
+        "impact": args.impact,
+    }
+    if args.count_by:
+        method, kwargs = "count", dict(by=args.count_by, **filters)
+    else:
+        method, kwargs = "select", dict(columns=args.columns, limit=args.limit, **filters)
+
+    if args.explain:
+        print(query.explain(method, **kwargs))
+        return
+    df = getattr(query, method)(**kwargs)
+    print(df.to_csv(index=False) if args.csv else df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import asyncio
+from contextlib import asynccontextmanager, nullcontext
+from email.utils import parsedate_to_datetime
+import os
+import random
+import time
+
+import aiohttp
+
+# Retry settings, overridable through the environment
+MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", 4))
+BACKOFF_BASE = float(os.environ.get("HTTP_BACKOFF_BASE", 0.5))
+BACKOFF_MAX = float(os.environ.get("HTTP_BACKOFF_MAX", 60))
+
+# Responses worth retrying, and those telling us to slow down
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+THROTTLE_STATUSES = {429, 503}
+
+
+def parse_retry_after(value, cap=BACKOFF_MAX):
+    """
+    Parses a Retry-After header given in seconds or as an HTTP date, capped like the
+    backoff delays so a server cannot stall the crawl for hours.
+
+    Returns:
+        float: The number of seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(cap, max(0.0, delay))
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """
+    Returns a delay before retry number attempt (starting at 0), drawn uniformly up to an
+    exponentially growing bound so retries from concurrent requests spread out.
+    """
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class AdaptiveLimiter:
+    """
+    Limits the number of requests in flight with additive increase, multiplicative decrease.
+
+    Every successful response raises the limit by increase / limit, so the limit grows by
+    about `increase` per round of requests while responses are healthy. A throttled or
+    failed response multiplies it by `decrease`, at most once per `cooldown` seconds so a
+    burst of errors from requests already in flight counts once. A Retry-After delay pauses
+    all new requests until it has passed.
+
+    Args:
+        initial (int): The starting limit.
+        minimum (int): The lowest the limit can go.
+        maximum (int): The highest the limit can go.
+        increase (float): Additive increase per round of successful requests.
+        decrease (float): Factor applied to the limit when throttled.
+        cooldown (float): Minimum number of seconds between two decreases.
+    """
+
+    def __init__(
+        self, initial=8, minimum=1, maximum=64, increase=1.0, decrease=0.5, cooldown=1.0
+    ):
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.successes = 0
+        self.throttles = 0
+        self._last_decrease = float("-inf")
+        self._paused_until = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            async with self._condition:
+                if self.in_flight < int(self.limit) and time.monotonic() >= self._paused_until:
+                    self.in_flight += 1
+                    return
+                await self._condition.wait()
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Holds one of the request slots for the duration of the block.
+        """
+        await self.acquire()
+        try:
+            yield
+        finally:
+            await self.release()
+
+    async def on_success(self):
+        self.successes += 1
+        slots = int(self.limit)
+        self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+        if int(self.limit) > slots:
+            # requests waiting for a slot can take the new ones without waiting for a release
+            async with self._condition:
+                self._condition.notify_all()
+
+    def on_throttle(self, retry_after=None):
+        self.throttles += 1
+        now = time.monotonic()
+        if now - self._last_decrease >= self.cooldown:
+            self.limit = max(self.minimum, self.limit * self.decrease)
+            self._last_decrease = now
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+
+
+async def get_text(
+    session, url, limiter, headers=None, max_retries=MAX_RETRIES, logger=None, host_slot=None
+):
+    """
+    Asynchronously requests a URL through an adaptive limiter, retrying throttled, failed
+    and timed out requests with jittered exponential backoff or the Retry-After delay.
+
+    Args:
+        session (aiohttp.ClientSession): The session used for the request.
+        url (str): The URL to request.
+        limiter (AdaptiveLimiter): The limiter bounding the requests in flight.
+        headers (dict, optional): Additional request headers.
+        max_retries (int): Number of retries before the last response or error is returned.
+        logger (logging.Logger, optional): Logger the retries are reported to.
+        host_slot (asyncio.Semaphore, optional): Per-host limit, held for each attempt like
+            the limiter's slot but not while waiting to retry.
+
+    Returns:
+        tuple: The status code, headers and text of the last response.
+    """
+    for attempt in range(max_retries + 1):
+        retry_after = None
+        try:
+            async with host_slot or nullcontext(), limiter.slot():
+                async with session.get(url, headers=headers) as response:
+                    text = await response.text()
+                    status, response_headers = response.status, response.headers
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt == max_retries:
+                raise
+            limiter.on_throttle()
+            reason = repr(e)
+        else:
+            if status not in RETRY_STATUSES:
+                await limiter.on_success()
+                return status, response_headers, text
+            if attempt == max_retries:
+                return status, response_headers, text
+            retry_after = parse_retry_after(response_headers.get("Retry-After"))
+            if status in THROTTLE_STATUSES or retry_after is not None:
+                limiter.on_throttle(retry_after)
+            reason = f"status code {status}"
+
+        delay = retry_after if retry_after is not None else backoff_delay(attempt)
+        if logger is not None:
+            logger.warning(f"Retrying {url} in {delay:.1f}s after {reason}")
+        await asyncio.sleep(delay)
+
+
+def get_with_retries(session, url, max_retries=MAX_RETRIES, logger=None, **kwargs):
+    """
+    Requests a URL with a blocking session such as requests.Session, retrying throttled,
+    failed and timed out requests with jittered exponential backoff or the Retry-After delay.
+
+    Args:
+        session: The session used for the request, anything with a requests-style get().
+        url (str): The URL to request.
+        max_retries (int): Number of retries before the last response or error is returned.
+        logger (logging.Logger, optional): Logger the retries are reported to.
+        **kwargs: Passed on to session.get().
+
+    Returns:
+        The last response.
+    """
+    for attempt in range(max_retries + 1):
+        retry_after = None
+        try:
+            response = session.get(url, **kwargs)
+        except OSError as e:  # requests exceptions derive from OSError
+            if attempt == max_retries:
+                raise
+            reason = repr(e)
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                return response
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            reason = f"status code {response.status_code}"
+
+        delay = retry_after if retry_after is not None else backoff_delay(attempt)
+        if logger is not None:
+            logger.warning(f"Retrying {url} in {delay:.1f}s after {reason}")
+        time.sleep(delay)
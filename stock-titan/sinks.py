@@ -0,0 +1,133 @@
+import csv
+import hashlib
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from schemas import OUTPUT_FORMAT, to_table
+
+# Output settings, overridable through the environment
+OUTPUT_BATCH_SIZE = int(os.environ.get("OUTPUT_BATCH_SIZE", 500))
+
+
+def content_hash(record: dict, fields: list) -> bytes:
+    """
+    Returns a 16-byte BLAKE2 digest of the given fields of a record.
+
+    Missing values and NaN hash like empty strings, so a record hashes the same whether it
+    comes straight from the parser or back from a file.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for field in fields:
+        value = record.get(field)
+        if value is None or value != value:
+            value = ""
+        digest.update(str(value).encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.digest()
+
+
+class RecordSink:
+    """
+    Writes records to a CSV or Parquet file in batches as they are produced.
+
+    Records are deduplicated on the fly by a hash of their content, so memory holds one
+    batch of records plus 16 bytes per distinct record rather than the whole output. Each
+    batch is flushed to disk as it fills up, as a row group for Parquet files.
+
+    The file is written under a .tmp suffix and renamed when closed, as a Parquet file is
+    only readable once its footer is written and a CSV file may end in the middle of a
+    row. A running or killed extract leaves the .tmp file, which the load stage ignores,
+    rather than a partial file under its real name.
+
+    Args:
+        path (str): Path of the output file without extension, the format is appended.
+        columns (list): The columns written, in order.
+        fmt (str): "csv" or "parquet".
+        batch_size (int): Number of records buffered before they are written out.
+        schema (pyarrow.Schema, optional): Types of the columns in Parquet files, all strings
+            by default.
+    """
+
+    def __init__(
+        self, path, columns, fmt=OUTPUT_FORMAT, batch_size=OUTPUT_BATCH_SIZE, schema=None
+    ):
+        if fmt not in ("csv", "parquet"):
+            raise ValueError(f"Unknown output format: {fmt}")
+
+        self.path = f"{path}.{fmt}"
+        self.columns = columns
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.schema = schema or pa.schema([(column, pa.string()) for column in columns])
+        self.written = 0
+        self.duplicates = 0
+        self._hashes = set()
+        self._batch = []
+
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if fmt == "csv":
+            self._file = open(f"{self.path}.tmp", "w", newline="", encoding="utf-8")
+            self._writer = csv.DictWriter(self._file, fieldnames=columns, lineterminator="\n")
+            self._writer.writeheader()
+        else:
+            self._file = None
+            self._writer = pq.ParquetWriter(f"{self.path}.tmp", self.schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, record: dict) -> bool:
+        """
+        Buffers a record, skipping it if an identical record was already written.
+
+        Returns:
+            bool: True if the record was new.
+        """
+        key = content_hash(record, self.columns)
+        if key in self._hashes:
+            self.duplicates += 1
+            return False
+
+        self._hashes.add(key)
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self) -> None:
+        """
+        Writes the buffered records out.
+        """
+        if not self._batch:
+            return
+        if self.fmt == "csv":
+            self._writer.writerows(
+                {column: record.get(column) for column in self.columns}
+                for record in self._batch
+            )
+            self._file.flush()
+        else:
+            table = to_table(self._batch, self.schema)
+            self._writer.write_table(table)
+        self.written += len(self._batch)
+        self._batch = []
+
+    def close(self) -> None:
+        """
+        Writes the remaining records and closes the file.
+        """
+        if self._writer is None:
+            return
+        self.flush()
+        if self.fmt == "csv":
+            self._file.close()
+        else:
+            self._writer.close()
+        os.replace(f"{self.path}.tmp", self.path)
+        self._writer = None
@@ -0,0 +1,109 @@
+from glob import glob
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from archive import ArchiveStore, file_date
+from schemas import ARTICLE_SCHEMA, write_frame
+
+
+def articles(day, count):
+    return pd.DataFrame(
+        {
+            "title": [f"Article {i} of {day}" for i in range(count)],
+            "datetime": [f"{day}T1{i % 10}:00:00.000Z" for i in range(count)],
+            "impact_score": ["Low"] * count,
+            "sentiment": ["Neutral"] * count,
+            "summary": [""] * count,
+            "article": ["Text"] * count,
+        }
+    )
+
+
+class TestArchiveStore(TestCase):
+    def test_files_are_compacted_by_date(self):
+        with TemporaryDirectory() as tmp:
+            data = os.path.join(tmp, "data")
+            os.makedirs(data)
+            for day, count in (("2024-05-24", 3), ("2024-05-25", 2)):
+                write_frame(
+                    articles(day, count),
+                    os.path.join(data, f"stocktitan_{day}.csv"),
+                    ARTICLE_SCHEMA,
+                )
+            # the same rows written again in another format are archived once
+            write_frame(
+                articles("2024-05-25", 2),
+                os.path.join(data, "stocktitan_2024-05-25.parquet"),
+                ARTICLE_SCHEMA,
+            )
+
+            store = ArchiveStore(
+                "stocktitan", ARTICLE_SCHEMA, root=os.path.join(tmp, "archive")
+            )
+            files = [os.path.join(data, name) for name in os.listdir(data)]
+            entries = store.archive_files(files)
+
+            self.assertEqual(os.listdir(data), [])
+            self.assertEqual(
+                [(entry["date"], entry["rows"]) for entry in entries],
+                [("2024-05-24", 3), ("2024-05-25", 2)],
+            )
+            self.assertTrue(entries[0]["path"].startswith("dataset=stocktitan/date=2024-05-24/"))
+            self.assertEqual(entries[0]["min_datetime"], "2024-05-24T10:00:00+00:00")
+            self.assertEqual(entries[0]["max_datetime"], "2024-05-24T12:00:00+00:00")
+            self.assertEqual(store.manifest(), entries)
+
+    def test_files_are_archived_a_chunk_at_a_time(self):
+        with TemporaryDirectory() as tmp:
+            # the second run of the day found the articles of the first one again
+            for run, count in (("090000.csv", 3), ("100000.parquet", 4)):
+                write_frame(
+                    articles("2024-05-25", count),
+                    os.path.join(tmp, f"stocktitan_2024-05-25_{run}"),
+                    ARTICLE_SCHEMA,
+                )
+
+            store = ArchiveStore("stocktitan", ARTICLE_SCHEMA, root=os.path.join(tmp, "archive"))
+            files = glob(os.path.join(tmp, "stocktitan_*"))
+            [entry] = store.archive_files(files, chunk_size=2)
+
+            self.assertEqual(entry["rows"], 4)
+            self.assertEqual(entry["max_datetime"], "2024-05-25T13:00:00+00:00")
+            part = pq.ParquetFile(os.path.join(tmp, "archive", entry["path"]))
+            self.assertEqual(part.metadata.num_rows, 4)
+            self.assertGreater(part.metadata.num_row_groups, 1)
+
+    def test_read_date_range(self):
+        with TemporaryDirectory() as tmp:
+            store = ArchiveStore("stocktitan", ARTICLE_SCHEMA, root=tmp)
+            for day in ("2024-05-23", "2024-05-24", "2024-05-25"):
+                store.write(articles(day, 2), day)
+            # parts of other datasets are not read
+            other = ArchiveStore("other", ARTICLE_SCHEMA, root=tmp)
+            other.write(articles("2024-05-24", 1), "2024-05-24")
+
+            df = store.read("2024-05-24", "2024-05-25")
+            self.assertEqual(list(df.columns), ARTICLE_SCHEMA.names)
+            self.assertEqual(len(df), 4)
+            self.assertEqual(str(df["datetime"].dt.tz), "UTC")
+            self.assertEqual(len(store.paths(end="2024-05-23")), 1)
+            self.assertEqual(len(store.read("2024-06-01")), 0)
+
+    def test_identical_content_has_the_same_content_hash(self):
+        with TemporaryDirectory() as tmp:
+            store = ArchiveStore("stocktitan", ARTICLE_SCHEMA, root=tmp)
+            first = store.write(articles("2024-05-25", 3), "2024-05-25")
+            second = store.write(articles("2024-05-25", 3)[::-1], "2024-05-25")
+            self.assertEqual(first["content_hash"], second["content_hash"])
+            self.assertNotEqual(first["path"], second["path"])
+
+    def test_file_date(self):
+        self.assertEqual(file_date("data/stocktitan_2024-05-25.csv"), "2024-05-25")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+from unittest import TestCase, main, mock
+
+from database import dispose_engines, engine_options, get_engine, pool_settings, window_query
+
+URL = "postgresql+psycopg2://user@localhost/finance"
+
+
+class TestEngineOptions(TestCase):
+    def test_pool_settings(self):
+        options = engine_options(URL)
+        self.assertEqual(options["pool_size"], pool_settings()["pool_size"])
+        self.assertTrue(options["pool_pre_ping"])
+        self.assertEqual(options["connect_args"], {})
+
+    def test_statement_timeout(self):
+        with mock.patch.dict("os.environ", {"DB_STATEMENT_TIMEOUT": "30000"}):
+            options = engine_options(URL)
+        self.assertEqual(options["connect_args"]["options"], "-c statement_timeout=30000")
+
+    def test_prepared_statements_only_with_psycopg3(self):
+        with mock.patch.dict("os.environ", {"DB_PREPARE_THRESHOLD": "3"}):
+            options = engine_options("postgresql+psycopg://user@localhost/finance")
+        self.assertEqual(options["connect_args"]["prepare_threshold"], 3)
+        self.assertNotIn("prepare_threshold", engine_options(URL)["connect_args"])
+
+
+class TestGetEngine(TestCase):
+    def tearDown(self):
+        dispose_engines()
+
+    def test_engine_is_shared(self):
+        engine = get_engine(URL)
+        self.assertIs(get_engine(URL), engine)
+        self.assertEqual(engine.pool.size(), pool_settings()["pool_size"])
+
+        dispose_engines()
+        self.assertIsNot(get_engine(URL), engine)
+
+    def test_missing_url(self):
+        with mock.patch.dict("os.environ", clear=True), self.assertRaises(ValueError):
+            get_engine()
+
+    def test_url_is_read_when_the_engine_is_created(self):
+        # like a URL loaded from .env after database was imported
+        with mock.patch.dict("os.environ", {"DB_URL": URL}):
+            self.assertEqual(get_engine().url.render_as_string(), URL)
+
+
+class TestWindowQuery(TestCase):
+    def test_half_open_window_on_the_bare_column(self):
+        sql = str(window_query("stock-titan", ["created_at", "title"]))
+        self.assertTrue(sql.startswith('SELECT "created_at", "title" FROM "stock-titan" WHERE'))
+        self.assertIn('"created_at" >= COALESCE(CAST(:start AS TIMESTAMPTZ), CURRENT_DATE)', sql)
+        self.assertIn('"created_at" < COALESCE(CAST(:end AS TIMESTAMPTZ), CURRENT_DATE + 1)', sql)
+        self.assertNotIn("DATE(created_at)", sql)
+
+
+if __name__ == "__main__":
+    main()
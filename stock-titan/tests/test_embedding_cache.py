@@ -0,0 +1,83 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+from embeddings import embed_texts
+from tests.test_embeddings import FakeModel
+
+MODEL = "BAAI/bge-small-en-v1.5"
+
+
+def vectors(*values):
+    return np.array([[value, value + 0.5] for value in values], dtype=np.float32)
+
+
+class TestEmbeddingCache(TestCase):
+    def test_put_and_get_across_instances(self):
+        with TemporaryDirectory() as tmp:
+            with EmbeddingCache(MODEL, root=tmp) as cache:
+                keys = [cache.key("a"), cache.key("b")]
+                cache.put(keys, vectors(1, 2))
+            with EmbeddingCache(MODEL, root=tmp) as cache:
+                found = cache.get(keys + [cache.key("c")])
+                self.assertEqual(set(found), set(keys))
+                np.testing.assert_array_equal(found[keys[1]], [2, 2.5])
+                self.assertEqual(len(cache), 2)
+
+    def test_keys_depend_on_the_model(self):
+        with TemporaryDirectory() as tmp:
+            first, second = EmbeddingCache(MODEL, root=tmp), EmbeddingCache("other", root=tmp)
+            self.assertNotEqual(first.key("a"), second.key("a"))
+            first.close()
+            second.close()
+
+    def test_cached_keys_are_not_appended_again(self):
+        with TemporaryDirectory() as tmp, EmbeddingCache(MODEL, root=tmp) as cache:
+            key = cache.key("a")
+            cache.put([key, key], vectors(1, 9))
+            cache.put([key], vectors(5))
+            np.testing.assert_array_equal(cache.get([key])[key], [1, 1.5])
+            self.assertEqual(os.path.getsize(os.path.join(cache.dir, "vectors-0.f32")), 8)
+
+    def test_dimension_mismatch(self):
+        with TemporaryDirectory() as tmp, EmbeddingCache(MODEL, root=tmp) as cache:
+            cache.put([cache.key("a")], vectors(1))
+            with self.assertRaises(ValueError):
+                cache.put([cache.key("b")], np.ones((1, 3)))
+            self.assertEqual(len(cache), 1)
+
+    def test_oldest_vectors_are_evicted(self):
+        with TemporaryDirectory() as tmp, EmbeddingCache(MODEL, root=tmp, max_bytes=32) as cache:
+            keys = [cache.key(str(i)) for i in range(5)]
+            cache.put(keys[:3], vectors(0, 1, 2))
+            self.assertEqual(len(cache.get(keys)), 3)
+            # 5 vectors of 8 bytes outgrow 32 bytes, and the newest 3 fit in 24
+            cache.put(keys[3:], vectors(3, 4))
+            found = cache.get(keys)
+            self.assertEqual(set(found), set(keys[2:]))
+            np.testing.assert_array_equal(found[keys[4]], [4, 4.5])
+            self.assertEqual(os.listdir(cache.dir).count("vectors-0.f32"), 0)
+
+    def test_disabled(self):
+        cache = EmbeddingCache(MODEL, root="")
+        cache.put([cache.key("a")], vectors(1))
+        self.assertEqual(cache.get([cache.key("a")]), {})
+        self.assertFalse(cache.enabled)
+
+
+class TestEmbedTextsWithCache(TestCase):
+    def test_only_misses_are_embedded(self):
+        with TemporaryDirectory() as tmp, EmbeddingCache(MODEL, root=tmp) as cache:
+            model = FakeModel()
+            self.assertEqual(embed_texts(model, ["a b", "a"], cache=cache), [[2.0], [1.0]])
+            self.assertEqual(
+                embed_texts(model, ["a", "a b c", "a b c"], cache=cache), [[1.0], [3.0], [3.0]]
+            )
+            self.assertEqual(model.batches, [["a", "a b"], ["a b c"]])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from embedding_cache import EmbeddingCache
+from embeddings import (
+    LazyModel,
+    embed_nodes,
+    embed_texts,
+    get_model,
+    length_buckets,
+    model_id,
+)
+
+
+class FakeModel:
+    """
+    Embeds a text as its number of words, recording the batches it was given.
+    """
+
+    def __init__(self):
+        self.batches = []
+
+    def get_text_embedding_batch(self, texts):
+        self.batches.append(texts)
+        return [[float(len(text.split()))] for text in texts]
+
+
+class TestLengthBuckets(TestCase):
+    def test_texts_of_similar_length_share_a_batch(self):
+        texts = ["a b c d", "a", "a b c d e f", "a b", "a b c d e"]
+        self.assertEqual(length_buckets(texts, batch_size=2), [[1, 3], [0, 4], [2]])
+
+    def test_no_texts(self):
+        self.assertEqual(length_buckets([], batch_size=4), [])
+
+
+class TestEmbedTexts(TestCase):
+    def test_embeddings_are_returned_in_order(self):
+        model = FakeModel()
+        texts = ["a b c", "a", "a b c d", "a b"]
+        self.assertEqual(embed_texts(model, texts, batch_size=2), [[3.0], [1.0], [4.0], [2.0]])
+        self.assertEqual(model.batches, [["a", "a b"], ["a b c", "a b c d"]])
+
+    def test_embed_nodes(self):
+        nodes = [
+            SimpleNamespace(get_content=lambda metadata_mode, text=text: text, embedding=None)
+            for text in ("a b", "a")
+        ]
+        embed_nodes(FakeModel(), nodes, batch_size=8)
+        self.assertEqual([node.embedding for node in nodes], [[2.0], [1.0]])
+
+
+class TestGetModel(TestCase):
+    def test_model_is_loaded_once(self):
+        model = FakeModel()
+        model.embed_batch_size = 10
+        with patch.dict("embeddings._models", {("torch", "fake"): model}):
+            self.assertIs(get_model("fake", batch_size=32), model)
+            self.assertIs(get_model("fake", batch_size=8), model)
+        self.assertEqual(model.embed_batch_size, 32)
+
+    def test_unknown_backend(self):
+        with self.assertRaisesRegex(ValueError, "Unknown embedding backend"):
+            get_model("fake", backend="tensorflow")
+
+    def test_model_id(self):
+        self.assertEqual(model_id("BAAI/bge-small-en-v1.5", "torch"), "BAAI/bge-small-en-v1.5")
+        with patch("onnx_embedding.EMBED_ONNX_QUANTIZE", True):
+            self.assertEqual(model_id("bge", "onnx"), "bge-onnx-int8")
+
+    def test_lazy_model_is_not_loaded_on_cache_hits(self):
+        model = FakeModel()
+        model.embed_batch_size = 32
+        with TemporaryDirectory() as tmp, EmbeddingCache("fake", root=tmp) as cache:
+            with patch.dict("embeddings._models", {("torch", "fake"): model}):
+                embed_texts(LazyModel("fake"), ["a b", "a"], cache=cache)
+            # the registry no longer holds the model, so loading it again would fail
+            with patch("embeddings.get_model", side_effect=AssertionError) as loaded:
+                vectors = embed_texts(LazyModel("fake"), ["a", "a b"], cache=cache)
+        self.assertEqual(vectors, [[1.0], [2.0]])
+        loaded.assert_not_called()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import os
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase, TestCase, main, mock
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+import pandas as pd
+
+import extract
+from extract import (
+    FetchEngine,
+    backfill,
+    fetch,
+    parse,
+    parse_article,
+    parse_links,
+    read_checkpoint,
+    reparse,
+    write_checkpoint,
+)
+from snapshots import SnapshotStore
+
+ARTICLE_HTML = """
+<html><body>
+<h1> Acme Corp Reports Record Quarter </h1>
+<time datetime="2024-05-25T17:34:00.000Z">May 25, 2024</time>
+<div class="impact-bar-container"><span class="rhea-score">Impact (Low)</span></div>
+<div class="sentiment-bar-container"><span class="rhea-score">Sentiment (Very Positive)</span></div>
+<div class="news-card-summary"><div id="summary"> Revenue grew 20%. </div></div>
+<div class="article"><p>Acme   Corp</p>
+<p>reported a record quarter.</p></div>
+</body></html>
+"""
+
+DAY_HTML = """
+<div class="news-row"><a class="feed-link" href="/news/ACME/record-quarter.html">Acme</a></div>
+<div class="news-row"><a class="feed-link" href="/news/XYZ/new-product.html">XYZ</a></div>
+"""
+
+EXPECTED_ARTICLE = {
+    "title": "Acme Corp Reports Record Quarter",
+    "datetime": "2024-05-25T17:34:00.000Z",
+    "impact_score": "Low",
+    "sentiment": "Very Positive",
+    "summary": "Revenue grew 20%.",
+    "article": "Acme Corp reported a record quarter.",
+}
+
+
+class TestParse(TestCase):
+    def test_parse_article(self):
+        self.assertEqual(parse_article(ARTICLE_HTML), EXPECTED_ARTICLE)
+
+    def test_parse_article_without_fields(self):
+        self.assertEqual(
+            parse_article("<html></html>"), {key: "" for key in EXPECTED_ARTICLE}
+        )
+
+    def test_fast_parser_matches_full_parse(self):
+        page = (
+            '<html><head><script>var x = "<h1>not a title</h1>";</script></head>'
+            '<body><nav><div class="menu article-list">Menu</div></nav>'
+            f'<main class="page">{ARTICLE_HTML}</main><footer><h1>Footer</h1></footer></body></html>'
+        )
+        self.assertEqual(parse_article(page), parse_article(page, "html.parser", None))
+        self.assertEqual(parse_links(DAY_HTML), parse_links(DAY_HTML, "html.parser", None))
+
+    def test_parse_links(self):
+        self.assertEqual(
+            parse_links(DAY_HTML),
+            ["/news/ACME/record-quarter.html", "/news/XYZ/new-product.html"],
+        )
+
+
+class TestParseInProcessPool(IsolatedAsyncioTestCase):
+    async def test_parse_in_process_pool(self):
+        with ProcessPoolExecutor(1) as executor:
+            result = await parse(parse_article, ARTICLE_HTML, executor)
+        self.assertEqual(result, EXPECTED_ARTICLE)
+
+
+class TestFetchEngine(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.in_flight = 0
+        self.peak = 0
+
+        async def handler(request):
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            if request.path == "/missing":
+                return web.Response(status=404)
+            return web.Response(text="ok")
+
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", handler)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_limits_requests_per_host(self):
+        async with FetchEngine(max_concurrency=10, max_per_host=3) as engine:
+            urls = [str(self.server.make_url(f"/{i}")) for i in range(20)]
+            pages = await asyncio.gather(*[fetch(url, engine) for url in urls])
+        self.assertEqual(pages, ["ok"] * 20)
+        self.assertLessEqual(self.peak, 3)
+
+    async def test_adaptive_limit_grows_to_the_per_host_limit(self):
+        engine = FetchEngine(max_concurrency=32, max_per_host=16, initial_concurrency=4)
+        self.assertEqual((engine.limiter.limit, engine.limiter.maximum), (4, 16))
+
+    async def test_failed_request_returns_empty_string(self):
+        async with FetchEngine() as engine:
+            page = await fetch(str(self.server.make_url("/missing")), engine)
+        self.assertEqual(page, "")
+
+
+class TestBackfill(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.requested_days = []
+        self.missing = set()
+
+        async def day(request):
+            self.requested_days.append(request.match_info["day"])
+            if request.match_info["day"] in self.missing:
+                raise web.HTTPNotFound()
+            links = f'<div class="news-row"><a class="feed-link" href="/news/ACME/{request.match_info["day"]}.html">Acme</a></div>'
+            return web.Response(text=links, content_type="text/html")
+
+        async def article(request):
+            if request.match_info["slug"] in self.missing:
+                raise web.HTTPNotFound()
+            return web.Response(text=ARTICLE_HTML, content_type="text/html")
+
+        app = web.Application()
+        app.router.add_get("/news/ACME/{slug}", article)
+        app.router.add_get("/news/{day}/", day)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+        self.cwd = os.getcwd()
+        self.tmp = TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    async def asyncTearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+        await self.server.close()
+
+    async def test_backfill_resumes_from_checkpoint(self):
+        write_checkpoint("backfill.checkpoint", "2024-05-02")
+        base_url = str(self.server.make_url("")).rstrip("/")
+        with mock.patch.object(extract, "BASE_URL", base_url), mock.patch.object(
+            extract, "PARSE_WORKERS", 0
+        ):
+            await backfill(date(2024, 5, 1), date(2024, 5, 3), 2, "backfill.checkpoint")
+
+        self.assertEqual(sorted(self.requested_days), ["2024-05-01", "2024-05-03"])
+        self.assertEqual(
+            read_checkpoint("backfill.checkpoint"), {"2024-05-01", "2024-05-02", "2024-05-03"}
+        )
+        self.assertEqual(
+            sorted(name.rsplit("_", 2)[0] for name in os.listdir("data")),
+            ["stocktitan_backfill_2024-05-01", "stocktitan_backfill_2024-05-03"],
+        )
+
+    async def test_failed_dates_are_not_checkpointed(self):
+        # the day page of the 1st and the article of the 2nd fail to load
+        self.missing = {"2024-05-01", "2024-05-02.html"}
+        base_url = str(self.server.make_url("")).rstrip("/")
+        with mock.patch.object(extract, "BASE_URL", base_url), mock.patch.object(
+            extract, "PARSE_WORKERS", 0
+        ):
+            await backfill(date(2024, 5, 1), date(2024, 5, 3), 2, "backfill.checkpoint")
+
+        self.assertEqual(read_checkpoint("backfill.checkpoint"), {"2024-05-03"})
+
+
+class TestReparse(TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_reparse_rebuilds_articles_from_archive(self):
+        store = SnapshotStore("snapshots")
+        store.put("https://example.com/news/ACME/a.html", ARTICLE_HTML, "article", "2024-05-25")
+        store.put("https://example.com/news/ACME/b.html", ARTICLE_HTML, "article", "2024-05-25")
+
+        os.makedirs("data")
+        scraped = [
+            "data/stocktitan_2024-05-25_093000.parquet",
+            "data/stocktitan_backfill_2024-05-01_2024-05-25_120000.parquet",
+        ]
+        kept = [
+            "data/stocktitan_2024-05-26_093000.parquet",
+            "data/stocktitan_backfill_2024-05-25_2024-05-26_120000.parquet",
+        ]
+        for path in scraped + kept:
+            open(path, "w").close()
+
+        reparse(workers=1, store=store, fmt="parquet")
+
+        # the files of the runs of that day are superseded by the re-parsed one
+        self.assertEqual(
+            sorted(os.listdir("data")),
+            sorted(os.path.basename(path) for path in kept + ["stocktitan_2024-05-25.parquet"]),
+        )
+        df = pd.read_parquet("data/stocktitan_2024-05-25.parquet")
+        # both pages hold the same article, which is written once
+        self.assertEqual(len(df), 1)
+        self.assertEqual(df["datetime"][0], pd.Timestamp(EXPECTED_ARTICLE["datetime"]))
+        self.assertEqual(
+            df.drop(columns="datetime").astype(str).to_dict("records"),
+            [{k: v for k, v in EXPECTED_ARTICLE.items() if k != "datetime"}],
+        )
+
+
+if __name__ == "__main__":
+    main()
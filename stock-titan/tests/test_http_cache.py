@@ -0,0 +1,55 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from http_cache import HTTPCache
+
+
+class TestHTTPCache(TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.cache = HTTPCache(root=self.tmp.name, max_age=float("inf"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_miss_sends_no_conditional_headers(self):
+        self.assertEqual(self.cache.lookup("https://example.com/news/"), (None, {}))
+
+    def test_immutable_page_is_served_from_disk(self):
+        url = "https://example.com/news/AAPL/some-article.html"
+        self.cache.store(url, 200, "<html>article</html>", {"ETag": '"abc"'})
+        self.assertEqual(self.cache.lookup(url), ("<html>article</html>", {}))
+
+    def test_listing_page_is_revalidated(self):
+        url = "https://example.com/news/2024-05-26/"
+        headers = {"ETag": '"abc"', "Last-Modified": "Sun, 26 May 2024 10:00:00 GMT"}
+        self.cache.store(url, 200, "<html>listing</html>", headers)
+
+        body, conditional_headers = self.cache.lookup(url)
+        self.assertIsNone(body)
+        self.assertEqual(
+            conditional_headers,
+            {"If-None-Match": '"abc"', "If-Modified-Since": "Sun, 26 May 2024 10:00:00 GMT"},
+        )
+        self.assertEqual(self.cache.store(url, 304, "", {}), (200, "<html>listing</html>"))
+
+    def test_error_responses_are_not_stored(self):
+        url = "https://example.com/news/AAPL/missing.html"
+        self.assertEqual(self.cache.store(url, 404, "not found", {}), (404, "not found"))
+        self.assertIsNone(self.cache.get(url))
+
+    def test_evict_trims_least_recently_used_entries(self):
+        for i in range(3):
+            url = f"https://example.com/news/{i}.html"
+            self.cache.store(url, 200, "x" * 1000, {})
+            os.utime(self.cache._path(url), (i, i))
+        self.cache.max_bytes = 2500
+
+        self.assertEqual(self.cache.evict(), 1)
+        self.assertIsNone(self.cache.get("https://example.com/news/0.html"))
+        self.assertIsNotNone(self.cache.get("https://example.com/news/2.html"))
+
+
+if __name__ == "__main__":
+    main()
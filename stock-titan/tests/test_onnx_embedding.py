@@ -0,0 +1,34 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+from unittest.mock import patch
+
+import numpy as np
+
+from onnx_embedding import cosine_similarities, load_onnx_model, model_path, normalize
+
+
+class TestOnnxEmbedding(TestCase):
+    def test_model_path(self):
+        self.assertEqual(
+            model_path("BAAI/bge-small-en-v1.5", "onnx"),
+            os.path.join("onnx", "BAAI_bge-small-en-v1.5", "model-int8.onnx"),
+        )
+        self.assertTrue(model_path("bge", "onnx", quantize=False).endswith("model.onnx"))
+
+    def test_normalize(self):
+        vectors = normalize(np.array([[3.0, 4.0], [0.0, 0.0]]))
+        self.assertEqual(vectors.tolist(), [[0.6, 0.8], [0.0, 0.0]])
+
+    def test_cosine_similarities(self):
+        similarities = cosine_similarities([[1, 0], [1, 1], [0, 2]], [[2, 0], [1, 0], [0, -1]])
+        np.testing.assert_allclose(similarities, [1.0, np.sqrt(0.5), -1.0])
+
+    def test_missing_export(self):
+        with TemporaryDirectory() as tmp, patch("onnx_embedding.EMBED_ONNX_DIR", tmp):
+            with self.assertRaisesRegex(FileNotFoundError, "onnx_embedding.py export"):
+                load_onnx_model("bge")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+import pandas as pd
+
+from archive import ArchiveStore
+from query import ArchiveQuery
+from schemas import ARTICLE_SCHEMA
+
+
+def articles(day, sentiments):
+    return pd.DataFrame(
+        {
+            "title": [f"Article {i} of {day}" for i in range(len(sentiments))],
+            "datetime": [f"{day}T10:00:00.000Z"] * len(sentiments),
+            "impact_score": ["High" if i % 2 else "Low" for i in range(len(sentiments))],
+            "sentiment": sentiments,
+            "summary": [""] * len(sentiments),
+            "article": ["Text"] * len(sentiments),
+        }
+    )
+
+
+class TestArchiveQuery(TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        store = ArchiveStore("stocktitan", ARTICLE_SCHEMA, root=self.tmp.name)
+        store.write(articles("2024-05-24", ["Positive", "Negative", "Positive"]), "2024-05-24")
+        store.write(articles("2024-05-25", ["Positive", "Neutral"]), "2024-05-25")
+        self.query = ArchiveQuery(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_select_with_filters(self):
+        df = self.query.select(
+            columns=["date", "title"], start="2024-05-25", sentiment=["Positive", "Neutral"]
+        )
+        self.assertEqual(list(df.columns), ["date", "title"])
+        self.assertEqual(
+            df["title"].tolist(), ["Article 0 of 2024-05-25", "Article 1 of 2024-05-25"]
+        )
+
+        df = self.query.select(end="2024-05-24", impact="High")
+        self.assertEqual(df["title"].tolist(), ["Article 1 of 2024-05-24"])
+
+    def test_count(self):
+        df = self.query.count(by=["sentiment"], dataset="stocktitan")
+        self.assertEqual(
+            dict(zip(df["sentiment"], df["articles"])),
+            {"Negative": 1, "Neutral": 1, "Positive": 3},
+        )
+
+    def test_filters_are_pushed_into_the_scan(self):
+        plan = self.query.explain("count", by=["sentiment"], start="2024-05-25", impact="High")
+        self.assertIn("impact_score='High'", plan)
+
+    def test_unknown_column_or_filter(self):
+        with self.assertRaises(ValueError):
+            self.query.select(columns=["title; DROP TABLE x"])
+        with self.assertRaises(ValueError):
+            self.query.select(source="Reuters")
+
+    def test_empty_archive(self):
+        with TemporaryDirectory() as tmp:
+            df = ArchiveQuery(tmp).count(by=["date"])
+            self.assertEqual(list(df.columns), ["date", "articles"])
+            self.assertTrue(df.empty)
+
+
+if __name__ == "__main__":
+    main()
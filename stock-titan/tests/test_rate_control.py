@@ -0,0 +1,160 @@
+import asyncio
+from email.utils import formatdate
+import time
+from unittest import IsolatedAsyncioTestCase, TestCase, main, mock
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from rate_control import AdaptiveLimiter, get_text, get_with_retries, parse_retry_after
+
+
+class TestParseRetryAfter(TestCase):
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after("30"), 30.0)
+
+    def test_http_date(self):
+        delay = parse_retry_after(formatdate(time.time() + 60, usegmt=True))
+        self.assertAlmostEqual(delay, 60, delta=2)
+
+    def test_capped(self):
+        self.assertEqual(parse_retry_after("86400", cap=60), 60.0)
+        self.assertEqual(parse_retry_after(formatdate(time.time() + 86400), cap=60), 60.0)
+
+    def test_missing_or_invalid(self):
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+
+
+class TestAdaptiveLimiter(IsolatedAsyncioTestCase):
+    async def test_additive_increase_multiplicative_decrease(self):
+        limiter = AdaptiveLimiter(initial=8, minimum=1, maximum=10)
+        limiter.on_throttle()
+        self.assertEqual(limiter.limit, 4)
+        # a burst of throttled responses within the cooldown only counts once
+        limiter.on_throttle()
+        self.assertEqual(limiter.limit, 4)
+
+        for _ in range(4):
+            await limiter.on_success()
+        self.assertAlmostEqual(limiter.limit, 5, delta=0.2)
+        for _ in range(1000):
+            await limiter.on_success()
+        self.assertEqual(limiter.limit, 10)
+
+    async def test_raised_limit_wakes_waiters(self):
+        limiter = AdaptiveLimiter(initial=1, maximum=4)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+
+        # the request in flight succeeds and keeps its slot, the limit grows to 2
+        await limiter.on_success()
+        await asyncio.wait_for(waiter, 1)
+        self.assertEqual(limiter.in_flight, 2)
+
+
+class TestGetText(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.hits = 0
+        self.in_flight = 0
+        self.peak = 0
+
+        async def throttled(request):
+            self.hits += 1
+            if self.hits <= 2:
+                return web.Response(status=429, headers={"Retry-After": "0"})
+            return web.Response(text="ok")
+
+        async def slow(request):
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            return web.Response(text="ok")
+
+        async def flaky(request):
+            self.hits += 1
+            return web.Response(status=500 if self.hits == 1 else 200, text="ok")
+
+        app = web.Application()
+        app.router.add_get("/flaky", flaky)
+        app.router.add_get("/throttled", throttled)
+        app.router.add_get("/slow", slow)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.session = aiohttp.ClientSession()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.server.close()
+
+    async def test_retries_throttled_requests(self):
+        limiter = AdaptiveLimiter(initial=4, cooldown=0)
+        status, _, text = await get_text(
+            self.session, str(self.server.make_url("/throttled")), limiter
+        )
+        self.assertEqual((status, text, self.hits), (200, "ok", 3))
+        self.assertEqual(limiter.throttles, 2)
+        self.assertLess(limiter.limit, 4)
+
+    async def test_returns_last_response_when_retries_run_out(self):
+        limiter = AdaptiveLimiter()
+        status, _, _ = await get_text(
+            self.session, str(self.server.make_url("/throttled")), limiter, max_retries=1
+        )
+        self.assertEqual((status, self.hits), (429, 2))
+
+    async def test_limits_requests_in_flight(self):
+        limiter = AdaptiveLimiter(initial=2, maximum=2)
+        url = str(self.server.make_url("/slow"))
+        await asyncio.gather(*[get_text(self.session, url, limiter) for _ in range(10)])
+        self.assertLessEqual(self.peak, 2)
+        self.assertEqual(limiter.in_flight, 0)
+
+    async def test_host_slot_is_free_while_waiting_to_retry(self):
+        host_slot = asyncio.Semaphore(1)
+        url = str(self.server.make_url("/flaky"))
+        with mock.patch("rate_control.backoff_delay", return_value=0.2):
+            task = asyncio.create_task(
+                get_text(self.session, url, AdaptiveLimiter(), host_slot=host_slot)
+            )
+            await asyncio.sleep(0.1)
+            self.assertFalse(host_slot.locked())
+            status, _, _ = await task
+        self.assertEqual((status, self.hits), (200, 2))
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+class TestGetWithRetries(TestCase):
+    def test_retries_server_errors(self):
+        session = FakeSession(
+            [FakeResponse(503, {"Retry-After": "0"}), FakeResponse(200)]
+        )
+        response = get_with_retries(session, "https://example.com/")
+        self.assertEqual((response.status_code, session.calls), (200, 2))
+
+    def test_does_not_retry_client_errors(self):
+        session = FakeSession([FakeResponse(404)])
+        self.assertEqual(get_with_retries(session, "https://example.com/").status_code, 404)
+
+
+if __name__ == "__main__":
+    main()
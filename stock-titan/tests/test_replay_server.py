@@ -0,0 +1,67 @@
+import json
+import os
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase, TestCase, main
+
+import aiohttp
+from aiohttp.test_utils import TestServer
+
+from extract import parse_article, parse_links
+from replay_server import ReplayServer, load_fixtures, record, synthetic_article
+
+
+class TestReplayServer(IsolatedAsyncioTestCase):
+    async def serve(self, **kwargs):
+        self.server = TestServer(ReplayServer(**kwargs).app())
+        await self.server.start_server()
+        self.session = aiohttp.ClientSession()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.server.close()
+
+    async def get(self, path):
+        async with self.session.get(self.server.make_url(path)) as response:
+            return response.status, await response.text()
+
+    async def test_synthetic_pages_parse(self):
+        await self.serve(articles_per_day=3)
+        status, html = await self.get("/news/2024-05-01/")
+        self.assertEqual(status, 200)
+        links = parse_links(html)
+        self.assertEqual(len(links), 3)
+
+        status, html = await self.get(links[0])
+        self.assertEqual(status, 200)
+        article = parse_article(html)
+        self.assertEqual(article["impact_score"], "Low")
+        self.assertTrue(article["article"])
+
+    async def test_fixtures_take_precedence(self):
+        await self.serve(fixtures={"/news/2024-05-01/": "<html>recorded</html>"})
+        self.assertEqual(await self.get("/news/2024-05-01/"), (200, "<html>recorded</html>"))
+        self.assertEqual((await self.get("/unknown"))[0], 404)
+
+    async def test_injects_errors(self):
+        await self.serve(error_rate=1.0)
+        self.assertEqual((await self.get("/news/2024-05-01/"))[0], 503)
+        status, stats = await self.get("/__stats")
+        self.assertEqual(json.loads(stats)["errors"], 1)
+
+
+class TestRecord(TestCase):
+    def test_record_cache_entries(self):
+        with TemporaryDirectory() as tmp:
+            cache_dir = os.path.join(tmp, "cache")
+            os.makedirs(os.path.join(cache_dir, "ab"))
+            body = synthetic_article("ACME", "record-quarter")
+            with open(os.path.join(cache_dir, "ab", "abcdef.json"), "w") as f:
+                json.dump({"url": "https://www.stocktitan.net/news/ACME/a.html", "body": body}, f)
+
+            fixtures_dir = os.path.join(tmp, "fixtures")
+            self.assertEqual(record(cache_dir, fixtures_dir), 1)
+            self.assertEqual(load_fixtures(fixtures_dir), {"/news/ACME/a.html": body})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+import pandas as pd
+import pyarrow as pa
+
+from schemas import ARTICLE_SCHEMA, check_file, iter_frames, read_frame, to_table, write_frame
+
+RECORDS = [
+    {
+        "title": "Acme Corp Reports Record Quarter",
+        "datetime": "2024-05-25T17:34:00.000Z",
+        "impact_score": "Low",
+        "sentiment": "Very Positive",
+        "summary": "Revenue grew 20%.",
+        "article": "Acme Corp reported a record quarter.",
+    },
+    {
+        "title": "XYZ Launches New Product",
+        "datetime": "",
+        "impact_score": "High",
+        "sentiment": "Neutral",
+        "summary": "",
+        "article": "XYZ launched a product.",
+    },
+]
+
+
+class TestToTable(TestCase):
+    def test_records_are_typed(self):
+        table = to_table(RECORDS, ARTICLE_SCHEMA)
+        self.assertEqual(table.schema, ARTICLE_SCHEMA)
+        self.assertEqual(table["datetime"].null_count, 1)
+        self.assertEqual(table["summary"].to_pylist(), ["Revenue grew 20%.", ""])
+        self.assertTrue(pa.types.is_dictionary(table["sentiment"].type))
+
+    def test_missing_columns_are_null(self):
+        table = to_table([{"title": "A"}], ARTICLE_SCHEMA)
+        self.assertEqual(table.schema, ARTICLE_SCHEMA)
+        self.assertEqual(table["article"].to_pylist(), [None])
+
+    def test_odd_timestamps_do_not_fail_the_batch(self):
+        records = [{"datetime": "March 5, 2024"}, {"datetime": "not a date"}] + RECORDS
+        with self.assertLogs("schemas", "WARNING") as logs:
+            table = to_table(records, ARTICLE_SCHEMA)
+        self.assertEqual(
+            [str(value) for value in table["datetime"].to_pylist()],
+            ["2024-03-05 00:00:00+00:00", "None", "2024-05-25 17:34:00+00:00", "None"],
+        )
+        self.assertIn("'not a date'", logs.output[0])
+
+
+class TestReadFrame(TestCase):
+    def test_parquet_and_csv_read_alike(self):
+        with TemporaryDirectory() as tmp:
+            df = pd.DataFrame(RECORDS)
+            paths = [os.path.join(tmp, "a.parquet"), os.path.join(tmp, "a.csv")]
+            for path in paths:
+                write_frame(df, path, ARTICLE_SCHEMA)
+
+            parquet, csv = (read_frame([path], ARTICLE_SCHEMA) for path in paths)
+            pd.testing.assert_frame_equal(parquet, csv)
+            self.assertEqual(str(parquet["datetime"].dt.tz), "UTC")
+            self.assertEqual(str(parquet["impact_score"].dtype), "category")
+
+            both = read_frame(paths, ARTICLE_SCHEMA)
+            self.assertEqual(len(both), 4)
+
+    def test_no_files(self):
+        df = read_frame([], ARTICLE_SCHEMA)
+        self.assertEqual(list(df.columns), ARTICLE_SCHEMA.names)
+        self.assertTrue(df.empty)
+
+
+class TestCheckFile(TestCase):
+    def test_parquet_without_footer(self):
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "articles.parquet")
+            write_frame(pd.DataFrame(RECORDS), path, ARTICLE_SCHEMA)
+            check_file(path, ARTICLE_SCHEMA)
+            with open(path, "r+b") as f:
+                f.truncate(os.path.getsize(path) - 8)
+            with self.assertRaises(pa.ArrowInvalid):
+                check_file(path, ARTICLE_SCHEMA)
+
+    def test_csv_cut_short_in_a_row(self):
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "articles.csv")
+            # more rows than the first block the CSV reader parses
+            write_frame(pd.DataFrame(RECORDS * 20000), path, ARTICLE_SCHEMA)
+            check_file(path, ARTICLE_SCHEMA)
+            with open(path, "r+b") as f:
+                # keep the first field of the last row only
+                last_row = f.read().rstrip(b"\n").rindex(b"\n") + 1
+                f.truncate(last_row + 5)
+            with self.assertRaises(pa.ArrowInvalid):
+                check_file(path, ARTICLE_SCHEMA)
+
+
+class TestIterFrames(TestCase):
+    def test_chunks_span_files_and_formats(self):
+        with TemporaryDirectory() as tmp:
+            df = pd.DataFrame(RECORDS * 3)
+            paths = [os.path.join(tmp, "a.parquet"), os.path.join(tmp, "b.csv")]
+            for path in paths:
+                write_frame(df, path, ARTICLE_SCHEMA)
+
+            chunks = list(iter_frames(paths, ARTICLE_SCHEMA, chunk_size=4))
+            self.assertEqual([len(chunk) for chunk in chunks], [4, 4, 4])
+            pd.testing.assert_frame_equal(
+                pd.concat(chunks, ignore_index=True), read_frame(paths, ARTICLE_SCHEMA)
+            )
+
+    def test_no_files(self):
+        self.assertEqual(list(iter_frames([], ARTICLE_SCHEMA, chunk_size=4)), [])
+
+
+if __name__ == "__main__":
+    main()
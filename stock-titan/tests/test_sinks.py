@@ -0,0 +1,72 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from sinks import RecordSink, content_hash
+
+COLUMNS = ["title", "summary"]
+
+
+class TestContentHash(TestCase):
+    def test_missing_values_hash_like_empty_strings(self):
+        self.assertEqual(
+            content_hash({"title": "A", "summary": float("nan")}, COLUMNS),
+            content_hash({"title": "A"}, COLUMNS),
+        )
+
+    def test_fields_are_delimited(self):
+        self.assertNotEqual(
+            content_hash({"title": "AB", "summary": ""}, COLUMNS),
+            content_hash({"title": "A", "summary": "B"}, COLUMNS),
+        )
+
+
+class TestRecordSink(TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.records = [
+            {"title": "A", "summary": "first"},
+            {"title": "B", "summary": "second, with a comma"},
+            {"title": "A", "summary": "first"},
+            {"title": "C", "summary": ""},
+        ]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, fmt):
+        with RecordSink(os.path.join(self.tmp.name, "out"), COLUMNS, fmt, batch_size=2) as sink:
+            results = [sink.write(record) for record in self.records]
+        self.assertEqual(results, [True, True, False, True])
+        self.assertEqual((sink.written, sink.duplicates), (3, 1))
+        return sink.path
+
+    def test_csv(self):
+        path = self.write("csv")
+        df = pd.read_csv(path, keep_default_na=False)
+        self.assertEqual(df.to_dict("records"), [self.records[i] for i in (0, 1, 3)])
+
+    def test_file_is_renamed_when_closed(self):
+        for fmt in ("csv", "parquet"):
+            with self.subTest(fmt=fmt):
+                path = os.path.join(self.tmp.name, fmt)
+                sink = RecordSink(os.path.join(path, "out"), COLUMNS, fmt, batch_size=1)
+                sink.write(self.records[0])
+                # a run killed now leaves no file the load stage would try to read
+                self.assertEqual(os.listdir(path), [f"out.{fmt}.tmp"])
+                sink.close()
+                self.assertEqual(os.listdir(path), [f"out.{fmt}"])
+
+    def test_parquet_writes_a_row_group_per_batch(self):
+        path = self.write("parquet")
+        self.assertEqual(pq.ParquetFile(path).num_row_groups, 2)
+        self.assertEqual(
+            pq.read_table(path).to_pylist(), [self.records[i] for i in (0, 1, 3)]
+        )
+
+
+if __name__ == "__main__":
+    main()
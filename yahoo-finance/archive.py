@@ -0,0 +1,239 @@
+from datetime import date, datetime
+from glob import glob
+import hashlib
+import json
+import os
+import re
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from bulk_load import HASH_COLUMN, row_hashes
+from schemas import iter_frames, to_table
+
+# Location and compression of the archive of loaded data, overridable through the environment
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "archive")
+ARCHIVE_LEVEL = int(os.environ.get("ARCHIVE_LEVEL", 9))
+# Rows of the data files read and written to a part at once
+ARCHIVE_CHUNK_SIZE = int(os.environ.get("ARCHIVE_CHUNK_SIZE", 50000))
+
+MANIFEST = "manifest.jsonl"
+
+# Date in the name of the files of the data folder, such as stocktitan_2024-05-25.csv
+FILE_DATE = re.compile(r"(\d{4}-\d{2}-\d{2})")
+
+
+def file_date(path: str) -> str:
+    """
+    Returns the date in the name of a data file, or today's date if it has none.
+    """
+    match = FILE_DATE.search(os.path.basename(path))
+    return match.group(1) if match else str(date.today())
+
+
+class ArchiveStore:
+    """
+    Archive of the loaded data as zstd-compressed Parquet, partitioned by dataset and date:
+
+        root/manifest.jsonl
+        root/dataset=yahoofinance/date=2024-05-25/part-20240526T0130-1a2b3c4d.parquet
+
+    Every run adds one part per date, holding the rows of the run's files with their content
+    hash, deduplicated. The manifest has a JSON line per part with its dataset, date, path,
+    row count, range of timestamps, the SHA-256 of the file and a digest of its content
+    hashes, so what was ingested on a date is answered without opening any part, and reading
+    a date range only opens the parts of that range.
+
+    Args:
+        dataset (str): Name of the dataset the archived rows belong to, the name of the
+            source in lowercase letters only, such as stocktitan or yahoofinance.
+        schema (pyarrow.Schema): The columns of the archived rows.
+        root (str): Directory of the archive.
+        level (int): zstd compression level.
+    """
+
+    def __init__(self, dataset, schema, root=ARCHIVE_DIR, level=ARCHIVE_LEVEL):
+        self.dataset = dataset
+        self.schema = schema
+        self.root = root
+        self.level = level
+        self.archive_schema = schema.append(pa.field(HASH_COLUMN, pa.binary(16)))
+
+    def _partition_dir(self, partition: str) -> str:
+        return os.path.join(self.root, f"dataset={self.dataset}", f"date={partition}")
+
+    def write(self, df: pd.DataFrame, partition: str, run: str = None) -> dict:
+        """
+        Writes the rows of a DataFrame as a new part of the given date, and records it in
+        the manifest.
+
+        Returns:
+            dict: The manifest entry of the part, or None if there were no rows to write.
+        """
+        return self.write_frames([df], partition, run)
+
+    def write_frames(self, frames, partition: str, run: str = None) -> dict:
+        """
+        Writes the rows of a sequence of DataFrames as a new part of the given date, a row
+        group per DataFrame so only one of them is held in memory, and records the part in
+        the manifest. Rows already written to the part are left out.
+
+        Returns:
+            dict: The manifest entry of the part, or None if there were no rows to write.
+        """
+        run = run or f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(self._partition_dir(partition), f"part-{run}.parquet")
+        tmp_path = f"{path}.tmp"
+        timestamps = [field.name for field in self.schema if pa.types.is_timestamp(field.type)]
+        hashes, rows, low, high = set(), 0, None, None
+        writer = None
+        try:
+            for df in frames:
+                df = df[self.schema.names]
+                df = df.assign(**{HASH_COLUMN: row_hashes(df, self.schema.names)})
+                df = df.drop_duplicates(subset=HASH_COLUMN)
+                df = df[[digest not in hashes for digest in df[HASH_COLUMN]]]
+                if df.empty:
+                    continue
+                hashes.update(df[HASH_COLUMN])
+
+                table = to_table(df, self.archive_schema)
+                if writer is None:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    writer = pq.ParquetWriter(
+                        tmp_path,
+                        self.archive_schema,
+                        compression="zstd",
+                        compression_level=self.level,
+                    )
+                writer.write_table(table)
+                rows += len(table)
+                if timestamps:
+                    bounds = pc.min_max(table[timestamps[0]])
+                    if bounds["min"].is_valid:
+                        low = min(low or bounds["min"].as_py(), bounds["min"].as_py())
+                        high = max(high or bounds["max"].as_py(), bounds["max"].as_py())
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            return None
+        os.replace(tmp_path, path)
+
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha256.update(block)
+        content = hashlib.blake2b(digest_size=16)
+        for digest in sorted(hashes):
+            content.update(digest)
+
+        entry = {
+            "dataset": self.dataset,
+            "date": partition,
+            "path": os.path.relpath(path, self.root),
+            "rows": rows,
+            "min_datetime": low.isoformat() if low else None,
+            "max_datetime": high.isoformat() if high else None,
+            "sha256": sha256.hexdigest(),
+            "content_hash": content.hexdigest(),
+            "archived_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, MANIFEST), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        return entry
+
+    def archive_files(
+        self, paths: list, remove: bool = True, chunk_size: int = ARCHIVE_CHUNK_SIZE
+    ) -> list:
+        """
+        Compacts data files into the archive, one part per date named in the files, and
+        removes them once their part is written. The files are read chunk_size rows at a
+        time, so memory is bounded by the chunk size rather than the size of a date.
+
+        Returns:
+            list: The manifest entries of the parts written.
+        """
+        by_date = {}
+        for path in sorted(paths):
+            by_date.setdefault(file_date(path), []).append(path)
+
+        run = f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        entries = []
+        for partition, files in sorted(by_date.items()):
+            frames = iter_frames(files, self.schema, chunk_size)
+            entry = self.write_frames(frames, partition, run)
+            if entry:
+                entries.append(entry)
+            if remove:
+                for path in files:
+                    os.remove(path)
+        return entries
+
+    def manifest(self, start: str = None, end: str = None) -> list:
+        """
+        Returns the manifest entries of the dataset's parts, optionally only those dated
+        between start and end, both included, oldest first.
+        """
+        path = os.path.join(self.root, MANIFEST)
+        if not os.path.exists(path):
+            return []
+
+        entries = []
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # line cut short by an interrupted run
+                if entry["dataset"] != self.dataset:
+                    continue
+                if (start and entry["date"] < start) or (end and entry["date"] > end):
+                    continue
+                entries.append(entry)
+        return sorted(entries, key=lambda entry: (entry["date"], entry["path"]))
+
+    def paths(self, start: str = None, end: str = None) -> list:
+        """
+        Returns the paths of the parts dated between start and end, both included.
+        """
+        return [
+            os.path.join(self.root, entry["path"]) for entry in self.manifest(start, end)
+        ]
+
+    def read(self, start: str = None, end: str = None, columns: list = None) -> pd.DataFrame:
+        """
+        Reads the rows archived between start and end, both included, opening only the
+        parts of that range.
+
+        Args:
+            start (str, optional): First date to read, as YYYY-MM-DD.
+            end (str, optional): Last date to read, as YYYY-MM-DD.
+            columns (list, optional): Columns to read, all of the schema's by default.
+        """
+        columns = columns or self.schema.names
+        tables = [
+            pq.read_table(path, columns=columns, memory_map=True, use_threads=True)
+            for path in self.paths(start, end)
+        ]
+        if not tables:
+            return self.archive_schema.empty_table().select(columns).to_pandas()
+        return pa.concat_tables(tables).to_pandas()
+
+    def compact_legacy(self) -> list:
+        """
+        Moves the flat CSV and Parquet files archived before the archive was partitioned
+        into partitions.
+
+        Returns:
+            list: The manifest entries of the parts written.
+        """
+        paths = glob(os.path.join(self.root, "*.csv")) + glob(
+            os.path.join(self.root, "*.parquet")
+        )
+        return self.archive_files(paths)
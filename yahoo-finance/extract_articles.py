@@ -1,18 +1,90 @@
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from glob import glob
 import logging
 from logging.handlers import RotatingFileHandler
 import os
 import re
+from urllib.parse import urlsplit
 
-from bs4 import BeautifulSoup
+import aiohttp
+from bs4 import BeautifulSoup, SoupStrainer
 import pandas as pd
 import requests
 
+from http_cache import HTTPCache
+from rate_control import AdaptiveLimiter, get_text, get_with_retries
+from extract_urls import NEWS_STRAINER, NewsScraper
+from schemas import ARTICLE_SCHEMA, NEWS_SCHEMA, OUTPUT_FORMAT, read_frame, write_frame
+from seen_index import SeenIndex
+from snapshots import REPARSE_WORKERS, SnapshotStore, read_snapshot
+
+# BeautifulSoup tree builder used to parse pages, "lxml" or "html.parser"
+HTML_PARSER = os.environ.get("HTML_PARSER", "lxml")
+
+
+def _article_body(name, attrs):
+    # the class attribute is not split into a list yet while the page is being parsed
+    classes = attrs.get("class") or ""
+    if isinstance(classes, str):
+        classes = classes.split()
+    return name == "div" and "caas-body" in classes
+
+
+# Only the article body is built into the tree when parsing an article page
+ARTICLE_STRAINER = SoupStrainer(_article_body)
+
+
+def parse_article_text(
+    html: str, parser: str = HTML_PARSER, parse_only: SoupStrainer = ARTICLE_STRAINER
+) -> str:
+    """
+    Returns the whitespace-normalized text of the article body of a page, or an empty string
+    if the page has none.
+    """
+    soup = BeautifulSoup(html, parser, parse_only=parse_only)
+    div_tag = soup.find("div", {"class": "caas-body"})
+    if not div_tag:
+        return ""
+    return re.sub(r"\s+", " ", div_tag.get_text().strip())
+
 
 class ArticleScraper:
-    def __init__(self, base_path="data/*.csv"):
+    def __init__(
+        self,
+        base_path="data/stock_market_news_*",
+        fetch_mode="async",
+        max_concurrency=16,
+        timeout=30,
+        cache=None,
+        seen=None,
+        snapshots=None,
+    ):
+        """
+        Initialize the scraper.
+
+        Args:
+            base_path (str): Glob pattern of the Parquet or CSV files listing the article URLs.
+            fetch_mode (str): "async" to fetch articles concurrently, "sync" to fetch them one by one.
+            max_concurrency (int): Maximum number of articles fetched at the same time in async mode.
+            timeout (float): Timeout in seconds for each article request.
+            cache (HTTPCache): On-disk response cache, defaults to one configured from the environment.
+            seen (SeenIndex): Index the scraped URLs are recorded in, defaults to one configured from the environment.
+            snapshots (SnapshotStore): Archive the raw HTML of articles is kept in, defaults to one configured from the environment.
+        """
+        if fetch_mode not in ("async", "sync"):
+            raise ValueError(f"Unknown fetch mode: {fetch_mode}")
+
         self.base_path = base_path
+        self.fetch_mode = fetch_mode
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.cache = cache if cache is not None else HTTPCache()
+        self.seen = seen if seen is not None else SeenIndex()
+        self.snapshots = snapshots if snapshots is not None else SnapshotStore()
+        self.session = requests.Session()
         # Create logs directory if it does not exist
         if not os.path.exists("logs"):
             os.makedirs("logs")
@@ -52,16 +124,79 @@ class ArticleScraper:
         # read in data from path
         path = glob(self.base_path)
         if not path:
-            self.logger.error("No CSV files found in the path.")
+            self.logger.error("No news files found in the path.")
             return
 
-        df = pd.read_csv(path[0])
-        self.logger.info("CSV file loaded successfully.")
+        df = read_frame(path[:1], NEWS_SCHEMA)
+        self.logger.info("News file loaded successfully.")
 
         # Update dataframe with articles
-        df["article"] = df["url"].apply(self.get_article)
+        if self.fetch_mode == "async":
+            df["article"] = asyncio.run(self.get_articles(df["url"].tolist()))
+        else:
+            df["article"] = df["url"].apply(self.get_article)
+
+        removed = self.cache.evict()
+        self.logger.info(f"Evicted {removed} entries from the HTTP cache")
         return df
 
+    async def get_articles(self, urls: list) -> list:
+        """
+        Retrieves the content of several articles concurrently over a pooled session.
+
+        Parameters:
+        urls (list): The URLs of the articles.
+
+        Returns:
+        list: The content of each article, in the same order as the URLs.
+        """
+        limiter = AdaptiveLimiter(
+            initial=min(8, self.max_concurrency), maximum=self.max_concurrency
+        )
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            tasks = [self.get_article_async(url, session, limiter) for url in urls]
+            return await asyncio.gather(*tasks)
+
+    async def get_article_async(
+        self, url: str, session: aiohttp.ClientSession, limiter: AdaptiveLimiter
+    ) -> str:
+        """
+        Asynchronously retrieves the content of an article from the specified URL.
+
+        Parameters:
+        url (str): The URL of the article.
+        session (aiohttp.ClientSession): The session used for the request.
+        limiter (AdaptiveLimiter): Bounds the number of requests in flight and backs off when throttled.
+
+        Returns:
+        str: The content of the article.
+        """
+        html, headers = self.cache.lookup(url)
+        if html is not None:
+            self.logger.info(f"Article served from cache for {url}")
+            await self.snapshots.put_async(url, html, kind="article")
+            return self.parse_article(html, url)
+
+        try:
+            status, response_headers, html = await get_text(
+                session, url, limiter, headers=headers, logger=self.logger
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.error(f"Request failed: {e!r}")
+            return ""
+
+        status, html = self.cache.store(url, status, html, response_headers)
+        if status >= 400:
+            self.logger.error(f"Request failed with status code {status} for {url}")
+            return ""
+        self.logger.info(f"Article retrieved successfully from {url}")
+        await self.snapshots.put_async(url, html, kind="article")
+
+        return self.parse_article(html, url)
+
     def get_article(self, url: str) -> str:
         """
         Retrieves the content of an article from the specified URL.
@@ -72,40 +207,157 @@ class ArticleScraper:
         Returns:
         str: The content of the article.
         """
+        html, headers = self.cache.lookup(url)
+        if html is not None:
+            self.logger.info(f"Article served from cache for {url}")
+            self.snapshots.put(url, html, kind="article")
+            return self.parse_article(html, url)
+
         try:
-            response = requests.get(url)
+            response = get_with_retries(
+                self.session,
+                url,
+                logger=self.logger,
+                timeout=self.timeout,
+                headers=headers,
+            )
             response.raise_for_status()
             self.logger.info(f"Article retrieved successfully from {url}")
         except requests.RequestException as e:
             self.logger.error(f"Request failed: {e}")
             return ""
 
-        soup = BeautifulSoup(response.text, "html.parser")
-        div_tag = soup.find("div", {"class": "caas-body"})
-        if div_tag:
-            article = div_tag.get_text().strip()
-            article = re.sub(r"\s+", " ", article)
-            return article
-        else:
+        _, html = self.cache.store(
+            url, response.status_code, response.text, response.headers
+        )
+        self.snapshots.put(url, html, kind="article")
+        return self.parse_article(html, url)
+
+    def parse_article(
+        self,
+        html: str,
+        url: str,
+        parser: str = HTML_PARSER,
+        parse_only: SoupStrainer = ARTICLE_STRAINER,
+    ) -> str:
+        """
+        Extracts the article content from the HTML of an article page.
+
+        Parameters:
+        html (str): The HTML of the article page.
+        url (str): The URL the page was retrieved from.
+        parser (str): The BeautifulSoup tree builder to parse the page with.
+        parse_only (SoupStrainer): Restricts parsing to the article body, None parses the whole page.
+
+        Returns:
+        str: The content of the article.
+        """
+        article = parse_article_text(html, parser, parse_only)
+        if not article:
             self.logger.warning(f"No article content found for URL: {url}")
-            return ""
+        return article
+
+
+def reparse_article(path: str) -> str:
+    """
+    Extracts the article content from an archived article page.
+    """
+    return parse_article_text(read_snapshot(path))
+
+
+def reparse(
+    partitions: list = None,
+    workers: int = REPARSE_WORKERS,
+    store: SnapshotStore = None,
+    fmt: str = OUTPUT_FORMAT,
+) -> None:
+    """
+    Rebuilds the scraped articles from the raw HTML archive, without any network access.
+
+    For each day of the archive, the news are read from the archived listing pages and the
+    content of their archived articles is extracted across a pool of processes. The result
+    is written to the data folder under that day's name. The pages of a scrape are archived
+    under the day they were fetched, so the file replaces those of the scrapes run that day,
+    which are removed once it is written.
+
+    Parameters:
+    partitions (list): Dates of the partitions to re-parse, all by default.
+    workers (int): Number of processes the articles are parsed in.
+    store (SnapshotStore): The archive, defaults to the one configured from the environment.
+    fmt (str): Output format, "parquet" or "csv".
+    """
+    store = store if store is not None else SnapshotStore()
+    if not store.enabled:
+        raise ValueError("Set SNAPSHOT_DIR to the archive to re-parse")
+
+    scraper = NewsScraper(
+        base_url="",
+        cache=HTTPCache(root=None),
+        seen=SeenIndex(path=None),
+        snapshots=SnapshotStore(root=None),
+    )
+    with ProcessPoolExecutor(max(1, workers)) as executor:
+        for partition in partitions or store.partitions():
+            news = {}
+            for entry in store.entries(partition, kind="listing"):
+                # news links are relative to the site the listing came from
+                parts = urlsplit(entry["url"])
+                scraper.base_url = f"{parts.scheme}://{parts.netloc}"
+                soup = BeautifulSoup(
+                    read_snapshot(entry["path"]), HTML_PARSER, parse_only=NEWS_STRAINER
+                )
+                for div in scraper.get_news_tags(soup):
+                    item = scraper.parse_news(div)
+                    news.setdefault(item["url"], item)
+
+            articles = {
+                entry["url"]: entry["path"]
+                for entry in store.entries(partition, kind="article")
+            }
+            news = [item for item in news.values() if item["url"] in articles]
+            paths = [articles[item["url"]] for item in news]
+            for item, article in zip(news, executor.map(reparse_article, paths, chunksize=16)):
+                item["article"] = article
+
+            path = f"data/scraped_articles_{partition}.{fmt}"
+            os.makedirs("data", exist_ok=True)
+            df = pd.DataFrame(news, columns=ARTICLE_SCHEMA.names)
+            write_frame(df, path, ARTICLE_SCHEMA)
+            scraper.logger.info(f"Re-parsed {len(news)} articles from {partition} into {path}")
+            for superseded in glob(f"data/scraped_articles_{partition}_*"):
+                os.remove(superseded)
+                scraper.logger.info(f"Removed {superseded}, superseded by {path}")
+    store.close()
 
 
 if __name__ == "__main__":
-    scraper = ArticleScraper()
-    articles_df = scraper.scrape_articles()
-    articles_df["article"] = articles_df["article"].fillna("")
-    date = datetime.now().strftime("%Y-%m-%d")
-    if articles_df is not None:
-        articles_df.to_csv(f"data/scraped_articles_{date}.csv", index=False)
-        scraper.logger.info("Scraped articles saved to scraped_articles.csv")
-        # delete old files
-        files = glob("data/*.csv")
-        [
-            os.remove(file)
-            for file in files
-            if file != f"data/scraped_articles_{date}.csv"
-        ]
-        scraper.logger.info(
-            f"Deleted old CSV files except scraped_articles_{date}.csv file"
-        )
+    parser = argparse.ArgumentParser(description="Scrape the articles of the listed news.")
+    subparsers = parser.add_subparsers(dest="command")
+    reparse_parser = subparsers.add_parser(
+        "reparse", help="rebuild the scraped articles from the raw HTML archive"
+    )
+    reparse_parser.add_argument(
+        "--partition", action="append", help="date to re-parse, all dates by default"
+    )
+    reparse_parser.add_argument("--workers", type=int, default=REPARSE_WORKERS)
+    reparse_parser.add_argument("--format", choices=["parquet", "csv"], default=OUTPUT_FORMAT)
+    args = parser.parse_args()
+
+    if args.command == "reparse":
+        reparse(args.partition, args.workers, fmt=args.format)
+    else:
+        scraper = ArticleScraper()
+        articles_df = scraper.scrape_articles()
+        articles_df["article"] = articles_df["article"].fillna("")
+        # each run writes its own file, articles of an earlier run may not be loaded yet
+        run = datetime.now().strftime("%Y-%m-%d_%H%M%S")
+        if articles_df is not None:
+            output = f"data/scraped_articles_{run}.{OUTPUT_FORMAT}"
+            write_frame(articles_df, output, ARTICLE_SCHEMA)
+            scraper.logger.info(f"Scraped articles saved to {output}")
+            # only remember articles once they are safely written out
+            scraper.seen.add(articles_df.loc[articles_df["article"] != "", "url"].tolist())
+            # delete the news files, the articles files are removed once loaded
+            [os.remove(file) for file in glob(scraper.base_path)]
+            scraper.logger.info(f"Deleted the news files matching {scraper.base_path}")
+        scraper.snapshots.close()
@@ -1,16 +1,48 @@
+import asyncio
 from datetime import datetime
 import logging
 from logging.handlers import RotatingFileHandler
 import os
 
-from bs4 import BeautifulSoup
+import aiohttp
+from bs4 import BeautifulSoup, SoupStrainer
 import pandas as pd
 import requests
 
+from http_cache import HTTPCache
+from rate_control import AdaptiveLimiter, get_text, get_with_retries
+from schemas import NEWS_SCHEMA, OUTPUT_FORMAT, write_frame
+from seen_index import SeenIndex
+from snapshots import SnapshotStore
+
+COLUMNS = ["source", "title", "url", "content"]
+
+# BeautifulSoup tree builder used to parse pages, "lxml" or "html.parser"
+HTML_PARSER = os.environ.get("HTML_PARSER", "lxml")
+# Class of the div holding each news item on a listing page
+NEWS_CLASS = "Ov(h) Pend(44px) Pstart(25px)"
+# Only the news items are built into the tree when parsing a listing page
+NEWS_STRAINER = SoupStrainer("div", {"class": NEWS_CLASS})
+# Topics whose listing pages are scraped, as a comma separated list
+TOPICS = os.environ.get("YAHOO_TOPICS", "stock-market-news").split(",")
+
 
 class NewsScraper:
-    def __init__(self, base_url: str):
+    def __init__(
+        self,
+        base_url: str,
+        cache: HTTPCache = None,
+        seen: SeenIndex = None,
+        max_concurrency: int = 8,
+        timeout: float = 30,
+        snapshots: SnapshotStore = None,
+    ):
         self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.cache = cache if cache is not None else HTTPCache()
+        self.seen = seen if seen is not None else SeenIndex()
+        self.snapshots = snapshots if snapshots is not None else SnapshotStore()
         # Create logs directory if it does not exist
         if not os.path.exists("logs"):
             os.makedirs("logs")
@@ -37,19 +69,28 @@ class NewsScraper:
         log_file_handler.setFormatter(file_handler_formatter)
         self.logger.addHandler(log_file_handler)
 
-    def get_page(self, url: str) -> BeautifulSoup:
+    def get_page(self, url: str, parse_only: SoupStrainer = None) -> BeautifulSoup:
         """
         Get the webpage content from the specified URL and return it as a BeautifulSoup object.
 
         Args:
             url (str): The URL of the webpage to download.
+            parse_only (SoupStrainer, optional): Restricts parsing to the matching elements. Defaults to None, which parses the whole page.
 
         Returns:
             BeautifulSoup: The parsed HTML content of the webpage.
         """
+        html, headers = self.cache.lookup(url)
+        if html is not None:
+            self.logger.info(f"Serving webpage from cache: {url}")
+            self.snapshots.put(url, html, kind="listing")
+            return BeautifulSoup(html, HTML_PARSER, parse_only=parse_only)
+
         self.logger.info(f"Downloading webpage: {url}")
         # make a request to the url and wait for page to load completely
-        response = requests.get(url, timeout=30)
+        response = get_with_retries(
+            requests, url, logger=self.logger, timeout=30, headers=headers
+        )
 
         if not response.ok:
             self.logger.error(
@@ -59,9 +100,78 @@ class NewsScraper:
                 f"Failed to load {url} with status code {response.status_code}\n"
             )
 
-        soup = BeautifulSoup(response.text, "html.parser")
+        _, html = self.cache.store(
+            url, response.status_code, response.text, response.headers
+        )
+        self.snapshots.put(url, html, kind="listing")
+        soup = BeautifulSoup(html, HTML_PARSER, parse_only=parse_only)
         return soup
 
+    async def get_pages(self, urls: list, parse_only: SoupStrainer = None) -> list:
+        """
+        Get several webpages concurrently over a shared session.
+
+        Args:
+            urls (list): The URLs of the webpages to download.
+            parse_only (SoupStrainer, optional): Restricts parsing to the matching elements. Defaults to None, which parses the whole page.
+
+        Returns:
+            list: The parsed HTML content of each webpage in the order of the URLs, None for the pages that failed to load.
+        """
+        limiter = AdaptiveLimiter(
+            initial=min(8, self.max_concurrency), maximum=self.max_concurrency
+        )
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            tasks = [
+                self.get_page_async(url, session, limiter, parse_only) for url in urls
+            ]
+            return await asyncio.gather(*tasks)
+
+    async def get_page_async(
+        self,
+        url: str,
+        session: aiohttp.ClientSession,
+        limiter: AdaptiveLimiter,
+        parse_only: SoupStrainer = None,
+    ) -> BeautifulSoup:
+        """
+        Asynchronously get the webpage content from the specified URL and return it as a BeautifulSoup object.
+
+        Args:
+            url (str): The URL of the webpage to download.
+            session (aiohttp.ClientSession): The session used for the request.
+            limiter (AdaptiveLimiter): Bounds the number of requests in flight and backs off when throttled.
+            parse_only (SoupStrainer, optional): Restricts parsing to the matching elements. Defaults to None, which parses the whole page.
+
+        Returns:
+            BeautifulSoup: The parsed HTML content of the webpage, or None if it failed to load.
+        """
+        html, headers = self.cache.lookup(url)
+        if html is not None:
+            self.logger.info(f"Serving webpage from cache: {url}")
+            await self.snapshots.put_async(url, html, kind="listing")
+            return BeautifulSoup(html, HTML_PARSER, parse_only=parse_only)
+
+        self.logger.info(f"Downloading webpage: {url}")
+        try:
+            status, response_headers, html = await get_text(
+                session, url, limiter, headers=headers, logger=self.logger
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.error(f"Failed to load {url}: {e!r}")
+            return None
+
+        status, html = self.cache.store(url, status, html, response_headers)
+        if status >= 400:
+            self.logger.error(f"Failed to load {url} with status code {status}")
+            return None
+
+        await self.snapshots.put_async(url, html, kind="listing")
+        return BeautifulSoup(html, HTML_PARSER, parse_only=parse_only)
+
     def get_news_tags(self, soup: BeautifulSoup) -> list:
         """
         Get news tags from the BeautifulSoup object.
@@ -74,7 +184,7 @@ class NewsScraper:
         """
         self.logger.info("Extracting news tags from page")
 
-        return soup.find_all("div", {"class": "Ov(h) Pend(44px) Pstart(25px)"})
+        return soup.find_all("div", {"class": NEWS_CLASS})
 
     def parse_news(self, div_tag) -> dict:
         """
@@ -93,38 +203,67 @@ class NewsScraper:
 
         return {"source": source, "title": title, "url": url, "content": content}
 
-    def scrape_news(self, path: str = None) -> pd.DataFrame:
+    def scrape_news(
+        self,
+        path: str = None,
+        skip_seen: bool = True,
+        topics: list = None,
+        pages: list = None,
+    ) -> pd.DataFrame:
         """
-        Scrapes news data from a website and saves it to a CSV file. If no path is provided, a default filename based on the current date is used. Returns a pandas DataFrame containing the scraped news data.
+        Scrapes news data from a website and saves it to a Parquet or CSV file, depending on the extension of the path. If no path is provided, a default filename based on the current date is used. Returns a pandas DataFrame containing the scraped news data.
+
+        The listing pages of all topics and pages are downloaded concurrently and their news merged, keeping the first occurrence of each URL.
 
         Parameters:
-            path (str, optional): The path to save the CSV file. Defaults to None.
+            path (str, optional): The path to save the file to. Defaults to None.
+            skip_seen (bool, optional): Leave out news whose article was already scraped. Defaults to True.
+            topics (list, optional): Topics whose listing pages are scraped, such as "stock-market-news". Defaults to TOPICS.
+            pages (list, optional): Paths of additional listing pages, such as "/news/". Defaults to None.
 
         Returns:
             pandas.DataFrame: The DataFrame containing the scraped news data.
         """
         if path is None:
             date = datetime.now().strftime("%Y-%m-%d")
-            path = f"data/stock_market_news_{date}.csv"
+            path = f"data/stock_market_news_{date}.{OUTPUT_FORMAT}"
 
-        full_url = self.base_url + "/topic/stock-market-news/"
+        topics = TOPICS if topics is None else topics
+        urls = [f"{self.base_url}/topic/{topic}/" for topic in topics]
+        urls += [self.base_url + page for page in pages or []]
 
-        self.logger.info(f"Starting news scraping for URL: {full_url}")
+        self.logger.info(f"Starting news scraping for URLs: {', '.join(urls)}")
 
-        doc = self.get_page(url=full_url)
-        div_tags = self.get_news_tags(soup=doc)
+        docs = asyncio.run(self.get_pages(urls, parse_only=NEWS_STRAINER))
+        if all(doc is None for doc in docs):
+            raise Exception(f"Failed to load any of {', '.join(urls)}")
 
-        news = [self.parse_news(div) for div in div_tags]
+        news = {}
+        for doc in docs:
+            if doc is None:
+                continue
+            for div in self.get_news_tags(soup=doc):
+                item = self.parse_news(div)
+                news.setdefault(item["url"], item)
+        news = list(news.values())
         self.logger.info(f"{len(news)} news extracted")
 
-        df = pd.DataFrame(news)
-        df.to_csv(path, index=False)
+        if skip_seen:
+            unseen = set(self.seen.filter_unseen([item["url"] for item in news]))
+            news = [item for item in news if item["url"] in unseen]
+            self.logger.info(f"{len(news)} news not scraped before")
+
+        df = pd.DataFrame(news, columns=COLUMNS)
+        write_frame(df, path, NEWS_SCHEMA)
 
         self.logger.info(f"News data saved to {path}")
 
-        return df
+        removed = self.cache.evict()
+        self.logger.info(f"Evicted {removed} entries from the HTTP cache")
 
+        return df
 
 if __name__ == "__main__":
     scraper = NewsScraper(base_url="https://finance.yahoo.com")
     news_df = scraper.scrape_news()
+    scraper.snapshots.close()
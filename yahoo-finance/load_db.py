@@ -1,13 +1,23 @@
+import argparse
 from glob import glob
 import logging
 from logging.handlers import RotatingFileHandler
 import os
+import shutil
 
-import pandas as pd
-from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
+import pyarrow as pa
+
+from archive import ArchiveStore
+from bulk_load import LOAD_METHOD, backfill_hashes, load_frames, unique_frames
+from database import dispose_engines, get_engine
+from schemas import ARTICLE_SCHEMA, check_file, iter_frames
 
 load_dotenv()
+# Number of rows read from the data files and loaded at a time
+LOAD_CHUNK_SIZE = int(os.environ.get("LOAD_CHUNK_SIZE", 50000))
+# Folder the data files that cannot be read are moved to, out of the way of later runs
+REJECTED_DIR = "data/rejected"
 
 # Create logs directory if it does not exist
 if not os.path.exists("logs"):
@@ -34,71 +44,112 @@ log_file_handler.setFormatter(file_handler_formatter)
 logger.addHandler(log_file_handler)
 
 
-def load_data():
+def readable_files(paths):
+    """
+    Function to keep the data files that can be read, moving the others to the rejected
+    folder, so a file cut short by a killed scrape does not abort the whole load.
+    """
+    readable = []
+    for path in paths:
+        try:
+            check_file(path, ARTICLE_SCHEMA)
+        except (pa.ArrowInvalid, OSError) as e:
+            os.makedirs(REJECTED_DIR, exist_ok=True)
+            shutil.move(path, os.path.join(REJECTED_DIR, os.path.basename(path)))
+            logger.error(f"Moved unreadable {path} to {REJECTED_DIR}: {e}")
+            continue
+        readable.append(path)
+    return readable
+
+
+def load_data(chunk_size=LOAD_CHUNK_SIZE):
     """
-    Function to load data from a CSV file in the 'data' folder.
-    Returns a pandas DataFrame object.
+    Function to load data from the Parquet and CSV files in the 'data' folder.
+    Yields pandas DataFrames typed by ARTICLE_SCHEMA of at most chunk_size rows, with
+    their content hash and without the rows already yielded, so memory is bounded by
+    the chunk size rather than the amount of data waiting to be loaded.
     """
-    if os.path.exists("data") and any(
-        file.endswith(".csv") for file in os.listdir("data")
-    ):
-        logger.info("CSV data found in the data folder")
-        # read in data from path
-        path = glob("data/*.csv")
+    path = readable_files(sorted(glob("data/*.parquet") + glob("data/*.csv")))
+    if path:
+        logger.info(f"{len(path)} data files found in the data folder")
     else:
-        logger.info("No CSV data found in the data folder")
+        logger.info("No data found in the data folder")
 
-    # load data from all csv files
-    df = pd.concat([pd.read_csv(file) for file in path], ignore_index=True)
-    df.drop_duplicates(inplace=True)
-    return df
+    # load data from all files, chunk by chunk
+    chunks = iter_frames(path, ARTICLE_SCHEMA, chunk_size)
+    for df in unique_frames(chunks, ARTICLE_SCHEMA.names):
+        logger.info(f"Read a chunk of {len(df)} new rows")
+        yield df
 
 
-def create_archive():
+def create_archive(store=None):
     """
-    Function to create an archive of the data in the 'data' folder.
+    Function to compact the data in the 'data' folder into the archive, as zstd
+    Parquet partitioned by dataset and date and indexed by the archive manifest.
     """
-    if not os.path.exists("archive"):
-        # create archive folder
-        os.makedirs("archive")
-        logger.info("Archive folder created.")
+    store = store if store is not None else ArchiveStore("yahoofinance", ARTICLE_SCHEMA)
+    path = glob("data/*.parquet") + glob("data/*.csv")
+    for entry in store.archive_files(path):
+        logger.info(f"Archived {entry['rows']} rows of {entry['date']} into {entry['path']}.")
 
-    # move data to archive folder
-    for file in os.listdir("data"):
-        os.rename(f"data/{file}", f"archive/{file}")
-        logger.info(f"{file} moved to archive folder.")
 
+def run_pipeline(start=None, end=None):
+    """
+    Function to load the extracted data, archive it and embed the loaded articles into
+    the vector store in a single process, so both stages share the pooled connections
+    of one engine instead of each setting up its own.
+    """
+    # imported here, only the pipeline needs the embedding stack
+    from load_vs import YahooFinanceLoader
 
-if __name__ == "__main__":
-    df = load_data()
-    logger.info("CSV data loaded successfully.")
-
-    # create an engine to connect to a database
-    engine = create_engine(os.environ.get("DB_URL"))
-    conn = engine.connect()
-    logger.info("Connected to the database.")
-
-    df.to_sql("yahoo-finance", con=conn, if_exists="append", index=False)
-
-    conn.autocommit = True
-    logger.info("Data loaded successfully.")
-
-    query = \
-'''
-DELETE FROM "yahoo-finance"
-WHERE id IN (
-    SELECT id
-    FROM (
-        SELECT id,
-            ROW_NUMBER() OVER (PARTITION BY source, title, url, content, article, created_at ORDER BY id) AS row_num
-        FROM "yahoo-finance"
-    ) AS subquery
-    WHERE subquery.row_num > 1
-);
-'''
-    result = conn.execute(text(query))
-    logger.info(f"Deleted {result.rowcount} duplicate rows.")
-    conn.close()
-    logger.info("Connection closed.")
+    engine = get_engine()
+    rows = load_frames(engine, load_data(), "yahoo-finance", ARTICLE_SCHEMA)
+    logger.info(f"Inserted {rows} rows with {LOAD_METHOD}.")
     create_archive()
     logger.info("Archive created.")
+    try:
+        # the loader gets the same engine from get_engine
+        YahooFinanceLoader().run(start, end)
+    finally:
+        dispose_engines()
+        logger.info("Connection closed.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the extracted data into the database.")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser(
+        "migrate", help="hash the rows loaded before deduplication by content hash"
+    )
+    subparsers.add_parser(
+        "compact_archive", help="partition the files archived before the archive manifest"
+    )
+    pipeline_parser = subparsers.add_parser(
+        "pipeline", help="load, archive and embed the data in one process"
+    )
+    pipeline_parser.add_argument("--start", help="start of the window embedded, today by default")
+    pipeline_parser.add_argument("--end", help="end of the window embedded, tomorrow by default")
+    args = parser.parse_args()
+
+    if args.command == "pipeline":
+        run_pipeline(args.start, args.end)
+    elif args.command == "compact_archive":
+        for entry in ArchiveStore("yahoofinance", ARTICLE_SCHEMA).compact_legacy():
+            logger.info(f"Archived {entry['rows']} rows of {entry['date']} into {entry['path']}.")
+    else:
+        # get the shared engine of the database
+        engine = get_engine()
+        logger.info("Connected to the database.")
+
+        if args.command == "migrate":
+            hashed, deleted = backfill_hashes(engine, "yahoo-finance", ARTICLE_SCHEMA)
+            logger.info(f"Hashed {hashed} rows and deleted {deleted} duplicate rows.")
+        else:
+            # rows already in the table conflict on their content hash and are skipped
+            rows = load_frames(engine, load_data(), "yahoo-finance", ARTICLE_SCHEMA)
+            logger.info(f"Inserted {rows} rows with {LOAD_METHOD}.")
+
+            dispose_engines()
+            logger.info("Connection closed.")
+            create_archive()
+            logger.info("Archive created.")
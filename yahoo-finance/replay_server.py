@@ -0,0 +1,215 @@
+"""
+Local stand-in for finance.yahoo.com, used to benchmark the scraper without touching the site.
+
+Serves recorded pages from a fixtures directory and synthetic listing and article pages
+for everything else, with configurable latency and injected errors.
+
+    python3 replay_server.py record [--cache DIR] [--fixtures DIR]
+    python3 replay_server.py serve [--port PORT] [--latency S] [--error-rate R] ...
+"""
+import argparse
+import asyncio
+from glob import glob
+import hashlib
+import json
+import os
+import random
+import re
+from urllib.parse import urlsplit
+
+from aiohttp import web
+
+from http_cache import CACHE_DIR
+
+FIXTURES_DIR = "fixtures"
+ARTICLES_PER_LISTING = 50
+
+LISTING_PATH = re.compile(r"^/topic/([\w-]+)/$")
+ARTICLE_PATH = re.compile(r"^/news/([\w-]+)\.html$")
+
+# Page chrome around the content, so synthetic pages weigh about as much as real ones
+_CHROME = "".join(
+    f'<div class="menu-item"><a href="/topic/{i}/">Section {i}</a><span>Latest news</span></div>'
+    for i in range(600)
+)
+
+
+def synthetic_listing(topic, articles=ARTICLES_PER_LISTING):
+    """
+    Returns a topic listing page with the given number of news items.
+    """
+    items = "".join(
+        '<li><div class="Ov(h) Pend(44px) Pstart(25px)">'
+        f'<div class="C(#959595)">Source {i % 7}</div>'
+        f'<h3><a href="/news/{topic}-article-{i}.html">Article {i}</a></h3>'
+        f"<p>Teaser of article {i} about {topic}.</p></div></li>"
+        for i in range(articles)
+    )
+    return f"<html><body><nav>{_CHROME}</nav><ul>{items}</ul></body></html>"
+
+
+def synthetic_article(slug):
+    """
+    Returns an article page with a body the scraper extracts.
+    """
+    paragraphs = "".join(
+        f"<p>Paragraph {i} of {slug}, with enough text to look like a news article.</p>"
+        for i in range(40)
+    )
+    return (
+        f"<html><head><script>var page = '{slug}';</script></head><body><nav>{_CHROME}</nav>"
+        f"<h1>{slug}</h1><div class=\"caas-body-wrapper\"><div class=\"caas-body caas-content\">"
+        f"{paragraphs}</div></div><footer>{_CHROME}</footer></body></html>"
+    )
+
+
+def record(cache_dir=CACHE_DIR, fixtures_dir=FIXTURES_DIR):
+    """
+    Copies the pages in the HTTP cache into the fixtures directory, keyed by URL path.
+
+    Returns:
+        int: The number of pages recorded.
+    """
+    os.makedirs(fixtures_dir, exist_ok=True)
+    count = 0
+    for path in glob(os.path.join(cache_dir, "*", "*.json")):
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+        url_path = urlsplit(entry["url"]).path
+        name = hashlib.sha256(url_path.encode("utf-8")).hexdigest()
+        with open(os.path.join(fixtures_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump({"path": url_path, "body": entry["body"]}, f)
+        count += 1
+    return count
+
+
+def load_fixtures(fixtures_dir=FIXTURES_DIR):
+    """
+    Returns the recorded pages as a dictionary of URL path to body.
+    """
+    fixtures = {}
+    for path in glob(os.path.join(fixtures_dir, "*.json")):
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+        fixtures[entry["path"]] = entry["body"]
+    return fixtures
+
+
+class ReplayServer:
+    """
+    aiohttp application serving recorded or synthetic pages.
+
+    Args:
+        fixtures (dict): Recorded pages by URL path, served before synthetic pages.
+        latency (float): Seconds every response is delayed by.
+        jitter (float): Upper bound of a random extra delay in seconds.
+        error_rate (float): Fraction of requests answered with 503 Service Unavailable.
+        throttle_rate (float): Fraction of requests answered with 429 Too Many Requests.
+        retry_after (float): Retry-After value of the 429 responses.
+        articles_per_listing (int): Number of news items on synthetic listing pages.
+    """
+
+    def __init__(
+        self,
+        fixtures=None,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        throttle_rate=0.0,
+        retry_after=0.0,
+        articles_per_listing=ARTICLES_PER_LISTING,
+    ):
+        self.fixtures = fixtures or {}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.articles_per_listing = articles_per_listing
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0, "not_found": 0}
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/__stats", self.handle_stats)
+        app.router.add_get("/{tail:.*}", self.handle)
+        return app
+
+    def page(self, path):
+        if path in self.fixtures:
+            return self.fixtures[path]
+        match = LISTING_PATH.match(path)
+        if match:
+            return synthetic_listing(match.group(1), self.articles_per_listing)
+        match = ARTICLE_PATH.match(path)
+        if match:
+            return synthetic_article(match.group(1))
+        return None
+
+    async def handle(self, request):
+        self.stats["requests"] += 1
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+
+        roll = random.random()
+        if roll < self.throttle_rate:
+            self.stats["throttled"] += 1
+            return web.Response(status=429, headers={"Retry-After": str(self.retry_after)})
+        if roll < self.throttle_rate + self.error_rate:
+            self.stats["errors"] += 1
+            return web.Response(status=503)
+
+        body = self.page(request.path)
+        if body is None:
+            self.stats["not_found"] += 1
+            return web.Response(status=404)
+        return web.Response(text=body, content_type="text/html")
+
+    async def handle_stats(self, request):
+        return web.json_response(self.stats)
+
+
+def serve(host="127.0.0.1", port=8080, fixtures_dir=FIXTURES_DIR, **kwargs):
+    """
+    Runs the stand-in server until interrupted.
+    """
+    server = ReplayServer(fixtures=load_fixtures(fixtures_dir), **kwargs)
+    web.run_app(server.app(), host=host, port=port, print=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="turn the HTTP cache into fixtures")
+    record_parser.add_argument("--cache", default=CACHE_DIR)
+    record_parser.add_argument("--fixtures", default=FIXTURES_DIR)
+
+    serve_parser = subparsers.add_parser("serve", help="run the stand-in server")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8080)
+    serve_parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    serve_parser.add_argument("--latency", type=float, default=0.0)
+    serve_parser.add_argument("--jitter", type=float, default=0.0)
+    serve_parser.add_argument("--error-rate", type=float, default=0.0)
+    serve_parser.add_argument("--throttle-rate", type=float, default=0.0)
+    serve_parser.add_argument("--articles-per-listing", type=int, default=ARTICLES_PER_LISTING)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        print(f"Recorded {record(args.cache, args.fixtures)} pages into {args.fixtures}")
+    else:
+        serve(
+            args.host,
+            args.port,
+            args.fixtures,
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            throttle_rate=args.throttle_rate,
+            articles_per_listing=args.articles_per_listing,
+        )
+
+
+if __name__ == "__main__":
+    main()
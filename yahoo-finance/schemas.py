@@ -0,0 +1,163 @@
+import logging
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+# Format of the files handed from the extract to the load stage, "parquet" or "csv"
+OUTPUT_FORMAT = os.environ.get("OUTPUT_FORMAT", "parquet")
+
+# Columns with a handful of distinct values are dictionary encoded
+LABEL = pa.dictionary(pa.int32(), pa.string())
+
+NEWS_SCHEMA = pa.schema(
+    [
+        ("source", LABEL),
+        ("title", pa.string()),
+        ("url", pa.string()),
+        ("content", pa.string()),
+    ]
+)
+
+ARTICLE_SCHEMA = NEWS_SCHEMA.append(pa.field("article", pa.string()))
+
+
+def to_table(data, schema: pa.Schema) -> pa.Table:
+    """
+    Converts records, a DataFrame or a table to a table with the given schema.
+
+    Columns missing from the data are filled with nulls, and empty strings become nulls in
+    columns that do not hold plain strings, so "" parses as a missing timestamp.
+    """
+    if isinstance(data, pd.DataFrame):
+        table = pa.Table.from_pandas(data, preserve_index=False)
+    elif isinstance(data, pa.Table):
+        table = data
+    else:
+        table = pa.Table.from_pylist(list(data))
+
+    columns = []
+    for field in schema:
+        if field.name not in table.column_names:
+            columns.append(pa.nulls(len(table), field.type))
+            continue
+        column = table[field.name]
+        if pa.types.is_string(column.type) and not pa.types.is_string(field.type):
+            column = pc.if_else(pc.equal(column, ""), pa.scalar(None, column.type), column)
+        columns.append(_cast(column, field))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _cast(column, field: pa.Field):
+    # casts a column to the type of a field, parsing timestamps that are not ISO 8601 with
+    # an offset leniently, so one odd value cannot fail a whole batch
+    try:
+        return column.cast(field.type)
+    except pa.ArrowInvalid:
+        if not (pa.types.is_timestamp(field.type) and pa.types.is_string(column.type)):
+            raise
+    values = column.to_pandas()
+    parsed = pd.to_datetime(values, utc=True, errors="coerce", format="mixed")
+    invalid = values[parsed.isna() & values.notna()]
+    if len(invalid):
+        logger.warning(
+            f"Stored {len(invalid)} unparseable {field.name} values as null, "
+            f"such as {invalid.iloc[0]!r}"
+        )
+    return pa.Array.from_pandas(parsed).cast(field.type, safe=False)
+
+
+def check_file(path: str, schema: pa.Schema) -> None:
+    """
+    Reads a Parquet or CSV file the way it is loaded, raising pyarrow.ArrowInvalid or
+    OSError if it cannot be, such as a Parquet file whose writer was killed before its
+    footer or a CSV file cut short in the middle of a row.
+
+    The footer of a Parquet file is enough to check it, CSV files are parsed to the end
+    batch by batch, so memory stays bounded however large they are.
+    """
+    if path.endswith(".parquet"):
+        pq.read_metadata(path)
+        return
+    for _ in _record_batches(path, schema, batch_size=None):
+        pass
+
+
+def write_frame(df: pd.DataFrame, path: str, schema: pa.Schema) -> None:
+    """
+    Writes a DataFrame with the given schema, as Parquet if the path ends in .parquet and
+    as CSV otherwise.
+    """
+    if path.endswith(".parquet"):
+        pq.write_table(to_table(df, schema), path)
+    else:
+        df.to_csv(path, index=False, columns=schema.names)
+
+
+def read_table(path: str, schema: pa.Schema) -> pa.Table:
+    """
+    Reads a Parquet or CSV file into a table with the given schema. Parquet files are
+    memory-mapped and both formats are decoded on several threads.
+    """
+    if path.endswith(".parquet"):
+        table = pq.read_table(path, memory_map=True, use_threads=True)
+    else:
+        table = pv.read_csv(
+            path,
+            read_options=pv.ReadOptions(use_threads=True),
+            convert_options=pv.ConvertOptions(
+                column_types={name: pa.string() for name in schema.names},
+                strings_can_be_null=False,
+            ),
+        )
+    return to_table(table, schema)
+
+
+def _record_batches(path: str, schema: pa.Schema, batch_size: int):
+    # reads a file batch by batch rather than as a whole
+    if path.endswith(".parquet"):
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        yield from parquet_file.iter_batches(batch_size=batch_size, use_threads=True)
+        return
+    yield from pv.open_csv(
+        path,
+        read_options=pv.ReadOptions(use_threads=True),
+        convert_options=pv.ConvertOptions(
+            column_types={name: pa.string() for name in schema.names},
+            strings_can_be_null=False,
+        ),
+    )
+
+
+def iter_frames(paths: list, schema: pa.Schema, chunk_size: int):
+    """
+    Reads Parquet and CSV files with the given schema as a sequence of DataFrames of
+    chunk_size rows, the last one possibly shorter, so memory is bounded by the chunk size
+    rather than the size of the files.
+    """
+    pending, rows = [], 0
+    for path in paths:
+        for batch in _record_batches(path, schema, chunk_size):
+            pending.append(to_table(pa.Table.from_batches([batch]), schema))
+            rows += batch.num_rows
+            while rows >= chunk_size:
+                table = pa.concat_tables(pending)
+                yield table.slice(0, chunk_size).to_pandas()
+                pending, rows = [table.slice(chunk_size)], rows - chunk_size
+    if rows:
+        yield pa.concat_tables(pending).to_pandas()
+
+
+def read_frame(paths: list, schema: pa.Schema) -> pd.DataFrame:
+    """
+    Reads Parquet and CSV files with the given schema into a single DataFrame.
+    """
+    tables = [read_table(path, schema) for path in paths]
+    if not tables:
+        return schema.empty_table().to_pandas()
+    return pa.concat_tables(tables).to_pandas()
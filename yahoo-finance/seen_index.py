@@ -0,0 +1,91 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+# Location of the index, overridable through the environment.
+# Set SEEN_INDEX_PATH to an empty string to disable the index.
+SEEN_INDEX_PATH = os.environ.get("SEEN_INDEX_PATH", "cache/seen.sqlite3")
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+class SeenIndex:
+    """
+    Persistent index of the URLs that have already been scraped.
+
+    URLs are stored as 12-byte BLAKE2 digests in a SQLite table without rowids, which keeps
+    the index compact and lookups a single primary-key probe per URL.
+
+    Args:
+        path (str): Path of the SQLite database. The index is disabled when empty or None,
+            in which case every URL is reported as unseen.
+    """
+
+    def __init__(self, path=SEEN_INDEX_PATH):
+        self.path = path
+        self.conn = None
+        if not path:
+            return
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen "
+            "(key BLOB PRIMARY KEY, seen_at INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __contains__(self, url: str) -> bool:
+        return not self.filter_unseen([url])
+
+    @staticmethod
+    def _key(url: str) -> bytes:
+        return hashlib.blake2b(url.encode("utf-8"), digest_size=12).digest()
+
+    def filter_unseen(self, urls: list) -> list:
+        """
+        Returns the URLs that are not in the index, in their original order and without repeats.
+        """
+        urls = list(dict.fromkeys(urls))
+        if self.conn is None:
+            return urls
+
+        keys = [self._key(url) for url in urls]
+        seen = set()
+        for start in range(0, len(keys), _LOOKUP_BATCH):
+            batch = keys[start:start + _LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.conn.execute(
+                f"SELECT key FROM seen WHERE key IN ({placeholders})", batch
+            )
+            seen.update(row[0] for row in rows)
+        return [url for url, key in zip(urls, keys) if key not in seen]
+
+    def add(self, urls: list) -> None:
+        """
+        Records the given URLs as scraped.
+        """
+        if self.conn is None:
+            return
+        now = int(time.time())
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO seen (key, seen_at) VALUES (?, ?)",
+            [(self._key(url), now) for url in urls],
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,165 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+import hashlib
+import json
+import os
+import threading
+
+import zstandard
+
+# Location of the raw HTML archive, overridable through the environment.
+# Pages are only archived when SNAPSHOT_DIR is set, for example to "archive/html".
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "")
+SNAPSHOT_LEVEL = int(os.environ.get("SNAPSHOT_LEVEL", 3))
+# Number of processes used to re-parse the archive
+REPARSE_WORKERS = int(os.environ.get("REPARSE_WORKERS", os.cpu_count() or 1))
+
+MANIFEST = "manifest.jsonl"
+
+
+def read_snapshot(path: str) -> str:
+    """
+    Returns the HTML stored in a snapshot file.
+    """
+    with open(path, "rb") as f:
+        return zstandard.ZstdDecompressor().decompress(f.read()).decode("utf-8")
+
+
+class SnapshotStore:
+    """
+    Archive of the raw HTML of fetched pages, so fields can be extracted again without
+    downloading anything.
+
+    Pages are compressed with zstd and stored under a partition per day, named after their
+    SHA-256 digest so a page fetched several times on a day is stored once:
+
+        root/date=2024-05-25/manifest.jsonl
+        root/date=2024-05-25/3f/3fa1...e2.html.zst
+
+    The manifest of a partition has a JSON line per archived page with its URL, kind,
+    digest, fetch time and size. The last line for a URL wins.
+
+    Args:
+        root (str): Directory of the archive. Archiving is disabled when empty or None.
+        level (int): zstd compression level.
+    """
+
+    def __init__(self, root=SNAPSHOT_DIR, level=SNAPSHOT_LEVEL):
+        self.root = root
+        self._compressor = zstandard.ZstdCompressor(level=level) if root else None
+        # a compressor must not be used by two threads at once
+        self._lock = threading.Lock()
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root)
+
+    def _partition_dir(self, partition: str) -> str:
+        return os.path.join(self.root, f"date={partition}")
+
+    def blob_path(self, partition: str, digest: str) -> str:
+        return os.path.join(self._partition_dir(partition), digest[:2], f"{digest}.html.zst")
+
+    def put(self, url: str, html: str, kind: str = "page", partition: str = None) -> str:
+        """
+        Archives the HTML of a page in the given partition, today's by default.
+
+        Returns:
+            str: The digest of the page, or None if archiving is disabled.
+        """
+        if not self.enabled:
+            return None
+
+        partition = partition or str(date.today())
+        body = html.encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.blob_path(partition, digest)
+        entry = {
+            "url": url,
+            "kind": kind,
+            "sha256": digest,
+            "fetched_at": datetime.now().isoformat(timespec="seconds"),
+            "size": len(body),
+        }
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(self._compressor.compress(body))
+                os.replace(tmp_path, path)
+            with open(os.path.join(self._partition_dir(partition), MANIFEST), "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        return digest
+
+    async def put_async(
+        self, url: str, html: str, kind: str = "page", partition: str = None
+    ) -> str:
+        """
+        Archives the HTML of a page like put, in a background thread of the store, so
+        compressing and writing it does not stall the downloads in flight on the event loop.
+        Pages are archived one at a time, in the order they are given.
+        """
+        if not self.enabled:
+            return None
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(1, thread_name_prefix="snapshots")
+        return await asyncio.get_running_loop().run_in_executor(
+            self._writer, self.put, url, html, kind, partition
+        )
+
+    def close(self) -> None:
+        """
+        Waits for the pages being archived in the background and stops the thread writing
+        them.
+        """
+        if self._writer is None:
+            return
+        self._writer.shutdown(wait=True)
+        self._writer = None
+
+    def partitions(self) -> list:
+        """
+        Returns the dates of the partitions in the archive, oldest first.
+        """
+        if not self.enabled or not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name.split("=", 1)[1]
+            for name in os.listdir(self.root)
+            if name.startswith("date=")
+        )
+
+    def entries(self, partition: str, kind: str = None) -> list:
+        """
+        Returns the manifest entries of a partition, the latest one per URL, with the path of
+        their snapshot file under "path".
+
+        Args:
+            partition (str): The date of the partition.
+            kind (str, optional): Only return entries of this kind.
+        """
+        path = os.path.join(self._partition_dir(partition), MANIFEST)
+        if not os.path.exists(path):
+            return []
+
+        entries = {}
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # line cut short by an interrupted run
+                entry["path"] = self.blob_path(partition, entry["sha256"])
+                entries[entry["url"]] = entry
+        return [
+            entry for entry in entries.values() if kind is None or entry["kind"] == kind
+        ]
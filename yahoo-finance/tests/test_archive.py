@@ -0,0 +1,89 @@
+from glob import glob
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from archive import ArchiveStore, file_date
+from schemas import ARTICLE_SCHEMA, write_frame
+
+
+def articles(day, count):
+    return pd.DataFrame(
+        {
+            "source": ["Reuters"] * count,
+            "title": [f"News {i} of {day}" for i in range(count)],
+            "url": [f"https://finance.yahoo.com/news/{day}-{i}.html" for i in range(count)],
+            "content": [""] * count,
+            "article": ["Text"] * count,
+        }
+    )
+
+
+class TestArchiveStore(TestCase):
+    def test_files_are_compacted_by_date(self):
+        with TemporaryDirectory() as tmp:
+            data = os.path.join(tmp, "data")
+            os.makedirs(data)
+            for day, count in (("2024-05-24", 3), ("2024-05-25", 2)):
+                write_frame(
+                    articles(day, count),
+                    os.path.join(data, f"scraped_articles_{day}.csv"),
+                    ARTICLE_SCHEMA,
+                )
+
+            store = ArchiveStore(
+                "yahoofinance", ARTICLE_SCHEMA, root=os.path.join(tmp, "archive")
+            )
+            files = [os.path.join(data, name) for name in os.listdir(data)]
+            entries = store.archive_files(files)
+
+            self.assertEqual(os.listdir(data), [])
+            self.assertEqual(
+                [(entry["date"], entry["rows"]) for entry in entries],
+                [("2024-05-24", 3), ("2024-05-25", 2)],
+            )
+            self.assertTrue(entries[0]["path"].startswith("dataset=yahoofinance/date=2024-05-24/"))
+            # the news have no timestamp of their own
+            self.assertIsNone(entries[0]["min_datetime"])
+            self.assertEqual(store.manifest(), entries)
+
+    def test_files_are_archived_a_chunk_at_a_time(self):
+        with TemporaryDirectory() as tmp:
+            # the second run of the day found the articles of the first one again
+            for run, count in (("090000.csv", 3), ("100000.parquet", 4)):
+                write_frame(
+                    articles("2024-05-25", count),
+                    os.path.join(tmp, f"scraped_articles_2024-05-25_{run}"),
+                    ARTICLE_SCHEMA,
+                )
+
+            store = ArchiveStore("yahoofinance", ARTICLE_SCHEMA, root=os.path.join(tmp, "archive"))
+            files = glob(os.path.join(tmp, "scraped_articles_*"))
+            [entry] = store.archive_files(files, chunk_size=2)
+
+            self.assertEqual(entry["rows"], 4)
+            part = pq.ParquetFile(os.path.join(tmp, "archive", entry["path"]))
+            self.assertEqual(part.metadata.num_rows, 4)
+            self.assertGreater(part.metadata.num_row_groups, 1)
+
+    def test_read_date_range(self):
+        with TemporaryDirectory() as tmp:
+            store = ArchiveStore("yahoofinance", ARTICLE_SCHEMA, root=tmp)
+            for day in ("2024-05-23", "2024-05-24", "2024-05-25"):
+                store.write(articles(day, 2), day)
+
+            df = store.read("2024-05-24", "2024-05-25", columns=["source", "url"])
+            self.assertEqual(list(df.columns), ["source", "url"])
+            self.assertEqual(len(df), 4)
+            self.assertEqual(str(df["source"].dtype), "category")
+            self.assertEqual(len(store.read(end="2024-05-23")), 2)
+
+    def test_file_date(self):
+        self.assertEqual(file_date("data/scraped_articles_2024-05-25.parquet"), "2024-05-25")
+
+
+if __name__ == "__main__":
+    main()
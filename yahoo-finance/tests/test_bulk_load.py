@@ -0,0 +1,117 @@
+import csv
+from unittest import TestCase, main, mock
+
+import pandas as pd
+import pyarrow as pa
+
+from bulk_load import (
+    copy_frame,
+    copy_statement,
+    csv_chunks,
+    load_frame,
+    load_frames,
+    prepare_table,
+    row_hashes,
+    unique_frames,
+)
+
+
+class TestCopy(TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame(
+            {
+                "title": ["A", "B, with a comma", 'C "quoted"'],
+                "summary": ["", None, "line\nbreak"],
+            }
+        )
+
+    def test_copy_statement_quotes_identifiers(self):
+        self.assertEqual(
+            copy_statement("yahoo-finance", ["title", "summary"]),
+            'COPY "yahoo-finance" ("title", "summary") FROM STDIN WITH (FORMAT csv, NULL \'\\N\')',
+        )
+
+    def test_csv_chunks(self):
+        chunks = list(csv_chunks(self.df, chunk_size=2))
+        rows = [row for chunk in chunks for row in csv.reader(chunk)]
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(
+            rows,
+            [["A", ""], ["B, with a comma", "\\N"], ['C "quoted"', "line\nbreak"]],
+        )
+
+    def test_copy_frame_sends_every_chunk(self):
+        conn = mock.MagicMock()
+        cursor = conn.connection.cursor.return_value
+        self.assertEqual(copy_frame(conn, self.df, "yahoo-finance", chunk_size=2), 3)
+        self.assertEqual(cursor.copy_expert.call_count, 2)
+        statement = cursor.copy_expert.call_args[0][0]
+        self.assertTrue(statement.startswith('COPY "yahoo-finance"'))
+        cursor.close.assert_called_once()
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            schema = pa.schema([("title", pa.string()), ("summary", pa.string())])
+            load_frame(mock.MagicMock(), self.df, "yahoo-finance", schema, method="insert")
+
+    def test_binary_columns_are_hex_encoded(self):
+        df = pd.DataFrame({"title": ["A"], "content_hash": [b"\x00\xff"]})
+        [chunk] = csv_chunks(df)
+        self.assertEqual(chunk.getvalue(), "A,\\x00ff\n")
+
+
+class TestLoadFrames(TestCase):
+    def test_chunks_share_one_transaction_and_staging_table(self):
+        engine = mock.MagicMock()
+        conn = engine.begin.return_value.__enter__.return_value
+        conn.execute.return_value.rowcount = 1
+        schema = pa.schema([("title", pa.string())])
+        frames = [pd.DataFrame({"title": ["A"]}), pd.DataFrame({"title": ["B"]})]
+        with mock.patch("bulk_load.copy_frame") as copy:
+            self.assertEqual(load_frames(engine, frames, "yahoo-finance", schema), 2)
+        engine.begin.assert_called_once()
+        self.assertEqual(copy.call_count, 2)
+        statements = [str(call.args[0]) for call in conn.execute.call_args_list]
+        self.assertEqual(sum("CREATE TEMPORARY TABLE" in s for s in statements), 1)
+        self.assertEqual(sum(s.startswith("TRUNCATE") for s in statements), 2)
+
+
+class TestPrepareTable(TestCase):
+    def test_indexes(self):
+        conn = mock.MagicMock()
+        prepare_table(conn, "yahoo-finance", pa.schema([("title", pa.string())]))
+        statements = [str(call.args[0]) for call in conn.execute.call_args_list]
+        self.assertIn(
+            'CREATE INDEX IF NOT EXISTS "yahoo-finance_created_at_idx" ON "yahoo-finance" (created_at)',
+            statements,
+        )
+
+
+class TestUniqueFrames(TestCase):
+    def test_rows_seen_in_earlier_chunks_are_dropped(self):
+        frames = [
+            pd.DataFrame({"title": ["A", "B", "A"]}),
+            pd.DataFrame({"title": ["B", "C"]}),
+            pd.DataFrame({"title": ["C"]}),
+        ]
+        chunks = list(unique_frames(frames, ["title"]))
+        self.assertEqual([chunk["title"].tolist() for chunk in chunks], [["A", "B"], ["C"]])
+        self.assertEqual(chunks[1]["content_hash"].tolist(), row_hashes(frames[1][1:], ["title"]))
+
+
+class TestRowHashes(TestCase):
+    def test_missing_values_hash_like_empty_strings(self):
+        df = pd.DataFrame({"title": ["A", "A", "B"], "summary": [None, "", ""]})
+        hashes = row_hashes(df, ["title", "summary"])
+        self.assertEqual(hashes[0], hashes[1])
+        self.assertNotEqual(hashes[0], hashes[2])
+        self.assertEqual(len(hashes[0]), 16)
+
+    def test_fields_are_delimited(self):
+        df = pd.DataFrame({"title": ["AB", "A"], "summary": ["", "B"]})
+        first, second = row_hashes(df, ["title", "summary"])
+        self.assertNotEqual(first, second)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import os
+from unittest import TestCase, main
+
+import numpy as np
+
+from embedding_pool import EmbeddingPool, thread_budget
+from embeddings import embed_texts
+
+
+class FakeModel:
+    """
+    Embeds a text as its number of words and the process that embedded it.
+    """
+
+    def get_text_embedding_batch(self, texts):
+        if "fail" in texts:
+            raise ValueError("Cannot embed fail")
+        return [[float(len(text.split())), float(os.getpid())] for text in texts]
+
+
+def load_fake(name, batch_size):
+    return FakeModel()
+
+
+class TestEmbeddingPool(TestCase):
+    def test_vectors_are_returned_in_order(self):
+        texts = [" ".join(["a"] * (i % 7 + 1)) for i in range(100)]
+        with EmbeddingPool(2, 1, "fake", batch_size=4, shard_size=8, loader=load_fake) as pool:
+            vectors = pool.embed(texts)
+            self.assertEqual(vectors.dtype, np.float32)
+            self.assertTrue(vectors.flags["C_CONTIGUOUS"])
+            self.assertEqual(vectors[:, 0].tolist(), [float(i % 7 + 1) for i in range(100)])
+            # the shards were embedded in the workers
+            self.assertNotIn(float(os.getpid()), vectors[:, 1].tolist())
+
+            # the pool stands in for the model of embed_texts
+            self.assertEqual([v[0] for v in embed_texts(pool, ["a b", "a"], 100)], [2.0, 1.0])
+
+    def test_worker_errors_are_raised(self):
+        with EmbeddingPool(1, 1, "fake", batch_size=4, loader=load_fake) as pool:
+            with self.assertRaisesRegex(RuntimeError, "Cannot embed fail"):
+                pool.embed(["a", "fail"])
+            # the pool restarts its workers on the next texts
+            self.assertEqual(pool.embed(["a b"])[0, 0], 2.0)
+
+    def test_no_texts(self):
+        pool = EmbeddingPool(2, 1, "fake", loader=load_fake)
+        self.assertEqual(len(pool.embed([])), 0)
+        pool.close()
+
+    def test_thread_budget(self):
+        self.assertEqual(thread_budget(4, threads=3), 3)
+        self.assertEqual(thread_budget(os.cpu_count() * 2, threads=0), 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import asyncio
+import os
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase, TestCase, main
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+import pandas as pd
+
+from extract_articles import ArticleScraper, reparse
+from http_cache import HTTPCache
+from seen_index import SeenIndex
+from snapshots import SnapshotStore, read_snapshot
+
+
+ARTICLE_HTML = """
+<html><body><h1>Fed holds rates</h1>
+<div class="caas-body-wrapper"><div class="caas-body caas-content">
+<p>The Fed   kept rates</p>\n<p>unchanged on Wednesday.</p>
+</div></div><div class="caas-footer">Related</div></body></html>
+"""
+
+
+class TestParseArticle(TestCase):
+    def setUp(self):
+        self.scraper = ArticleScraper(cache=HTTPCache(root=None), seen=SeenIndex(path=None))
+
+    def test_parse_article(self):
+        self.assertEqual(
+            self.scraper.parse_article(ARTICLE_HTML, "https://finance.yahoo.com/news/a.html"),
+            "The Fed kept rates unchanged on Wednesday.",
+        )
+
+    def test_fast_parser_matches_full_parse(self):
+        url = "https://finance.yahoo.com/news/a.html"
+        self.assertEqual(
+            self.scraper.parse_article(ARTICLE_HTML, url),
+            self.scraper.parse_article(ARTICLE_HTML, url, "html.parser", None),
+        )
+
+
+class TestGetArticles(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        async def handler(request):
+            index = int(request.match_info["index"])
+            # answer later requests first so the order of completion differs from the input
+            await asyncio.sleep(0.01 * (5 - index))
+            body = f'<div class="caas-body"><p>Article   {index}</p></div>'
+            return web.Response(text=body, content_type="text/html")
+
+        app = web.Application()
+        app.router.add_get("/news/{index}", handler)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_get_articles_keeps_input_order(self):
+        scraper = ArticleScraper(
+            max_concurrency=2, cache=HTTPCache(root=None), seen=SeenIndex(path=None)
+        )
+        urls = [str(self.server.make_url(f"/news/{i}")) for i in range(5)]
+        urls.append(str(self.server.make_url("/missing")))
+        articles = await scraper.get_articles(urls)
+        self.assertEqual(articles, [f"Article {i}" for i in range(5)] + [""])
+
+    async def test_get_articles_archives_pages(self):
+        with TemporaryDirectory() as tmp:
+            store = SnapshotStore(tmp)
+            scraper = ArticleScraper(
+                cache=HTTPCache(root=None), seen=SeenIndex(path=None), snapshots=store
+            )
+            urls = [str(self.server.make_url(f"/news/{i}")) for i in range(2)]
+            urls.append(str(self.server.make_url("/missing")))
+            await scraper.get_articles(urls)
+
+            [partition] = store.partitions()
+            entries = {entry["url"]: entry for entry in store.entries(partition, kind="article")}
+            self.assertEqual(sorted(entries), urls[:2])
+            self.assertIn("Article   0", read_snapshot(entries[urls[0]]["path"]))
+
+
+class TestReparse(TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_reparse_rebuilds_articles_from_archive(self):
+        listing = """
+        <div class="Ov(h) Pend(44px) Pstart(25px)">
+        <div>Reuters</div><a href="/news/a.html">Fed holds rates</a><p>Teaser</p>
+        </div>
+        <div class="Ov(h) Pend(44px) Pstart(25px)">
+        <div>Reuters</div><a href="/news/b.html">Not archived</a><p>Teaser</p>
+        </div>
+        """
+        store = SnapshotStore("snapshots")
+        store.put("https://finance.yahoo.com/topic/news/", listing, "listing", "2024-05-25")
+        store.put("https://finance.yahoo.com/news/a.html", ARTICLE_HTML, "article", "2024-05-25")
+
+        os.makedirs("data")
+        for run in ("2024-05-25_093000", "2024-05-26_093000"):
+            open(f"data/scraped_articles_{run}.parquet", "w").close()
+
+        reparse(workers=1, store=store, fmt="parquet")
+
+        # the file of the scrape run that day is superseded by the re-parsed one
+        self.assertEqual(
+            sorted(os.listdir("data")),
+            ["scraped_articles_2024-05-25.parquet", "scraped_articles_2024-05-26_093000.parquet"],
+        )
+        df = pd.read_parquet("data/scraped_articles_2024-05-25.parquet")
+        self.assertEqual(
+            df.to_dict("records"),
+            [
+                {
+                    "source": "Reuters",
+                    "title": "Fed holds rates",
+                    "url": "https://finance.yahoo.com/news/a.html",
+                    "content": "Teaser",
+                    "article": "The Fed kept rates unchanged on Wednesday.",
+                }
+            ],
+        )
+
+
+if __name__ == "__main__":
+    main()
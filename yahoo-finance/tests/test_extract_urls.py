@@ -0,0 +1,105 @@
+import asyncio
+import os
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase, TestCase, main
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from bs4 import BeautifulSoup
+
+from extract_urls import HTML_PARSER, NEWS_STRAINER, NewsScraper
+from http_cache import HTTPCache
+from seen_index import SeenIndex
+
+LISTING_HTML = """
+<html><body>
+<div class="Ov(h) Pend(44px) Pstart(25px)">
+<div>Reuters</div><a href="/news/us-value-stocks-195100623.html">US value stocks</a>
+<p>Value stocks have largely been left behind.</p>
+</div>
+<div class="Ov(h) Pend(44px)"><div>Ad</div><a href="/ad">Ad</a><p>Sponsored</p></div>
+<div class="Ov(h) Pend(44px) Pstart(25px)">
+<div>Bloomberg</div><a href="/news/fed-holds-rates-120000000.html">Fed holds rates</a>
+<p>The Fed kept rates unchanged.</p>
+</div>
+</body></html>
+"""
+
+
+class TestParseNews(TestCase):
+    def setUp(self):
+        self.scraper = NewsScraper(
+            base_url="https://finance.yahoo.com",
+            cache=HTTPCache(root=None),
+            seen=SeenIndex(path=None),
+        )
+
+    def parse(self, soup):
+        return [self.scraper.parse_news(div) for div in self.scraper.get_news_tags(soup)]
+
+    def test_parse_news(self):
+        soup = BeautifulSoup(LISTING_HTML, HTML_PARSER, parse_only=NEWS_STRAINER)
+        self.assertEqual(
+            [item["url"] for item in self.parse(soup)],
+            [
+                "https://finance.yahoo.com/news/us-value-stocks-195100623.html",
+                "https://finance.yahoo.com/news/fed-holds-rates-120000000.html",
+            ],
+        )
+
+    def test_fast_parser_matches_full_parse(self):
+        self.assertEqual(
+            self.parse(BeautifulSoup(LISTING_HTML, HTML_PARSER, parse_only=NEWS_STRAINER)),
+            self.parse(BeautifulSoup(LISTING_HTML, "html.parser")),
+        )
+
+
+def listing(*slugs):
+    return "".join(
+        f'<div class="Ov(h) Pend(44px) Pstart(25px)"><div>Reuters</div>'
+        f'<a href="/news/{slug}.html">{slug}</a><p>{slug} content</p></div>'
+        for slug in slugs
+    )
+
+
+class TestScrapeNews(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        pages = {"markets": listing("a", "b"), "earnings": listing("b", "c")}
+
+        async def topic(request):
+            await asyncio.sleep(0.01)
+            return web.Response(text=pages[request.match_info["topic"]], content_type="text/html")
+
+        async def broken(request):
+            return web.Response(status=404)
+
+        app = web.Application()
+        app.router.add_get("/topic/{topic}/", topic)
+        app.router.add_get("/news/", broken)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.tmp = TemporaryDirectory()
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+        await self.server.close()
+
+    async def test_scrape_news_merges_listings(self):
+        base_url = str(self.server.make_url("")).rstrip("/")
+        scraper = NewsScraper(
+            base_url=base_url, cache=HTTPCache(root=None), seen=SeenIndex(path=None)
+        )
+        path = os.path.join(self.tmp.name, "news.csv")
+        # scrape_news runs its own event loop
+        df = await asyncio.to_thread(
+            scraper.scrape_news, path, topics=["markets", "earnings"], pages=["/news/"]
+        )
+
+        self.assertEqual(
+            df["url"].tolist(), [f"{base_url}/news/{slug}.html" for slug in "abc"]
+        )
+        self.assertTrue(os.path.exists(path))
+
+
+if __name__ == "__main__":
+    main()
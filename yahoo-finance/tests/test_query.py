@@ -0,0 +1,58 @@
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+import pandas as pd
+
+from archive import ArchiveStore
+from query import ArchiveQuery
+from schemas import ARTICLE_SCHEMA
+
+
+def articles(day, sources):
+    return pd.DataFrame(
+        {
+            "source": sources,
+            "title": [f"News {i} of {day}" for i in range(len(sources))],
+            "url": [f"https://finance.yahoo.com/news/{day}-{i}.html" for i in range(len(sources))],
+            "content": [""] * len(sources),
+            "article": ["Text"] * len(sources),
+        }
+    )
+
+
+class TestArchiveQuery(TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        store = ArchiveStore("yahoofinance", ARTICLE_SCHEMA, root=self.tmp.name)
+        store.write(articles("2024-05-24", ["Reuters", "Bloomberg", "Reuters"]), "2024-05-24")
+        store.write(articles("2024-05-25", ["Reuters", "Motley Fool"]), "2024-05-25")
+        self.query = ArchiveQuery(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_select_with_filters(self):
+        df = self.query.select(columns=["date", "title"], start="2024-05-25", source="Reuters")
+        self.assertEqual(list(df.columns), ["date", "title"])
+        self.assertEqual(df["title"].tolist(), ["News 0 of 2024-05-25"])
+
+    def test_count(self):
+        df = self.query.count(by=["date", "source"], end="2024-05-24")
+        self.assertEqual(df["source"].tolist(), ["Bloomberg", "Reuters"])
+        self.assertEqual(df["articles"].tolist(), [1, 2])
+
+    def test_filters_are_pushed_into_the_scan(self):
+        plan = self.query.explain("select", columns=["title"], source="Reuters")
+        self.assertIn("source='Reuters'", plan)
+
+    def test_unknown_filter(self):
+        with self.assertRaises(ValueError):
+            self.query.select(sentiment="Positive")
+
+    def test_empty_archive(self):
+        with TemporaryDirectory() as tmp:
+            self.assertTrue(ArchiveQuery(tmp).select().empty)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import json
+import os
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase, TestCase, main
+
+import aiohttp
+from aiohttp.test_utils import TestServer
+from bs4 import BeautifulSoup
+
+from extract_articles import ArticleScraper
+from extract_urls import HTML_PARSER, NEWS_STRAINER, NewsScraper
+from http_cache import HTTPCache
+from replay_server import ReplayServer, load_fixtures, record, synthetic_article
+from seen_index import SeenIndex
+
+
+class TestReplayServer(IsolatedAsyncioTestCase):
+    async def serve(self, **kwargs):
+        self.server = TestServer(ReplayServer(**kwargs).app())
+        await self.server.start_server()
+        self.session = aiohttp.ClientSession()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.server.close()
+
+    async def get(self, path):
+        async with self.session.get(self.server.make_url(path)) as response:
+            return response.status, await response.text()
+
+    async def test_synthetic_pages_parse(self):
+        await self.serve(articles_per_listing=3)
+        cache, seen = HTTPCache(root=None), SeenIndex(path=None)
+        news_scraper = NewsScraper(base_url="", cache=cache, seen=seen)
+        article_scraper = ArticleScraper(cache=cache, seen=seen)
+
+        status, html = await self.get("/topic/stock-market-news/")
+        self.assertEqual(status, 200)
+        soup = BeautifulSoup(html, HTML_PARSER, parse_only=NEWS_STRAINER)
+        news = [news_scraper.parse_news(div) for div in news_scraper.get_news_tags(soup)]
+        self.assertEqual(len(news), 3)
+        self.assertEqual(news[0]["source"], "Source 0")
+
+        status, html = await self.get(news[0]["url"])
+        self.assertEqual(status, 200)
+        self.assertTrue(article_scraper.parse_article(html, news[0]["url"]))
+
+    async def test_fixtures_take_precedence(self):
+        await self.serve(fixtures={"/news/a.html": "<html>recorded</html>"})
+        self.assertEqual(await self.get("/news/a.html"), (200, "<html>recorded</html>"))
+        self.assertEqual((await self.get("/unknown"))[0], 404)
+
+    async def test_injects_throttling(self):
+        await self.serve(throttle_rate=1.0)
+        self.assertEqual((await self.get("/topic/stock-market-news/"))[0], 429)
+        status, stats = await self.get("/__stats")
+        self.assertEqual(json.loads(stats)["throttled"], 1)
+
+
+class TestRecord(TestCase):
+    def test_record_cache_entries(self):
+        with TemporaryDirectory() as tmp:
+            cache_dir = os.path.join(tmp, "cache")
+            os.makedirs(os.path.join(cache_dir, "ab"))
+            body = synthetic_article("fed-holds-rates")
+            with open(os.path.join(cache_dir, "ab", "abcdef.json"), "w") as f:
+                json.dump({"url": "https://finance.yahoo.com/news/a.html", "body": body}, f)
+
+            fixtures_dir = os.path.join(tmp, "fixtures")
+            self.assertEqual(record(cache_dir, fixtures_dir), 1)
+            self.assertEqual(load_fixtures(fixtures_dir), {"/news/a.html": body})
+
+
+if __name__ == "__main__":
+    main()
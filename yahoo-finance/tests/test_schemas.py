@@ -0,0 +1,109 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+import pandas as pd
+import pyarrow as pa
+
+from schemas import (
+    ARTICLE_SCHEMA,
+    NEWS_SCHEMA,
+    check_file,
+    iter_frames,
+    read_frame,
+    to_table,
+    write_frame,
+)
+
+NEWS = [
+    {
+        "source": "Reuters",
+        "title": "US value stocks",
+        "url": "https://finance.yahoo.com/news/us-value-stocks-195100623.html",
+        "content": "Value stocks have largely been left behind.",
+    },
+    {
+        "source": "Bloomberg",
+        "title": "Fed holds rates",
+        "url": "https://finance.yahoo.com/news/fed-holds-rates-120000000.html",
+        "content": "",
+    },
+]
+
+
+class TestToTable(TestCase):
+    def test_records_are_typed(self):
+        table = to_table(NEWS, NEWS_SCHEMA)
+        self.assertEqual(table.schema, NEWS_SCHEMA)
+        self.assertTrue(pa.types.is_dictionary(table["source"].type))
+        self.assertEqual(table["content"].to_pylist()[1], "")
+
+    def test_missing_columns_are_null(self):
+        table = to_table(NEWS, ARTICLE_SCHEMA)
+        self.assertEqual(table["article"].to_pylist(), [None, None])
+
+
+class TestReadFrame(TestCase):
+    def test_parquet_and_csv_read_alike(self):
+        with TemporaryDirectory() as tmp:
+            df = pd.DataFrame(NEWS).assign(article=["Article A", "Article B"])
+            paths = [os.path.join(tmp, "a.parquet"), os.path.join(tmp, "a.csv")]
+            for path in paths:
+                write_frame(df, path, ARTICLE_SCHEMA)
+
+            parquet, csv = (read_frame([path], ARTICLE_SCHEMA) for path in paths)
+            pd.testing.assert_frame_equal(parquet, csv)
+            self.assertEqual(str(parquet["source"].dtype), "category")
+            self.assertEqual(len(read_frame(paths, ARTICLE_SCHEMA)), 4)
+
+    def test_no_files(self):
+        df = read_frame([], NEWS_SCHEMA)
+        self.assertEqual(list(df.columns), NEWS_SCHEMA.names)
+        self.assertTrue(df.empty)
+
+
+class TestCheckFile(TestCase):
+    def test_parquet_without_footer(self):
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "news.parquet")
+            write_frame(pd.DataFrame(NEWS), path, NEWS_SCHEMA)
+            check_file(path, NEWS_SCHEMA)
+            with open(path, "r+b") as f:
+                f.truncate(os.path.getsize(path) - 8)
+            with self.assertRaises(pa.ArrowInvalid):
+                check_file(path, NEWS_SCHEMA)
+
+    def test_csv_cut_short_in_a_row(self):
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "news.csv")
+            # more rows than the first block the CSV reader parses
+            write_frame(pd.DataFrame(NEWS * 20000), path, NEWS_SCHEMA)
+            check_file(path, NEWS_SCHEMA)
+            with open(path, "r+b") as f:
+                # keep the first field of the last row only
+                last_row = f.read().rstrip(b"\n").rindex(b"\n") + 1
+                f.truncate(last_row + 5)
+            with self.assertRaises(pa.ArrowInvalid):
+                check_file(path, NEWS_SCHEMA)
+
+
+class TestIterFrames(TestCase):
+    def test_chunks_span_files_and_formats(self):
+        with TemporaryDirectory() as tmp:
+            df = pd.DataFrame(NEWS * 3)
+            paths = [os.path.join(tmp, "a.parquet"), os.path.join(tmp, "b.csv")]
+            for path in paths:
+                write_frame(df, path, NEWS_SCHEMA)
+
+            chunks = list(iter_frames(paths, NEWS_SCHEMA, chunk_size=4))
+            self.assertEqual([len(chunk) for chunk in chunks], [4, 4, 4])
+            pd.testing.assert_frame_equal(
+                pd.concat(chunks, ignore_index=True), read_frame(paths, NEWS_SCHEMA)
+            )
+
+    def test_no_files(self):
+        self.assertEqual(list(iter_frames([], NEWS_SCHEMA, chunk_size=4)), [])
+
+
+if __name__ == "__main__":
+    main()
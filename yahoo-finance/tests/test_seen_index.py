@@ -0,0 +1,39 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from seen_index import SeenIndex
+
+
+class TestSeenIndex(TestCase):
+    def test_filter_unseen(self):
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "seen.sqlite3")
+            with SeenIndex(path) as seen:
+                seen.add(["https://example.com/a.html"])
+                self.assertIn("https://example.com/a.html", seen)
+
+            # the index persists across runs
+            with SeenIndex(path) as seen:
+                urls = [
+                    "https://example.com/b.html",
+                    "https://example.com/a.html",
+                    "https://example.com/c.html",
+                    "https://example.com/b.html",
+                ]
+                self.assertEqual(
+                    seen.filter_unseen(urls),
+                    ["https://example.com/b.html", "https://example.com/c.html"],
+                )
+
+    def test_disabled_index_reports_everything_unseen(self):
+        seen = SeenIndex(path="")
+        seen.add(["https://example.com/a.html"])
+        self.assertEqual(
+            seen.filter_unseen(["https://example.com/a.html"]),
+            ["https://example.com/a.html"],
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import asyncio
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from snapshots import SnapshotStore, read_snapshot
+
+
+class TestSnapshotStore(TestCase):
+    def test_put_and_read_back(self):
+        with TemporaryDirectory() as tmp:
+            store = SnapshotStore(tmp)
+            digest = store.put("https://example.com/a.html", "<p>A</p>", "article", "2024-05-25")
+            store.put("https://example.com/b.html", "<p>B</p>", "article", "2024-05-26")
+
+            self.assertEqual(store.partitions(), ["2024-05-25", "2024-05-26"])
+            [entry] = store.entries("2024-05-25")
+            self.assertEqual(entry["url"], "https://example.com/a.html")
+            self.assertEqual(entry["sha256"], digest)
+            self.assertEqual(read_snapshot(entry["path"]), "<p>A</p>")
+
+    def test_identical_pages_are_stored_once(self):
+        with TemporaryDirectory() as tmp:
+            store = SnapshotStore(tmp)
+            store.put("https://example.com/a.html", "<p>Same</p>", partition="2024-05-25")
+            store.put("https://example.com/b.html", "<p>Same</p>", partition="2024-05-25")
+
+            entries = store.entries("2024-05-25")
+            self.assertEqual(len(entries), 2)
+            self.assertEqual(entries[0]["path"], entries[1]["path"])
+            blobs = [
+                name
+                for _, _, names in os.walk(tmp)
+                for name in names
+                if name.endswith(".zst")
+            ]
+            self.assertEqual(len(blobs), 1)
+
+    def test_latest_entry_per_url_wins(self):
+        with TemporaryDirectory() as tmp:
+            store = SnapshotStore(tmp)
+            store.put("https://example.com/a.html", "<p>Old</p>", "article", "2024-05-25")
+            store.put("https://example.com/l/", "<p>List</p>", "listing", "2024-05-25")
+            store.put("https://example.com/a.html", "<p>New</p>", "article", "2024-05-25")
+
+            [entry] = store.entries("2024-05-25", kind="article")
+            self.assertEqual(read_snapshot(entry["path"]), "<p>New</p>")
+
+    def test_disabled_store(self):
+        store = SnapshotStore(root="")
+        self.assertFalse(store.enabled)
+        self.assertIsNone(store.put("https://example.com/a.html", "<p>A</p>"))
+        self.assertEqual(store.partitions(), [])
+
+    def test_put_async(self):
+        async def archive(store):
+            pages = [f"<html>{i}</html>" for i in range(20)]
+            await asyncio.gather(
+                *[
+                    store.put_async(f"https://example.com/{i}", page, "article", "2024-05-25")
+                    for i, page in enumerate(pages)
+                ]
+            )
+            return pages
+
+        with TemporaryDirectory() as tmp:
+            with SnapshotStore(tmp) as store:
+                pages = asyncio.run(archive(store))
+            # the thread archiving the pages is stopped on close
+            self.assertIsNone(store._writer)
+            entries = sorted(store.entries("2024-05-25"), key=lambda entry: entry["url"])
+            self.assertEqual(len(entries), 20)
+            self.assertEqual(
+                sorted(read_snapshot(entry["path"]) for entry in entries), sorted(pages)
+            )
+
+
+if __name__ == "__main__":
+    main()